@@ -0,0 +1,48 @@
+"""
+Compares evaluating an expression with the closures built by
+compilers.local.value_expr against the function generated by
+compilers.codegen.
+
+usage: python -m benchmarks.expressions [rows]
+"""
+import sys
+import timeit
+
+from splicer import DataSet, Schema
+from splicer.compilers import codegen
+from splicer.compilers.local import value_expr
+from splicer.query_parser import parse
+
+SCHEMA = Schema(
+    [
+        dict(name="a", type="INTEGER"),
+        dict(name="b", type="INTEGER"),
+        dict(name="c", type="INTEGER"),
+        dict(name="d", type="STRING"),
+    ]
+)
+
+STATEMENT = "a + b * 2 > c and d = 'x'"
+
+
+def main(rows=100000):
+    dataset = DataSet()
+    expr = parse(STATEMENT)
+    relation = [(i, i % 7, i % 11, "x" if i % 2 else "y") for i in range(rows)]
+    ctx = {}
+
+    closure = value_expr(expr, SCHEMA, dataset)
+    generated = codegen.compile_expr(expr, SCHEMA, dataset)
+
+    assert [closure(r, ctx) for r in relation] == [generated(r, ctx) for r in relation]
+
+    print("{} over {} rows".format(STATEMENT, rows))
+    for name, func in (("closures", closure), ("codegen", generated)):
+        elapsed = min(
+            timeit.repeat(lambda: [func(r, ctx) for r in relation], number=1, repeat=5)
+        )
+        print("  {:<10} {:.4f}s".format(name, elapsed))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
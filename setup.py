@@ -31,5 +31,8 @@ setup(
   install_requires=[
     'codd',
     'zipper',
-  ]
+  ],
+  extras_require={
+    'columnar': ['numpy'],
+  }
 )
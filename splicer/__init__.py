@@ -3,6 +3,6 @@ __version__ = "0.2.0"
 from .relation import Relation
 from .field import Field
 from .schema import Schema
-from .query import Query
+from .query import PreparedQuery, Query
 from .table import Table
 from .dataset import DataSet
@@ -1,12 +1,69 @@
 from __future__ import annotations
 
+import asyncio
+from dataclasses import dataclass
 from functools import partial
-from typing import Any, Optional
+from itertools import islice
+from typing import Any, AsyncIterator, Callable, Hashable, Iterable, Optional
 
 from zipper import Loc  # type: ignore
 
+from ..ast import Expr
 from ..relation import Relation
 from ..schema import Schema
+from ..statistics import Statistics
+
+# rows read between giving control back to the event loop
+# when scanning asynchronously
+ASYNC_CHUNK_SIZE = 1024
+
+
+async def iterate_in_thread(
+    rows_for: Callable[[], Iterable[Any]], size: int = ASYNC_CHUNK_SIZE
+) -> AsyncIterator[Any]:
+    """
+    Iterates over the rows returned by rows_for on the event loop's
+    default executor, size rows at a time, so blocking iterators
+    don't block the loop.
+    """
+    loop = asyncio.get_running_loop()
+    rows = await loop.run_in_executor(None, lambda: iter(rows_for()))
+
+    while True:
+        chunk = await loop.run_in_executor(None, list, islice(rows, size))
+        if not chunk:
+            break
+        for row in chunk:
+            yield row
+
+
+@dataclass(frozen=True)
+class Scan:
+    """
+    Describes the work a scan of a relation is asked to do on top of
+    returning its rows, see Adapter.accepts. Expressions refer to the
+    columns of the relation's schema.
+    """
+
+    # conjuncts each row returned must satisfy
+    predicates: tuple[Expr, ...] = ()
+    # Asc/Desc expressions the rows must be sorted by
+    order_by: tuple[Expr, ...] = ()
+    # only return the rows from start up to stop, like SliceOp
+    start: Optional[int] = None
+    stop: Optional[int] = None
+    # positions of the only columns to return, in that order, the
+    # rest of the scan still applies to all of the columns
+    columns: Optional[tuple[int, ...]] = None
+
+    @property
+    def limited(self) -> bool:
+        return bool(self.start) or self.stop is not None
+
+    def __bool__(self) -> bool:
+        return bool(
+            self.predicates or self.order_by or self.limited or self.columns is not None
+        )
 
 
 class Adapter:
@@ -38,11 +95,121 @@ class Adapter:
             "{} has not implemented table_scan".format(self.__class__.__name__)
         )
 
+    def table_scan_async(self, name: str, ctx: Any) -> AsyncIterator[Any]:
+        """
+        Async version of table_scan, returns an async iterator of rows.
+
+        By default table_scan is run on the event loop's default
+        executor a chunk at a time. Adapters with async clients should
+        override this to scan without a thread.
+        """
+        return iterate_in_thread(partial(self.table_scan, name, ctx))
+
+    def estimate_rows(self, name: str) -> Optional[int]:
+        """
+        May return an estimate of the number of rows in the relation,
+        used to plan joins. Returns None if it's unknown.
+        """
+        return None
+
+    def statistics(self, name: str) -> Optional[Statistics]:
+        """
+        May return the Statistics of the relation, used to estimate
+        the rows returned by queries. Returns None if they're unknown,
+        DataSet.analyze can compute them.
+        """
+        return None
+
+    def version(self) -> Hashable:
+        """
+        May return a value that changes whenever the adapter's
+        relations or their schemas change. Plans of statements are
+        cached by the dataset until it does, see splicer.plan_cache.
+        """
+        return None
+
+    def splits(self, name: str, ctx: Any) -> Optional[list[Any]]:
+        """
+        May return a list describing the parts a scan of the relation
+        can be split into, such as files or ranges of rows. Each split
+        is passed to scan_split, possibly in another process so splits
+        should be small picklable values.
+
+        Returns None if the relation can't be split.
+        """
+        return None
+
+    def scan_split(self, name: str, split: Any, ctx: Any) -> Any:
+        """Returns the rows of the relation that are in the given split"""
+        raise NotImplementedError(
+            "{} has not implemented scan_split".format(self.__class__.__name__)
+        )
+
+    def partitions(self, name: str, ctx: Any) -> list[Callable[[Any], Any]]:
+        """
+        Returns a list of functions that given a ctx return the rows
+        of one split of the relation. Together they return every row
+        of the relation.
+        """
+        splits = self.splits(name, ctx)
+        if not splits:
+            return [partial(self.table_scan, name)]
+
+        return [partial(self.scan_split, name, split) for split in splits]
+
+    def accepts(self, name: str, scan: Scan) -> Scan:
+        """
+        Returns the parts of scan the adapter can do itself when
+        scanning the relation: any of its predicates, all of its
+        ordering or none and its limit. The query keeps applying the
+        parts that aren't returned to the rows from the scan.
+
+        A limit is only used when the predicates and ordering are
+        accepted as well. Columns are offered separately, once the
+        columns the query uses are known, and accepting them makes the
+        relation's schema just those columns. The default accepts
+        nothing.
+        """
+        return Scan()
+
+    def scan(self, name: str, scan: Scan, ctx: Any) -> Any:
+        """
+        Returns the rows of the relation with the parts of scan
+        accepted by Adapter.accepts applied.
+        """
+        raise NotImplementedError(
+            "{} has not implemented scan".format(self.__class__.__name__)
+        )
+
+    def scan_async(self, name: str, scan: Scan, ctx: Any) -> AsyncIterator[Any]:
+        """Async version of scan, see table_scan_async"""
+        return iterate_in_thread(partial(self.scan, name, scan, ctx))
+
+    def scan_partitions(
+        self, name: str, scan: Scan, ctx: Any
+    ) -> list[Callable[[Any], Any]]:
+        """
+        Returns a list of functions that given a ctx return part of
+        the rows of scan, like Adapter.partitions. By default scans
+        aren't split.
+        """
+        return [partial(self.scan, name, scan)]
+
     def evaluate(self, loc: Loc) -> Loc:
         op = loc.node()
         func = partial(self.table_scan, op.name)
         # func.schema = op.schema
-        return loc.replace(Relation(self, op.name, self.schema(op.name), func))
+        return loc.replace(
+            Relation(
+                self,
+                op.name,
+                self.schema(op.name),
+                func,
+                partial(self.partitions, op.name),
+                partial(self.estimate_rows, op.name),
+                statistics=partial(self.statistics, op.name),
+            )
+        )
 
     def schema(self, name: str) -> Optional[Schema]:
         raise NotImplementedError(
@@ -1,10 +1,29 @@
-from typing import Any, Iterator, Optional, Sequence, TypedDict, cast
+import asyncio
+import threading
+from functools import partial, reduce
+from itertools import islice
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence, TypedDict, cast
 
 from splicer import Table
 
+from ..ast import And
+from ..compilers import codegen  # type: ignore
+from ..operations import columns_used  # type: ignore
 from ..relation import Relation
 from ..schema import Schema, SchemaAsDict
-from . import Adapter
+from ..statistics import Statistics
+from . import ASYNC_CHUNK_SIZE, Adapter, Scan
+
+# rows per split when scanning in parallel, see Adapter.splits
+SPLIT_SIZE = 64 * 1024
+
+# scans whose compiled predicate and projection are kept by each
+# adapter, see DictAdapter._compiled_scan
+COMPILED_SCANS = 128
+
+# guards the compiled scans of every adapter, splits are scanned by
+# several threads at once
+_lock = threading.Lock()
 
 
 class DictTableAsDict(TypedDict):
@@ -31,6 +50,7 @@ class DictAdapter(Adapter):
 
         """
         self._tables: dict[str, DictTable] = {}
+        self._scans: dict[tuple[str, int, int], tuple[Any, ...]] = {}
 
         for name, table in tables.items():
 
@@ -39,6 +59,10 @@ class DictAdapter(Adapter):
 
             self._tables[name] = DictTable(self, name, schema=schema, rows=rows)
 
+    def __getstate__(self) -> dict[str, Any]:
+        # compiled scans can't be pickled, they're compiled again
+        return dict(self.__dict__, _scans={})
+
     @property
     def relations(self) -> list[tuple[str, Schema]]:
         return [(name, table.schema) for name, table in self._tables.items()]
@@ -55,6 +79,125 @@ class DictAdapter(Adapter):
     def table_scan(self, name: str, ctx: Any) -> Table:
         return self._tables[name]
 
+    async def table_scan_async(self, name: str, ctx: Any) -> AsyncIterator:
+        # rows are in memory, so there's no need for a thread, just
+        # give other tasks a chance to run every so often
+        for count, row in enumerate(self._tables[name], 1):
+            yield row
+            if count % ASYNC_CHUNK_SIZE == 0:
+                await asyncio.sleep(0)
+
+    def accepts(self, name: str, scan: Scan) -> Scan:
+        # filtering while scanning skips building a second generator,
+        # a limit stops reading the rows and only the columns used are
+        # read from the dicts, sorting is no faster here
+        return Scan(
+            scan.predicates, start=scan.start, stop=scan.stop, columns=scan.columns
+        )
+
+    def scan(self, name: str, scan: Scan, ctx: Any) -> Iterator:
+        return self._scan(name, scan, ctx, 0, None)
+
+    async def scan_async(self, name: str, scan: Scan, ctx: Any) -> AsyncIterator:
+        for count, row in enumerate(self.scan(name, scan, ctx), 1):
+            yield row
+            if count % ASYNC_CHUNK_SIZE == 0:
+                await asyncio.sleep(0)
+
+    def scan_partitions(self, name: str, scan: Scan, ctx: Any) -> list:
+        if scan.limited:
+            return [partial(self.scan, name, scan)]
+
+        compiled = self._compiled_scan(name, scan, ctx.get("dataset"))
+        return [
+            partial(self._scan, name, scan, start=start, stop=stop, compiled=compiled)
+            for start, stop in self.splits(name, ctx)
+        ]
+
+    def _scan(
+        self,
+        name: str,
+        scan: Scan,
+        ctx: Any,
+        start: int,
+        stop: Optional[int],
+        compiled: Optional[tuple[Any, ...]] = None,
+    ) -> Iterator:
+        if compiled is None:
+            compiled = self._compiled_scan(name, scan, ctx.get("dataset"))
+        read, predicate, project = compiled
+
+        rows = self._tables[name].scan(start, stop, read)
+
+        if predicate is not None:
+            rows = (row for row in rows if predicate(row, ctx))
+
+        if project is not None:
+            rows = map(project, rows)
+
+        if scan.limited:
+            rows = islice(rows, scan.start or 0, scan.stop)
+
+        return rows
+
+    def _compiled_scan(self, name: str, scan: Scan, dataset: Any) -> tuple[Any, ...]:
+        """
+        Returns the positions of the columns to read for scan, and the
+        predicate and projection applied to them or None, compiled the
+        first time the planned scan runs and reused by later runs.
+        """
+        key = (name, id(scan), id(dataset))
+        with _lock:
+            entry = self._scans.pop(key, None)
+
+        # ids are reused once objects are freed, so the entry holds
+        # on to the scan and dataset it was compiled for
+        if entry is None or entry[0] is not scan or entry[1] is not dataset:
+            entry = (scan, dataset, self._compile_scan(name, scan, dataset))
+
+        with _lock:
+            self._scans[key] = entry
+            while len(self._scans) > COMPILED_SCANS:
+                del self._scans[next(iter(self._scans))]
+
+        return entry[2]
+
+    def _compile_scan(self, name: str, scan: Scan, dataset: Any) -> tuple[Any, ...]:
+        schema = self._tables[name].schema
+        columns = read = scan.columns
+        predicate = project = None
+
+        if scan.predicates and columns is not None:
+            # read the columns the predicates need as well
+            used = columns_used(schema, scan.predicates)
+            read = None if used is None else tuple(sorted(used.union(columns)))
+
+        if scan.predicates:
+            if read is not None:
+                schema = schema.new(fields=[schema.fields[pos] for pos in read])
+            predicate = codegen.compile_expr(
+                reduce(And, scan.predicates), schema, dataset, "scan"
+            )
+
+        if read != columns:
+            positions = read or range(len(schema.fields))
+            project = codegen.compile_getter([positions.index(c) for c in columns])
+
+        return read, predicate, project
+
+    def estimate_rows(self, name: str) -> int:
+        return len(self._tables[name])
+
+    def statistics(self, name: str) -> Statistics:
+        return self._tables[name].statistics()
+
+    def splits(self, name: str, ctx: Any) -> list[tuple[int, int]]:
+        return self._tables[name].splits(ctx.get("split_size", SPLIT_SIZE))
+
+    def scan_split(self, name: str, split: tuple[int, int], ctx: Any) -> Iterator:
+        start, stop = split
+        return self._tables[name].scan(start, stop)
+
 
 class DictTable(Table):
     # schema:Schema
@@ -74,3 +217,53 @@ class DictTable(Table):
             tuple(row.get(key, default) for key, default in key_index)
             for row in self._rows
         )
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def statistics(self) -> Statistics:
+        """
+        Returns the number of rows, DataSet.analyze computes the
+        statistics of the columns.
+        """
+        return Statistics(len(self._rows))
+
+    def splits(self, size: int) -> list[tuple[int, int]]:
+        """Returns (start, stop) ranges of at most size rows"""
+        length = len(self._rows)
+        return [(start, min(start + size, length)) for start in range(0, length, size)]
+
+    def scan(
+        self, start: int, stop: Optional[int], columns: Optional[Sequence[int]] = None
+    ) -> Iterator:
+        """
+        Returns the rows from start up to stop, with only the values
+        of the fields at the given positions if columns isn't None.
+        """
+        key_index = self.key_index
+        if columns is not None:
+            key_index = [key_index[pos] for pos in columns]
+
+        rows = self._rows
+        if start or stop is not None:
+            rows = rows[start:stop]
+
+        return (
+            tuple(row.get(key, default) for key, default in key_index) for row in rows
+        )
+
+    def batches(self, size: int) -> Iterator[list]:
+        key_index = self.key_index
+        rows = self._rows
+
+        for start in range(0, len(rows), size):
+            yield [
+                tuple(row.get(key, default) for key, default in key_index)
+                for row in rows[start : start + size]
+            ]
+
+    def columns(self) -> list[list]:
+        rows = self._rows
+        return [
+            [row.get(key, default) for row in rows] for key, default in self.key_index
+        ]
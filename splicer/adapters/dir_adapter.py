@@ -32,7 +32,7 @@ class DirAdapter(Adapter):
         return self._relations.get(name)
 
     def has(self, name):
-        return self._relations.has_key(name)
+        return name in self._relations
 
     def evaluate(self, loc):
         relation = self._relations[loc.node().name]
@@ -50,7 +50,7 @@ class DirAdapter(Adapter):
             )
 
         else:
-            loc = loc.relpace(op)
+            loc = loc.replace(op)
 
         if relation.content_column:
             loc = loc.replace(
@@ -58,15 +58,11 @@ class DirAdapter(Adapter):
             )
 
         if relation.decode != "none":
-            loc = loc.replace(
-                Function(
-                    "decode",
-                    loc.node(),
-                    Const(relation.decode),
-                    Const(relation.schema),
-                    Const("path"),
-                )
-            )
+            args = [Const(relation.decode), Const(relation.schema), Const("path")]
+            if relation.read_ahead or not relation.ordered:
+                args.extend([Const(relation.read_ahead), Const(relation.ordered)])
+
+            loc = loc.replace(Function("decode", loc.node(), *args))
 
         return loc.leftmost_descendant()
 
@@ -92,6 +88,11 @@ class FileTable(object):
 
         self.decode = options.pop("decode", "none")
 
+        # number of files to decode ahead of time and whether
+        # rows are returned in the order of the files, see decode()
+        self.read_ahead = options.pop("read_ahead", 0)
+        self.ordered = options.pop("ordered", True)
+
         schema = options.pop("schema", None)
         if isinstance(schema, Schema):
             self.schema = schema
@@ -182,6 +183,9 @@ def is_partitionable(partioned_fields, op):
         return True
     elif issubclass(t, BinaryOp):
         return all(is_partitionable(partioned_fields, e) for e in (op.lhs, op.rhs))
+    elif t == ParamGetterOp:
+        # unknown until the query runs, unless bound by DataSet.prepare
+        return False
     else:
         raise RuntimeError("Can't determine if type %s is partitionable." % t)
 
@@ -1,10 +1,13 @@
 # type: ignore
 class Aggregate(object):
-    def __init__(self, function, returns, initial=None, finalize=None):
+    def __init__(self, function, returns, initial=None, finalize=None, merge=None):
         self.function = function
         self.returns = returns
         self.initial = initial
         self.finalize = finalize
+        # combines two states, allowing partial aggregates to be
+        # computed separately, i.e. merge(state_a, state_b) -> state
+        self.merge = merge
         self.state = None
 
     def __call__(self, *args):
@@ -470,6 +470,7 @@ class OrderByOp(RelationalOp):
         first = exprs[0]
         tail = exprs[1:]
         relation = parts.pop("relation", self.relation)
+        parts.setdefault("schema", self.schema)
 
         return self.__class__(relation, first, *tail, **parts)
 
@@ -510,5 +511,6 @@ class SliceOp(RelationalOp):
         # so we have to help it make a copy of this object
         args = parts.pop("start", self.start), parts.pop("stop", self.stop)
         relation = parts.pop("relation", self.relation)
+        parts.setdefault("schema", self.schema)
 
         return self.__class__(relation, *args, **parts)
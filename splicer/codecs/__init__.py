@@ -47,10 +47,16 @@ def relation_from(stream, mime_type, additional=[]):
 
 
 def relation_from_path(path, mime_type, encoding=None, additional=[]):
+    """
+    Yields the rows decoded from the file at path, which is opened
+    when the first row is read and closed once they've all been read
+    or the generator is closed.
+    """
     if mime_type is None or mime_type == "auto":
         mime_type, encoding = mimetypes.guess_type(path)
 
-    return relation_from(open(path), mime_type, additional=additional)
+    with open(path) as stream:
+        yield from relation_from(stream, mime_type, additional=additional)
 
 
 def schema_from(stream, mime_type):
@@ -36,6 +36,14 @@ else:
         def __init__(self, ob):
             self._ob = ob
 
+        def __eq__(self, other):
+            # without this tuples of keys compare by identity, so only
+            # the first element of a multi column key would be ordered
+            return self._ob == other._ob
+
+        def __hash__(self):
+            return hash(self._ob)
+
         def __lt__(self, other):
             self, other = self._ob, other._ob  # we don't care about the wrapper
 
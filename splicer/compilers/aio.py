@@ -0,0 +1,395 @@
+# type: ignore
+"""
+Async compiler.
+
+Operators compiled by this module are async generators, so queries can
+be consumed from an asyncio event loop with ``async for``.
+
+  async for row in dataset.aexecute("select * from employees"):
+    ...
+
+Relations are scanned with Adapter.table_scan_async. The inputs of
+joins are scanned concurrently, and the right side of UNION ALL is
+buffered ahead while the left is consumed, so scans of I/O bound
+adapters overlap with each other.
+
+Projections, selections and LIMIT stream row by row. Operators that
+keep state across their whole input (DISTINCT, ORDER BY, GROUP BY and
+joins) run the local compiler's operator in a thread of their own, fed
+their inputs as they're scanned, so rows stream through them within
+the local compiler's memory budgets while the loop runs other queries.
+DISTINCT of rows sorted on every column only compares each row with
+the previous one, others are hashed and spilled like in the local
+compiler.
+"""
+
+import asyncio
+import threading
+from concurrent import futures
+from itertools import count
+
+from ..adapters import ASYNC_CHUNK_SIZE, iterate_in_thread
+from ..ast import *
+from ..operations import isa, visit_with, walk
+from . import codegen, local
+
+# rows each input of a binary operator may be buffered ahead
+PREFETCH_SIZE = 1024
+
+_keys = count()
+
+
+def compile(query):
+    return walk(
+        query.operations,
+        visit_with(
+            query.dataset,
+            (isa(ProjectionOp), local.ensure_group_op_when_ags),
+            (is_callable, scan_op),
+            (isa_op, relational_op),
+        ),
+    )
+
+
+def isa_op(loc):
+    return type(loc.node()) in RELATION_OPS
+
+
+def relational_op(dataset, loc, operation):
+    func = RELATION_OPS[type(operation)](dataset, operation)
+    func.schema = operation.schema
+    func.ordering = local.ordering_of(operation)
+    return loc.replace(func)
+
+
+def is_callable(loc):
+    return callable(loc.node())
+
+
+def scan_op(dataset, loc, relation):
+    """
+    Replaces the relation with a function returning an async iterator
+    of its rows. Relations not backed by an adapter, such as table
+    functions, are iterated on the loop's default executor.
+    """
+    if getattr(relation, "scan", None) is not None:
+
+        def scan(ctx):
+            return relation.adapter.scan_async(relation.name, relation.scan, ctx)
+
+    elif getattr(relation, "adapter", None) is not None:
+
+        def scan(ctx):
+            return relation.adapter.table_scan_async(relation.name, ctx)
+
+    else:
+
+        def scan(ctx):
+            return iterate_in_thread(lambda: relation(ctx))
+
+    scan.schema = relation.schema
+    return loc.replace(scan)
+
+
+async def close(rows):
+    """Closes an async iterator, stopping the scans feeding it"""
+    aclose = getattr(rows, "aclose", None)
+    if aclose is not None:
+        await aclose()
+
+
+class Prefetch:
+    """
+    Consumes rows in a task started right away, buffering up to size
+    rows ahead of the caller. The rows are queued a chunk at a time,
+    a partial chunk when the caller is waiting for one. aclose stops
+    the task.
+    """
+
+    done = object()
+
+    def __init__(self, rows, size=PREFETCH_SIZE):
+        self.queue = asyncio.Queue(max(1, size // ASYNC_CHUNK_SIZE))
+        self.rows = iter(())
+        self.task = asyncio.ensure_future(self.pump(rows))
+
+    async def pump(self, rows):
+        chunk = []
+        try:
+            async for row in rows:
+                chunk.append(row)
+                if len(chunk) == ASYNC_CHUNK_SIZE or self.queue.empty():
+                    await self.queue.put(chunk)
+                    chunk = []
+            end = self.done
+        except Exception as e:
+            end = e
+        finally:
+            await close(rows)
+        if chunk:
+            await self.queue.put(chunk)
+        await self.queue.put(end)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        for row in self.rows:
+            return row
+        self.rows = iter(await self.chunk())
+        for row in self.rows:
+            return row
+        raise StopAsyncIteration
+
+    async def chunk(self):
+        """Returns the next rows, or an empty list once they run out"""
+        rest = list(self.rows)
+        if rest:
+            self.rows = iter(())
+            return rest
+
+        chunk = await self.queue.get()
+        if chunk is self.done:
+            # keep ending the rows if asked again
+            self.queue.put_nowait(chunk)
+            return []
+        elif isinstance(chunk, Exception):
+            raise chunk
+        return chunk
+
+    async def aclose(self):
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+
+
+class Closed(Exception):
+    """Raised in a Bridge's thread once its output is closed"""
+
+
+class Bridge:
+    """
+    Runs a local operator in a thread, reading the rows of its inputs
+    from the loop and queueing its own rows on the loop, a chunk at a
+    time. The rows returned so far are queued before waiting for more
+    input. The thread waits while the caller is a couple of chunks
+    behind, and stops once the bridge is closed.
+    """
+
+    done = object()
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.output = asyncio.Queue(2)
+        # rows returned by the operator that aren't queued yet
+        self.chunk = []
+        self.closed = False
+        # futures of the coroutines the thread is waiting on
+        self.pending = set()
+
+    def call(self, coro):
+        """Runs coro on the loop from the thread, returning its result"""
+        if self.closed:
+            coro.close()
+            raise Closed()
+
+        try:
+            future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        except RuntimeError:
+            # the loop is closed
+            coro.close()
+            raise Closed()
+
+        self.pending.add(future)
+        try:
+            if self.closed:
+                future.cancel()
+            return future.result()
+        except futures.CancelledError:
+            raise Closed()
+        finally:
+            self.pending.discard(future)
+
+    def rows(self, prefetched):
+        """Iterates over the rows of a Prefetch in the thread"""
+        while True:
+            self.flush()
+            chunk = self.call(prefetched.chunk())
+            if not chunk:
+                return
+            yield from chunk
+
+    def flush(self):
+        if self.chunk:
+            chunk, self.chunk = self.chunk, []
+            self.call(self.output.put(chunk))
+
+    def run(self, func, ctx):
+        try:
+            for row in func(ctx):
+                self.chunk.append(row)
+                if len(self.chunk) == ASYNC_CHUNK_SIZE:
+                    self.flush()
+            self.flush()
+            end = self.done
+        except Closed:
+            return
+        except Exception as e:
+            end = e
+
+        try:
+            self.call(self.output.put(end))
+        except Closed:
+            pass
+
+    def close(self):
+        self.closed = True
+        for future in list(self.pending):
+            future.cancel()
+
+
+def row_op(dataset, operation):
+    """
+    Compiles operators that keep state across their whole input with
+    the local compiler. The inputs are scanned concurrently and fed to
+    the operator running in its own thread, see Bridge.
+    """
+    key = "aio-{}".format(next(_keys))
+
+    if isinstance(operation, BinRelationalOp):
+        inputs = (operation.left, operation.right)
+        local_op = operation.new(
+            left=bridged(key, 0, operation.left),
+            right=bridged(key, 1, operation.right),
+        )
+    else:
+        inputs = (operation.relation,)
+        local_op = operation.new(relation=bridged(key, 0, operation.relation))
+
+    func = local.RELATION_OPS[type(local_op)](dataset, local_op)
+
+    async def rows_of(ctx):
+        bridge = Bridge(asyncio.get_running_loop())
+        prefetched = [Prefetch(input(ctx)) for input in inputs]
+
+        local_ctx = dict(ctx)
+        local_ctx[key] = [bridge.rows(rows) for rows in prefetched]
+        threading.Thread(target=bridge.run, args=(func, local_ctx), daemon=True).start()
+
+        try:
+            while True:
+                chunk = await bridge.output.get()
+                if chunk is Bridge.done:
+                    break
+                elif isinstance(chunk, Exception):
+                    raise chunk
+                for row in chunk:
+                    yield row
+        finally:
+            bridge.close()
+            for rows in prefetched:
+                await rows.aclose()
+
+    return rows_of
+
+
+def bridged(key, pos, relation):
+    """Returns a function returning the rows row_op feeds its operator"""
+
+    def rows(ctx):
+        return ctx[key][pos]
+
+    rows.schema = relation.schema
+    # lets DISTINCT of sorted rows compare each with the previous one
+    rows.ordering = getattr(relation, "ordering", ())
+    return rows
+
+
+def alias_op(dataset, operation):
+    def alias(ctx):
+        return operation.relation(ctx)
+
+    return alias
+
+
+def projection_op(dataset, operation):
+    schema = operation.relation.schema
+    project = codegen.compile_tuple(
+        local.expand_select_all(operation.exprs, schema), schema, dataset, "projection"
+    )
+
+    async def projection(ctx):
+        async for row in operation.relation(ctx):
+            yield project(row, ctx)
+
+    return projection
+
+
+def selection_op(dataset, operation):
+    if operation.bool_op is None:
+        return alias_op(dataset, operation)
+
+    predicate = codegen.compile_expr(
+        operation.bool_op, operation.schema, dataset, "selection"
+    )
+
+    async def selection(ctx):
+        async for row in operation.relation(ctx):
+            if predicate(row, ctx):
+                yield row
+
+    return selection
+
+
+def union_all_op(dataset, operation):
+    async def union_all(ctx):
+        # start on the right while the left is being consumed
+        right = Prefetch(operation.right(ctx))
+        left = operation.left(ctx)
+        try:
+            async for row in left:
+                yield row
+
+            async for row in right:
+                yield row
+        finally:
+            await close(left)
+            await right.aclose()
+
+    return union_all
+
+
+def slice_op(dataset, operation):
+    async def limit(ctx):
+        start = operation.start or 0
+        stop = operation.stop
+
+        if stop is not None and stop <= start:
+            return
+
+        rows = operation.relation(ctx)
+        try:
+            pos = 0
+            async for row in rows:
+                if pos >= start:
+                    yield row
+                pos += 1
+                if stop is not None and pos >= stop:
+                    break
+        finally:
+            await rows.aclose()
+
+    return limit
+
+
+RELATION_OPS = {
+    AliasOp: alias_op,
+    DistinctOp: row_op,
+    ProjectionOp: projection_op,
+    SelectionOp: selection_op,
+    SliceOp: slice_op,
+    UnionAllOp: union_all_op,
+    OrderByOp: row_op,
+    GroupByOp: row_op,
+    JoinOp: row_op,
+    LeftJoinOp: row_op,
+}
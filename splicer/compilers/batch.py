@@ -0,0 +1,365 @@
+# type: ignore
+"""
+Batch at a time compiler.
+
+Operators compiled by this module exchange lists of rows (batches) rather
+than single rows, and expressions are compiled into functions that
+evaluate an entire batch per call. The per row work is reduced to list
+comprehensions and ``map`` calls, amortizing python's function call
+overhead across ``batch_size`` rows.
+
+The results are identical, row for row, to the ``local`` compiler.
+
+Usage:
+
+  from splicer.compilers import batch
+  dataset.set_compiler(batch.compile)
+
+The batch size can be adjusted per query with the ``batch_size``
+ctx knob.
+"""
+
+from functools import partial
+from itertools import chain, islice
+
+from .. import Relation
+from ..ast import *
+from ..operations import isa, visit_with, walk
+from . import local
+
+BATCH_SIZE = 1024
+
+
+def compile(query):
+    batches = walk(
+        query.operations,
+        visit_with(
+            query.dataset,
+            (isa(ProjectionOp), local.ensure_group_op_when_ags),
+            (isa(Relation), scan_op),
+            (isa(OrderByOp), top_n),
+            (isa_op, relational_op),
+        ),
+    )
+
+    def execute(ctx):
+        return chain.from_iterable(batches(ctx))
+
+    execute.schema = batches.schema
+    return execute
+
+
+def isa_op(loc):
+    return type(loc.node()) in RELATION_OPS
+
+
+def relational_op(dataset, loc, operation):
+    func = RELATION_OPS.get(type(operation), row_op)(dataset, operation)
+    func.schema = operation.schema
+    return loc.replace(func)
+
+
+def batch_size(ctx):
+    return ctx.get("batch_size", BATCH_SIZE)
+
+
+def batched(rows, size):
+    """Groups an iterable of rows into lists of at most size rows"""
+    rows = iter(rows)
+    return iter(lambda: list(islice(rows, size)), [])
+
+
+def unbatched(func):
+    """
+    Returns a function that flattens the batches produced by func
+    back into rows, for operators that work a row at a time.
+    """
+
+    def rows(ctx):
+        return chain.from_iterable(func(ctx))
+
+    rows.schema = func.schema
+    return rows
+
+
+def scan_op(dataset, loc, relation):
+    """
+    Replaces the relation with a function returning batches. Relations
+    that return a Table use Table.batches() which lets the adapter build
+    the batches itself.
+    """
+
+    def scan(ctx):
+        records = relation(ctx)
+        size = batch_size(ctx)
+        if hasattr(records, "batches"):
+            return records.batches(size)
+        else:
+            return batched(records, size)
+
+    scan.schema = relation.schema
+    return loc.replace(scan)
+
+
+def row_op(dataset, operation):
+    """
+    Compiles operations that keep state across their whole input
+    (distinct, sorts, groupings and joins) with the local compiler, then
+    batches the result.
+    """
+    if isinstance(operation, BinRelationalOp):
+        operation = operation.new(
+            left=unbatched(operation.left), right=unbatched(operation.right)
+        )
+    else:
+        operation = operation.new(relation=unbatched(operation.relation))
+
+    func = local.RELATION_OPS[type(operation)](dataset, operation)
+
+    def rows_to_batches(ctx):
+        return batched(func(ctx), batch_size(ctx))
+
+    return rows_to_batches
+
+
+def top_n(dataset, loc, operation):
+    """Fuses ORDER BY and LIMIT using the local compiler's top n"""
+    parent = loc.up()
+    if not local.is_top_n(parent):
+        return loc
+
+    slice_op = parent.node()
+    rows = local.top_n_op(
+        dataset,
+        slice_op.new(relation=operation.new(relation=unbatched(operation.relation))),
+    )
+
+    def top_n(ctx):
+        return batched(rows(ctx), batch_size(ctx))
+
+    top_n.schema = slice_op.schema
+    return parent.replace(top_n)
+
+
+def alias_op(dataset, operation):
+    def alias(ctx):
+        return operation.relation(ctx)
+
+    return alias
+
+
+def projection_op(dataset, operation):
+    schema = operation.relation.schema
+    columns = tuple(
+        column
+        for expr in operation.exprs
+        for column in column_expr(expr, schema, dataset)
+    )
+
+    def projection(ctx):
+        for batch in operation.relation(ctx):
+            if columns:
+                yield list(zip(*[col(batch, ctx) for col in columns]))
+            else:
+                yield [()] * len(batch)
+
+    return projection
+
+
+def selection_op(dataset, operation):
+    if operation.bool_op is None:
+        return alias_op(dataset, operation)
+
+    predicate = value_expr(operation.bool_op, operation.schema, dataset)
+
+    def selection(ctx):
+        for batch in operation.relation(ctx):
+            selected = [row for row, keep in zip(batch, predicate(batch, ctx)) if keep]
+            if selected:
+                yield selected
+
+    return selection
+
+
+def union_all_op(dataset, operation):
+    def union_all(ctx):
+        return chain(operation.left(ctx), operation.right(ctx))
+
+    return union_all
+
+
+def slice_op(dataset, operation):
+    def limit(ctx):
+        start = operation.start or 0
+        stop = operation.stop
+        pos = 0
+        batches = operation.relation(ctx)
+        for batch in batches:
+            end = pos + len(batch)
+            if end > start:
+                yield batch[max(start - pos, 0) : None if stop is None else stop - pos]
+            pos = end
+            if stop is not None and pos >= stop:
+                break
+
+    return limit
+
+
+def column_expr(expr, schema, dataset):
+    if isinstance(expr, SelectAllExpr):
+        if expr.table is None:
+            fields = schema.fields
+        else:
+            fields = [f for f in schema.fields if f.schema_name == expr.table]
+
+        return [var_expr(Var(f.path), schema, dataset) for f in fields]
+    else:
+        return (value_expr(expr, schema, dataset),)
+
+
+def value_expr(expr, schema, dataset):
+    """
+    Returns a function that evaluates the expression against every
+    row of a batch, returning a list with one value per row.
+    """
+    return BATCH_EXPR.get(type(expr), row_expr)(expr, schema, dataset)
+
+
+def row_expr(expr, schema, dataset):
+    """Adapts a row at a time expression from the local compiler"""
+    value = local.value_expr(expr, schema, dataset)
+
+    def evaluate(batch, ctx):
+        return [value(row, ctx) for row in batch]
+
+    return evaluate
+
+
+def sub_expr(expr, schema, dataset):
+    return value_expr(expr.expr, schema, dataset)
+
+
+def var_expr(expr, schema, dataset):
+    pos = schema.field_position(expr.path)
+
+    def var(batch, ctx):
+        return [row[pos] for row in batch]
+
+    return var
+
+
+def const_expr(expr, schema, dataset):
+    const = expr.const
+
+    def constant(batch, ctx):
+        return [const] * len(batch)
+
+    return constant
+
+
+def param_getter_expr(expr, schema, dataset):
+    pos = expr.expr
+
+    def get_param(batch, ctx):
+        if not batch:
+            return []
+        return [ctx.get("params", [])[pos]] * len(batch)
+
+    return get_param
+
+
+def function_expr(expr, schema, dataset):
+    function = dataset.get_function(expr.name)
+    arg_exprs = tuple(value_expr(arg_expr, schema, dataset) for arg_expr in expr.args)
+
+    if not arg_exprs:
+
+        def call(batch, ctx):
+            return [function() for row in batch]
+
+    else:
+
+        def call(batch, ctx):
+            return list(map(function, *[arg(batch, ctx) for arg in arg_exprs]))
+
+    call.__name__ = str(expr.name)
+    return call
+
+
+def unary_op(operator, expr, schema, dataset):
+    val = value_expr(expr.expr, schema, dataset)
+
+    def _(batch, ctx):
+        return list(map(operator, val(batch, ctx)))
+
+    _.__name__ = operator.__name__
+    return _
+
+
+def binary_op(operator, expr, schema, dataset):
+    lhs = value_expr(expr.lhs, schema, dataset)
+    rhs = value_expr(expr.rhs, schema, dataset)
+
+    def _(batch, ctx):
+        return list(map(operator, lhs(batch, ctx), rhs(batch, ctx)))
+
+    _.__name__ = operator.__name__
+    return _
+
+
+def operator_of(expr_type):
+    """Returns the python operator the local compiler uses for expr_type"""
+    return local.VALUE_EXPR[expr_type].args[0]
+
+
+BATCH_EXPR = {
+    Var: var_expr,
+    StringConst: const_expr,
+    NumberConst: const_expr,
+    NullConst: const_expr,
+    TrueConst: const_expr,
+    FalseConst: const_expr,
+    ParamGetterOp: param_getter_expr,
+    Function: function_expr,
+    RenameOp: sub_expr,
+    Asc: sub_expr,
+}
+
+BATCH_EXPR.update(
+    {t: partial(unary_op, operator_of(t)) for t in (NegOp, NotOp)},
+)
+
+BATCH_EXPR.update(
+    {
+        t: partial(binary_op, operator_of(t))
+        for t in (
+            And,
+            Or,
+            LtOp,
+            LeOp,
+            EqOp,
+            NeOp,
+            GeOp,
+            GtOp,
+            IsOp,
+            IsNotOp,
+            AddOp,
+            SubOp,
+            MulOp,
+            DivOp,
+        )
+    }
+)
+
+RELATION_OPS = {
+    AliasOp: alias_op,
+    DistinctOp: row_op,
+    ProjectionOp: projection_op,
+    SelectionOp: selection_op,
+    SliceOp: slice_op,
+    UnionAllOp: union_all_op,
+    OrderByOp: row_op,
+    GroupByOp: row_op,
+    JoinOp: row_op,
+    LeftJoinOp: row_op,
+}
@@ -0,0 +1,276 @@
+# type: ignore
+"""
+Compiles expression trees to python source.
+
+``local.value_expr`` turns an expression into a tree of closures, one
+per node, every one of which is invoked for every row. This module
+instead renders the entire tree as a single python expression, which
+is compiled once with the builtin ``compile`` into one function.
+
+  a + b * 2 > c
+
+  becomes
+
+  def expr(row, ctx):
+    return ((row[0] + (row[1] * 2)) > row[2])
+
+Variables are inlined as positional lookups, sub expressions that
+only involve constants are folded at compile time and functions are
+bound into the generated function's namespace so they are called
+directly. Expressions this module doesn't know how to render fall back
+to the closures built by the local compiler.
+"""
+
+import builtins
+import itertools
+import math
+from collections import namedtuple
+
+from ..ast import *
+from .local import VALUE_EXPR, value_expr
+
+# source is a python expression, value is the folded value
+# of the expression when it only depends on constants
+Code = namedtuple("Code", "source value")
+
+NOT_CONST = object()
+
+_counter = itertools.count()
+
+
+def compile_expr(expr, schema, dataset, name="expr"):
+    """
+    Returns a function with the signature (row, ctx) that evaluates expr.
+    """
+    namespace = {}
+    source = expr_source(expr, schema, dataset, namespace).source
+    return compile_function(name, ("row", "ctx"), source, namespace)
+
+
+def compile_tuple(exprs, schema, dataset, name="columns"):
+    """
+    Returns a function with the signature (row, ctx) that evaluates
+    each expression in exprs returning the results as a tuple.
+    """
+    namespace = {}
+    source = tuple_source(
+        [expr_source(expr, schema, dataset, namespace).source for expr in exprs]
+    )
+    return compile_function(name, ("row", "ctx"), source, namespace)
+
+
+def compile_key(exprs, schema, dataset, wrap=None, name="key"):
+    """
+    Returns a function that given a ctx returns a single argument
+    function suitable for use as the key of sorted(), min() etc..
+
+    If wrap is specified each value in the key is passed to it,
+    i.e. (wrap(expr1), wrap(expr2), ...)
+    """
+    namespace = {}
+    sources = [expr_source(expr, schema, dataset, namespace).source for expr in exprs]
+    if wrap is not None:
+        wrapper = bind(namespace, wrap, "_w")
+        sources = ["{}({})".format(wrapper, source) for source in sources]
+
+    code = (
+        "def {name}_for(ctx):\n"
+        "    def {name}(row):\n"
+        "        return {source}\n"
+        "    return {name}\n"
+    ).format(name=name, source=tuple_source(sources))
+
+    return exec_source(code, name + "_for", namespace)
+
+
+def compile_getter(positions, name="getter"):
+    """
+    Returns a function returning a tuple of the values at the
+    positions of the sequence it's called with.
+    """
+    source = tuple_source(["row[{}]".format(pos) for pos in positions])
+    return compile_function(name, ("row",), source, {})
+
+
+def compile_function(name, args, source, namespace):
+    """
+    Compiles a function whose body returns the given source.
+
+    The returned function has the generated code stored in its
+    ``source`` attribute to ease debugging.
+    """
+    code = "def {name}({args}):\n    return {source}\n".format(
+        name=name, args=", ".join(args), source=source
+    )
+    return exec_source(code, name, namespace)
+
+
+def exec_source(code, name, namespace):
+    filename = "<splicer-codegen-{}>".format(next(_counter))
+    exec(builtins.compile(code, filename, "exec"), namespace)
+
+    function = namespace[name]
+    function.source = code
+    return function
+
+
+def tuple_source(sources):
+    if not sources:
+        return "()"
+    return "(" + ", ".join(sources) + ",)"
+
+
+def bind(namespace, value, prefix="_v"):
+    """
+    Adds the value to the namespace of the generated function
+    returning the name it's bound to.
+    """
+    for name, bound in namespace.items():
+        if bound is value and name.startswith(prefix):
+            return name
+
+    name = "{}{}".format(prefix, len(namespace))
+    namespace[name] = value
+    return name
+
+
+def literal(value, namespace):
+    """Returns the source for a constant value."""
+    if value is None or isinstance(value, (bool, str)):
+        return repr(value)
+    elif type(value) in (int, float) and math.isfinite(value):
+        return repr(value)
+    else:
+        return bind(namespace, value)
+
+
+def constant(value, namespace):
+    return Code(literal(value, namespace), value)
+
+
+def expr_source(expr, schema, dataset, namespace):
+    return SOURCE.get(type(expr), closure_source)(expr, schema, dataset, namespace)
+
+
+def closure_source(expr, schema, dataset, namespace):
+    """
+    Falls back to the closure built by the local compiler for
+    expressions that don't have a source representation.
+    """
+    closure = bind(namespace, value_expr(expr, schema, dataset), "_e")
+    return Code("{}(row, ctx)".format(closure), NOT_CONST)
+
+
+def var_source(expr, schema, dataset, namespace):
+    pos = schema.field_position(expr.path)
+    return Code("row[{}]".format(pos), NOT_CONST)
+
+
+def const_source(expr, schema, dataset, namespace):
+    return constant(expr.const, namespace)
+
+
+def param_getter_source(expr, schema, dataset, namespace):
+    return Code('ctx.get("params", [])[{}]'.format(expr.expr), NOT_CONST)
+
+
+def itemgetter_source(expr, schema, dataset, namespace):
+    return Code("row[{}]".format(literal(expr.key, namespace)), NOT_CONST)
+
+
+def sub_source(expr, schema, dataset, namespace):
+    return expr_source(expr.expr, schema, dataset, namespace)
+
+
+def function_source(expr, schema, dataset, namespace):
+    function = bind(namespace, dataset.get_function(expr.name), "_f")
+    args = [expr_source(arg, schema, dataset, namespace).source for arg in expr.args]
+    return Code("{}({})".format(function, ", ".join(args)), NOT_CONST)
+
+
+def unary_source(template, operator, expr, schema, dataset, namespace):
+    operand = expr_source(expr.expr, schema, dataset, namespace)
+
+    if operand.value is not NOT_CONST:
+        try:
+            return constant(operator(operand.value), namespace)
+        except Exception:
+            # leave errors to be raised when the expression is evaluated
+            pass
+
+    return Code(template.format(operand.source), NOT_CONST)
+
+
+def binary_source(template, operator, expr, schema, dataset, namespace):
+    lhs = expr_source(expr.lhs, schema, dataset, namespace)
+    rhs = expr_source(expr.rhs, schema, dataset, namespace)
+
+    if lhs.value is not NOT_CONST and rhs.value is not NOT_CONST:
+        try:
+            return constant(operator(lhs.value, rhs.value), namespace)
+        except Exception:
+            pass
+
+    if "{op}" in template:
+        template = template.replace("{op}", bind(namespace, operator, "_o"))
+
+    return Code(template.format(lhs.source, rhs.source), NOT_CONST)
+
+
+def operator_source(template, expr_type):
+    """
+    Returns a source generator for expr_type that uses the same
+    python operator as the local compiler.
+    """
+    operator = VALUE_EXPR[expr_type].args[0]
+
+    if issubclass(expr_type, UnaryOp):
+        generator = unary_source
+    else:
+        generator = binary_source
+
+    def source(expr, schema, dataset, namespace):
+        return generator(template, operator, expr, schema, dataset, namespace)
+
+    return source
+
+
+SOURCE = {
+    Var: var_source,
+    Const: const_source,
+    StringConst: const_source,
+    NumberConst: const_source,
+    NullConst: const_source,
+    TrueConst: const_source,
+    FalseConst: const_source,
+    ParamGetterOp: param_getter_source,
+    Function: function_source,
+    ItemGetterOp: itemgetter_source,
+    RenameOp: sub_source,
+    Asc: sub_source,
+}
+
+OPERATOR_TEMPLATES = {
+    NegOp: "(-{})",
+    NotOp: "(not {})",
+    And: "({} & {})",
+    Or: "({} | {})",
+    LtOp: "({} < {})",
+    LeOp: "({} <= {})",
+    EqOp: "({} == {})",
+    NeOp: "({} != {})",
+    GeOp: "({} >= {})",
+    GtOp: "({} > {})",
+    IsOp: "({} is {})",
+    IsNotOp: "({} is not {})",
+    AddOp: "({} + {})",
+    SubOp: "({} - {})",
+    MulOp: "({} * {})",
+    # division keeps python 2 semantics, see local.old_div
+    DivOp: "{op}({}, {})",
+}
+
+SOURCE.update(
+    (expr_type, operator_source(template, expr_type))
+    for expr_type, template in OPERATOR_TEMPLATES.items()
+)
@@ -0,0 +1,706 @@
+# type: ignore
+"""
+Columnar compiler backed by NumPy.
+
+Relations are held as one NumPy array per column rather than as a list
+of tuples. Columns whose Field.type is INTEGER, FLOAT or BOOLEAN are
+stored in typed arrays when every value is of the matching python type,
+everything else (STRING, DATE, NULLs etc..) is stored in object arrays.
+
+Selections are evaluated as vectorized boolean masks, projections as
+whole column arithmetic, ORDER BY with ``lexsort`` and GROUP BY by
+factorizing the keys with ``unique`` and reducing each aggregate per
+group with ``bincount``/``reduceat``. Operations without a columnar
+implementation (joins, DISTINCT) are handed to the local compiler.
+
+Usage:
+
+  from splicer.compilers import columnar
+  dataset.set_compiler(columnar.compile)
+
+numpy is an optional dependency, ``pip install splicer[columnar]``.
+"""
+
+import operator
+from collections import namedtuple
+from functools import partial
+from itertools import repeat
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from .. import Relation, compat
+from ..aggregate import Aggregate
+from ..ast import *
+from ..functions import aggregates
+from ..operations import isa, visit_with, walk
+from . import codegen, local
+
+# arrays is a tuple with one array per field, length is the number
+# of rows which is tracked separately for relations without fields
+Columns = namedtuple("Columns", "arrays length")
+
+# Placeholder for a column holding the arguments of an aggregate.
+# Produced by projections and consumed by the GroupByOp above them.
+Arguments = namedtuple("Arguments", "aggregate arrays length")
+
+DTYPES = {
+    # arithmetic that overflows int64 is redone with python ints,
+    # see checked
+    "INTEGER": (int, "int64"),
+    "FLOAT": (float, "float64"),
+    "BOOLEAN": (bool, "bool"),
+}
+
+INT64_MIN = -(2**63)
+
+
+def compile(query):
+    if np is None:
+        raise ImportError("The columnar compiler requires numpy")
+
+    columns = walk(
+        query.operations,
+        visit_with(
+            query.dataset,
+            (isa(ProjectionOp), local.ensure_group_op_when_ags),
+            (isa(Relation), scan_op),
+            (isa_op, relational_op),
+        ),
+    )
+
+    def execute(ctx):
+        return to_rows(columns(ctx))
+
+    execute.schema = columns.schema
+    return execute
+
+
+def isa_op(loc):
+    return type(loc.node()) in RELATION_OPS
+
+
+def relational_op(dataset, loc, operation):
+    func = RELATION_OPS[type(operation)](dataset, operation)
+    func.schema = operation.schema
+    return loc.replace(func)
+
+
+def to_array(values, field=None):
+    """
+    Returns an array of the values, typed according to the field
+    when every value is of the field's python type.
+    """
+    typed = DTYPES.get(field.type) if field is not None else None
+    if typed and field.mode != "REPEATED":
+        python_type, dtype = typed
+        if all(type(v) is python_type for v in values):
+            try:
+                return np.array(values, dtype=dtype)
+            except OverflowError:
+                pass
+
+    return object_array(values)
+
+
+def object_array(values):
+    return np.fromiter(values, dtype=object, count=len(values))
+
+
+def full_column(value, length):
+    """Returns an array with the value repeated length times"""
+    if type(value) in (int, float, bool):
+        try:
+            return np.full(length, value)
+        except OverflowError:
+            pass
+    return np.fromiter(repeat(value, length), dtype=object, count=length)
+
+
+def broadcast(value, length):
+    if isinstance(value, np.ndarray):
+        return value
+    return full_column(value, length)
+
+
+def materialize(array):
+    """
+    Converts aggregate Arguments into the tuples the local compiler
+    expects, any other array is returned as is.
+    """
+    if isinstance(array, Arguments):
+        if array.arrays:
+            return object_array(list(zip(*[a.tolist() for a in array.arrays])))
+        return full_column((), array.length)
+    return array
+
+
+def to_columns(rows, schema):
+    rows = list(rows)
+    fields = schema.fields
+    if rows:
+        values = list(zip(*rows))
+    else:
+        values = [()] * len(fields)
+
+    return Columns(tuple(to_array(v, f) for v, f in zip(values, fields)), len(rows))
+
+
+def to_rows(columns):
+    if not columns.arrays:
+        return iter([()] * columns.length)
+    return zip(*[materialize(a).tolist() for a in columns.arrays])
+
+
+def take(columns, indexes):
+    return Columns(tuple(a[indexes] for a in columns.arrays), len(indexes))
+
+
+def scan_op(dataset, loc, relation):
+    """
+    Replaces the relation with a function returning Columns. Relations
+    that return a Table use Table.columns() which lets the adapter
+    build the columns itself.
+    """
+    schema = relation.schema
+
+    def scan(ctx):
+        records = relation(ctx)
+        if schema.fields and hasattr(records, "columns"):
+            values = records.columns()
+            return Columns(
+                tuple(to_array(v, f) for v, f in zip(values, schema.fields)),
+                len(values[0]),
+            )
+        return to_columns(records, schema)
+
+    scan.schema = schema
+    return loc.replace(scan)
+
+
+def rows_of(func):
+    def rows(ctx):
+        return to_rows(func(ctx))
+
+    rows.schema = func.schema
+    return rows
+
+
+def row_op(dataset, operation):
+    """
+    Compiles operations without a columnar implementation with the
+    local compiler, converting their input to rows and their output
+    back to columns.
+    """
+    if isinstance(operation, BinRelationalOp):
+        operation = operation.new(
+            left=rows_of(operation.left), right=rows_of(operation.right)
+        )
+    else:
+        operation = operation.new(relation=rows_of(operation.relation))
+
+    func = local.RELATION_OPS[type(operation)](dataset, operation)
+
+    def rows_to_columns(ctx):
+        return to_columns(func(ctx), operation.schema)
+
+    return rows_to_columns
+
+
+def alias_op(dataset, operation):
+    def alias(ctx):
+        return operation.relation(ctx)
+
+    return alias
+
+
+def projection_op(dataset, operation):
+    schema = operation.relation.schema
+    columns = [
+        value_expr(expr, schema, dataset)
+        for expr in local.expand_select_all(operation.exprs, schema)
+    ]
+
+    def projection(ctx):
+        relation = operation.relation(ctx)
+        length = relation.length
+
+        arrays = []
+        for col in columns:
+            value = col(relation, ctx)
+            if not isinstance(value, Arguments):
+                value = broadcast(value, length)
+            arrays.append(value)
+
+        return Columns(tuple(arrays), length)
+
+    return projection
+
+
+def selection_op(dataset, operation):
+    predicate = value_expr(operation.bool_op, operation.schema, dataset)
+
+    def selection(ctx):
+        relation = operation.relation(ctx)
+        mask = as_bool(predicate(relation, ctx), relation.length)
+        return Columns(
+            tuple(a[mask] for a in relation.arrays), int(np.count_nonzero(mask))
+        )
+
+    return selection
+
+
+def union_all_op(dataset, operation):
+    def union_all(ctx):
+        left = operation.left(ctx)
+        right = operation.right(ctx)
+
+        arrays = []
+        for l, r in zip(left.arrays, right.arrays):
+            if l.dtype != r.dtype:
+                l, r = l.astype(object), r.astype(object)
+            arrays.append(np.concatenate((l, r)))
+
+        return Columns(tuple(arrays), left.length + right.length)
+
+    return union_all
+
+
+def slice_op(dataset, operation):
+    def limit(ctx):
+        relation = operation.relation(ctx)
+        s = slice(operation.start, operation.stop)
+        return Columns(
+            tuple(a[s] for a in relation.arrays), len(range(relation.length)[s])
+        )
+
+    return limit
+
+
+def order_by_op(dataset, operation):
+    schema = operation.relation.schema
+    keys = [sort_key_expr(expr, schema, dataset) for expr in operation.exprs]
+
+    def order_by(ctx):
+        relation = operation.relation(ctx)
+        if relation.length == 0:
+            return relation
+
+        # lexsort uses the last key as the primary sort key
+        order = np.lexsort([key(relation, ctx) for key in reversed(keys)])
+        return take(relation, order)
+
+    return order_by
+
+
+def sort_key_expr(expr, schema, dataset):
+    descending = isinstance(expr, Desc)
+    if isinstance(expr, (Asc, Desc)):
+        expr = expr.expr
+
+    value = value_expr(expr, schema, dataset)
+
+    def key(relation, ctx):
+        ranks = rank(broadcast(value(relation, ctx), relation.length))
+        return -ranks if descending else ranks
+
+    return key
+
+
+def rank(values):
+    """
+    Returns an array that sorts in the same order as values. Numeric
+    arrays are their own rank, object arrays are ranked using the
+    same ordering as the local compiler.
+    """
+    kind = values.dtype.kind
+    if kind in "if":
+        return values
+    elif kind in "bu":
+        return values.astype(np.int64)
+
+    objects = values.tolist()
+    try:
+        distinct = sorted(set(objects), key=compat.python2_sort_key)
+    except TypeError:
+        # unhashable values, rank by comparing neighbours
+        order = sorted(
+            range(len(objects)), key=lambda i: compat.python2_sort_key(objects[i])
+        )
+        ranks = np.empty(len(objects), dtype=np.int64)
+        current = 0
+        for n, i in enumerate(order):
+            if n and objects[i] != objects[order[n - 1]]:
+                current += 1
+            ranks[i] = current
+        return ranks
+
+    positions = {v: i for i, v in enumerate(distinct)}
+    return np.fromiter(
+        (positions[v] for v in objects), dtype=np.int64, count=len(objects)
+    )
+
+
+def factorize(arrays):
+    """
+    Given the arrays for each group by key returns the number of groups,
+    the position of the first row of each group and an array mapping
+    each row to its group. Groups are numbered in key order.
+    """
+    codes = [np.unique(rank(a), return_inverse=True)[1].reshape(-1) for a in arrays]
+
+    if len(codes) == 1:
+        keys = codes[0]
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    else:
+        keys = np.stack(codes, axis=1)
+        _, first, inverse = np.unique(
+            keys, axis=0, return_index=True, return_inverse=True
+        )
+
+    return len(first), first, inverse.reshape(-1)
+
+
+def group_by_op(dataset, group_op):
+    # the schema of aggregates that are added while compiling is
+    # only set on the projection
+    schema = group_op.relation.schema
+    positions = [schema.field_position(expr.path) for expr in group_op.exprs]
+    aggs = dict(group_op.aggregates)
+
+    def group_by(ctx):
+        relation = group_op.relation(ctx)
+        length = relation.length
+
+        if length == 0:
+            return Columns(tuple(np.empty(0, dtype=object) for f in schema.fields), 0)
+
+        if positions:
+            groups, first, inverse = factorize(
+                [relation.arrays[pos] for pos in positions]
+            )
+        else:
+            groups = 1
+            first = np.zeros(1, dtype=np.intp)
+            inverse = np.zeros(length, dtype=np.intp)
+
+        arrays = []
+        for pos, array in enumerate(relation.arrays):
+            if pos in aggs:
+                arrays.append(
+                    aggregate(aggs[pos], array, groups, inverse, schema.fields[pos])
+                )
+            else:
+                arrays.append(materialize(array)[first])
+
+        return Columns(tuple(arrays), groups)
+
+    return group_by
+
+
+def aggregate(agg, array, groups, inverse, field):
+    if isinstance(array, Arguments):
+        args = array.arrays
+    else:
+        args = None
+
+    reduce = VECTORIZED.get(agg.function)
+    if reduce and args is not None:
+        states = reduce(args, groups, inverse)
+    else:
+        states = None
+
+    if states is None:
+        states = fold(agg, array, groups, inverse)
+    else:
+        states = states.tolist()
+
+    if agg.finalize:
+        states = [agg.finalize(state) for state in states]
+
+    return to_array(states, field)
+
+
+def fold(agg, array, groups, inverse):
+    """Applies the aggregate's function to each row of each group in order"""
+    values = materialize(array).tolist()
+    states = [
+        agg.initial if not callable(agg.initial) else agg.initial()
+        for group in range(groups)
+    ]
+
+    for group, args in zip(inverse.tolist(), values):
+        states[group] = agg.function(states[group], *args)
+
+    return states
+
+
+def count_reduce(args, groups, inverse):
+    if args:
+        return None
+    return np.bincount(inverse, minlength=groups)
+
+
+def extreme_reduce(ufunc_name, args, groups, inverse):
+    if len(args) != 1 or args[0].dtype.kind not in "biuf":
+        return None
+
+    ufunc = getattr(np, ufunc_name)
+    order = np.argsort(inverse, kind="stable")
+    starts = np.searchsorted(inverse[order], np.arange(groups))
+    return ufunc.reduceat(args[0][order], starts)
+
+
+VECTORIZED = {
+    aggregates.count: count_reduce,
+    min: partial(extreme_reduce, "minimum"),
+    max: partial(extreme_reduce, "maximum"),
+}
+
+
+def as_bool(value, length):
+    if not isinstance(value, np.ndarray):
+        return np.full(length, bool(value))
+    elif value.dtype.kind == "b":
+        return value
+    else:
+        return value.astype(bool)
+
+
+def value_expr(expr, schema, dataset):
+    """
+    Returns a function that evaluates the expression against all
+    rows of a relation at once. The function returns an array or a
+    python value if the expression doesn't depend on the rows.
+    """
+    return COLUMN_EXPR.get(type(expr), row_expr)(expr, schema, dataset)
+
+
+def row_expr(expr, schema, dataset):
+    """
+    Evaluates expressions without a columnar implementation
+    a row at a time.
+    """
+    func = codegen.compile_expr(expr, schema, dataset)
+
+    def evaluate(relation, ctx):
+        return object_array([func(row, ctx) for row in to_rows(relation)])
+
+    return evaluate
+
+
+def sub_expr(expr, schema, dataset):
+    return value_expr(expr.expr, schema, dataset)
+
+
+def var_expr(expr, schema, dataset):
+    pos = schema.field_position(expr.path)
+
+    def var(relation, ctx):
+        return relation.arrays[pos]
+
+    return var
+
+
+def const_expr(expr, schema, dataset):
+    const = expr.const
+    return lambda relation, ctx: const
+
+
+def param_getter_expr(expr, schema, dataset):
+    pos = expr.expr
+
+    def get_param(relation, ctx):
+        return ctx.get("params", [])[pos]
+
+    return get_param
+
+
+def function_expr(expr, schema, dataset):
+    function = dataset.get_function(expr.name)
+    arg_exprs = tuple(value_expr(arg, schema, dataset) for arg in expr.args)
+
+    def call(relation, ctx):
+        length = relation.length
+        args = [broadcast(arg(relation, ctx), length) for arg in arg_exprs]
+
+        if isinstance(function, Aggregate):
+            return Arguments(function, args, length)
+
+        if args:
+            values = [function(*a) for a in zip(*[arg.tolist() for arg in args])]
+        else:
+            values = [function() for i in range(length)]
+        return object_array(values)
+
+    call.__name__ = str(expr.name)
+    return call
+
+
+def unary_op(operator, expr, schema, dataset):
+    val = value_expr(expr.expr, schema, dataset)
+
+    def _(relation, ctx):
+        return operator(val(relation, ctx))
+
+    _.__name__ = operator.__name__
+    return _
+
+
+def not_(value):
+    if isinstance(value, np.ndarray):
+        return ~as_bool(value, len(value))
+    return not value
+
+
+def binary_op(operator, expr, schema, dataset):
+    lhs = value_expr(expr.lhs, schema, dataset)
+    rhs = value_expr(expr.rhs, schema, dataset)
+
+    def _(relation, ctx):
+        return operator(lhs(relation, ctx), rhs(relation, ctx))
+
+    _.__name__ = operator.__name__
+    return _
+
+
+def checked(operator, overflowed):
+    """
+    Applies an arithmetic operator, redoing it with python ints when
+    the int64 result overflowed, so results match the local compiler
+    rather than silently wrapping around.
+    """
+
+    def _(*values):
+        try:
+            result = operator(*values)
+        except OverflowError:
+            # python ints out of the range of int64
+            return operator(*map(as_objects, values))
+
+        if (
+            isinstance(result, np.ndarray)
+            and result.dtype.kind == "i"
+            and np.any(overflowed(result, *values))
+        ):
+            return operator(*map(as_objects, values))
+        return result
+
+    _.__name__ = operator.__name__
+    return _
+
+
+def as_objects(value):
+    if isinstance(value, np.ndarray):
+        return value.astype(object)
+    return value
+
+
+def add_overflowed(result, lhs, rhs):
+    # the result's sign differs from both operands'
+    return ((lhs ^ result) & (rhs ^ result)) < 0
+
+
+def sub_overflowed(result, lhs, rhs):
+    return ((lhs ^ rhs) & (lhs ^ result)) < 0
+
+
+def mul_overflowed(result, lhs, rhs):
+    with np.errstate(all="ignore"):
+        divisor = np.where(lhs == 0, 1, lhs)
+        return ((lhs != 0) & (result // divisor != rhs)) | (
+            (lhs == -1) & (rhs == INT64_MIN)
+        )
+
+
+def neg_overflowed(result, value):
+    return value == INT64_MIN
+
+
+def elementwise(operator):
+    """
+    Applies the operator to each pair of values, for operators
+    NumPy doesn't vectorize such as ``is``.
+    """
+
+    def _(lhs, rhs):
+        if not isinstance(lhs, np.ndarray) and not isinstance(rhs, np.ndarray):
+            return operator(lhs, rhs)
+
+        lhs, rhs = [
+            v.astype(object) if isinstance(v, np.ndarray) else v for v in (lhs, rhs)
+        ]
+        return np.frompyfunc(operator, 2, 1)(lhs, rhs).astype(bool)
+
+    _.__name__ = operator.__name__
+    return _
+
+
+def is_integral(value):
+    if isinstance(value, np.ndarray):
+        return value.dtype.kind in "iu"
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def divide(lhs, rhs):
+    arrays = [v for v in (lhs, rhs) if isinstance(v, np.ndarray)]
+    if not arrays:
+        return local.old_div(lhs, rhs)
+
+    if any(a.dtype.kind not in "biuf" for a in arrays):
+        return np.frompyfunc(local.old_div, 2, 1)(lhs, rhs)
+
+    if np.any(np.asarray(rhs) == 0):
+        raise ZeroDivisionError("division by zero")
+
+    if is_integral(lhs) and is_integral(rhs):
+        if np.any((np.asarray(lhs) == INT64_MIN) & (np.asarray(rhs) == -1)):
+            return np.frompyfunc(local.old_div, 2, 1)(lhs, rhs)
+        return np.floor_divide(lhs, rhs)
+    return np.true_divide(lhs, rhs)
+
+
+COLUMN_EXPR = {
+    Var: var_expr,
+    Const: const_expr,
+    StringConst: const_expr,
+    NumberConst: const_expr,
+    NullConst: const_expr,
+    TrueConst: const_expr,
+    FalseConst: const_expr,
+    ParamGetterOp: param_getter_expr,
+    Function: function_expr,
+    RenameOp: sub_expr,
+    Asc: sub_expr,
+    NegOp: partial(unary_op, checked(operator.neg, neg_overflowed)),
+    NotOp: partial(unary_op, not_),
+    And: partial(binary_op, operator.and_),
+    Or: partial(binary_op, operator.or_),
+    LtOp: partial(binary_op, operator.lt),
+    LeOp: partial(binary_op, operator.le),
+    EqOp: partial(binary_op, operator.eq),
+    NeOp: partial(binary_op, operator.ne),
+    GeOp: partial(binary_op, operator.ge),
+    GtOp: partial(binary_op, operator.gt),
+    IsOp: partial(binary_op, elementwise(operator.is_)),
+    IsNotOp: partial(binary_op, elementwise(operator.is_not)),
+    AddOp: partial(binary_op, checked(operator.add, add_overflowed)),
+    SubOp: partial(binary_op, checked(operator.sub, sub_overflowed)),
+    MulOp: partial(binary_op, checked(operator.mul, mul_overflowed)),
+    DivOp: partial(binary_op, divide),
+}
+
+RELATION_OPS = {
+    AliasOp: alias_op,
+    ProjectionOp: projection_op,
+    SelectionOp: selection_op,
+    OrderByOp: order_by_op,
+    GroupByOp: group_by_op,
+    SliceOp: slice_op,
+    UnionAllOp: union_all_op,
+    DistinctOp: row_op,
+    JoinOp: row_op,
+    LeftJoinOp: row_op,
+}
@@ -1,9 +1,11 @@
 # type: ignore
 from collections import defaultdict
-from functools import partial
+from datetime import date, datetime, time
+from itertools import chain, islice
 from sys import getsizeof
 
 from ..ast import And, EqOp, Var
+from . import codegen, spill
 from .local import var_expr
 
 B = 1
@@ -11,6 +13,12 @@ K = 1024
 M = K**2
 MAX_SIZE = 10 * M
 
+# how many times hybrid_hash_join partitions the rows of a partition
+# that's still too big, rows of a single key can't be spread out
+MAX_LEVEL = 4
+
+missing = object()
+
 
 def record_size(record):
     # size of outer tuple
@@ -24,12 +32,91 @@ def record_size(record):
     return sz + sum(map(getsizeof, record))
 
 
-def buffered(relation, max_size):
+# approximate sizes of values by type, see row_size_for
+POINTER_SIZE = 8
+FIXED_SIZES = {
+    "INTEGER": getsizeof(2**40),
+    "FLOAT": getsizeof(0.0),
+    # True, False and None are shared
+    "BOOLEAN": 0,
+    "NULL": 0,
+    "DATE": getsizeof(date.min),
+    "DATETIME": getsizeof(datetime.min),
+    "TIME": getsizeof(time.min),
+}
+# strings and bytes also take a byte per character
+LENGTH_SIZES = {
+    "STRING": getsizeof(""),
+    "BYTES": getsizeof(b""),
+}
+
+
+def row_size_for(schema):
+    """
+    Returns a function estimating the bytes used by rows of the
+    schema, an alternative to record_size that only looks at the
+    values whose size varies:
+
+      fields: x INTEGER, name STRING, tags STRING REPEATED
+
+      def row_size(row):
+          return 145 + _length(row[1]) + _sequence_size(row[2])
+
+    Strings and bytes are counted by their length. Repeated fields
+    and fields of other types are measured like record_size does.
+    """
+    namespace = dict(
+        _sequence_size=record_size, _getsizeof=getsizeof, _length=value_length
+    )
+
+    fixed = getsizeof(()) + POINTER_SIZE * len(schema.fields)
+    variable = []
+
+    for pos, field in enumerate(schema.fields):
+        if field.mode == "REPEATED":
+            variable.append("_sequence_size(row[{}] or ())".format(pos))
+        elif field.type in FIXED_SIZES:
+            fixed += FIXED_SIZES[field.type]
+        elif field.type in LENGTH_SIZES:
+            fixed += LENGTH_SIZES[field.type]
+            variable.append("_length(row[{}])".format(pos))
+        else:
+            variable.append("_getsizeof(row[{}])".format(pos))
+
+    code = "def row_size(row):\n    return {}\n".format(
+        " + ".join([str(fixed)] + variable)
+    )
+
+    return codegen.exec_source(code, "row_size", namespace)
+
+
+def value_length(value):
+    """
+    Returns the length of strings and bytes, schemas aren't enforced
+    so values of any other type are measured with getsizeof.
+    """
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    return 0 if value is None else getsizeof(value)
+
+
+def row_size_of(relation):
+    """
+    Returns the row size estimator for the relation's schema,
+    or record_size when it has none.
+    """
+    schema = getattr(relation, "schema", None)
+    if schema is None:
+        return record_size
+    return row_size_for(schema)
+
+
+def buffered(relation, max_size, row_size=record_size):
     block = []
     bytes = 0
     for row in relation:
         block.append(row)
-        bytes += record_size(row)
+        bytes += row_size(row)
         if bytes >= max_size:
             yield block
             block = []
@@ -39,24 +126,294 @@ def buffered(relation, max_size):
         yield block
 
 
+def blocks(rows, max_size, row_size=record_size):
+    """
+    Groups rows into lists of about max_size bytes. Rather than
+    measuring every row, each list holds as many rows as would fit
+    if they were all the size of its first row.
+    """
+    rows = iter(rows)
+    for first in rows:
+        block = [first]
+        block.extend(islice(rows, block_rows(max_size, row_size(first)) - 1))
+        yield block
+
+
+def block_rows(max_size, row_size):
+    """Returns how many rows of row_size bytes fit in max_size bytes"""
+    return max(int(max_size // max(row_size, 1)), 1)
+
+
+def materialize(rows, max_size, ctx, row_size=record_size):
+    """
+    Reads rows so they can be iterated over any number of times.
+    They're returned as a list if they fit within max_size bytes,
+    otherwise as a SpillFile which the caller should close.
+    """
+    rows = iter(rows)
+    for first in rows:
+        break
+    else:
+        return []
+
+    limit = block_rows(max_size, row_size(first))
+    cached = [first]
+    cached.extend(islice(rows, limit))
+    if len(cached) <= limit:
+        return cached
+
+    return spill.SpillFile(spill.spill_dir(ctx)).extend(chain(cached, rows))
+
+
 def nested_block_join(r_op, s_op, comparison, ctx):
+    """
+    Returns every row of r followed by a row of s for which comparison
+    is true.
+
+    s is read once and kept in memory when it fits within half of
+    the ``sort_buffer_size`` budget, otherwise it's spilled to disk.
+    r is read a block at a time and each block is compared with
+    all of s.
+    """
     buffer_size = ctx.get("sort_buffer_size", MAX_SIZE) / 2
-    r = r_op(ctx)
+    r_size = row_size_of(r_op)
+    s_size = row_size_of(s_op)
+    s = materialize(s_op(ctx), buffer_size, ctx, s_size)
+
+    try:
+        for r_block in blocks(r_op(ctx), buffer_size, r_size):
+            for s_block in blocks(s, buffer_size, s_size):
+                for s_row in s_block:
+                    for r_row in r_block:
+                        row = r_row + s_row
+                        if comparison(row, ctx):
+                            yield row
+    finally:
+        if isinstance(s, spill.SpillFile):
+            s.close()
+
+
+def hash_join(left_join, l_op, r_op, comparison, ctx, build=None):
+    """
+    Joins the relations by building a hash table of one relation and
+    probing it with each row of the other, see hybrid_hash_join.
 
-    for r_block in buffered(r, buffer_size):
-        s = s_op(ctx)
-        for s_block in buffered(s, buffer_size):
-            for s_row in s_block:
-                for r_row in r_block:
-                    row = r_row + s_row
-                    if comparison(row, ctx):
-                        yield row
+    build is either "left" or "right", the relation to build the hash
+    table from. When it's None inner joins build on whichever relation
+    runs out first when both are read in turn, see smaller_side. Left
+    joins always build on the right so they can probe with the left.
 
+    Each relation is read once. Rows are returned in the order of the
+    probing relation while the other fits within half of the
+    ``sort_buffer_size`` budget.
+    """
+    left_key, right_key = comparison
+    max_size = ctx.get("sort_buffer_size", MAX_SIZE) / 2
 
-def hash_join(left_join, l_op, r_op, comparison, ctx):
-    r = r_op(ctx)
-    buffer_size = ctx.get("sort_buffer_size", MAX_SIZE) / 2
+    if left_join:
+        default = ((None,) * len(r_op.schema.fields),)
+        build = "right"
+    else:
+        default = ()
+
+    l_size = row_size_of(l_op)
+    r_size = row_size_of(r_op)
+
+    lefts = l_op(ctx)
+    rights = r_op(ctx)
+
+    if build is None:
+        build, lefts, rights = smaller_side(lefts, rights, max_size, l_size, r_size)
+
+    if build == "left":
+        return hybrid_hash_join(
+            rights,
+            lefts,
+            (right_key, left_key),
+            default,
+            max_size,
+            ctx,
+            swap=True,
+            row_size=l_size,
+        )
+    else:
+        return hybrid_hash_join(
+            lefts, rights, comparison, default, max_size, ctx, row_size=r_size
+        )
+
+
+def smaller_side(lefts, rights, max_size, l_size=record_size, r_size=record_size):
+    """
+    Reads a row of each relation in turn until either runs out or
+    max_size bytes have been read. Returns "left" if the left relation
+    ran out first, otherwise "right", along with iterators over all of
+    the rows of each relation.
+    """
+    lefts = iter(lefts)
+    rights = iter(rights)
+    l_rows = []
+    r_rows = []
+    size = 0
+    side = "right"
+
+    while size < max_size:
+        row = next(rights, missing)
+        if row is missing:
+            break
+        r_rows.append(row)
+        size += r_size(row)
+
+        row = next(lefts, missing)
+        if row is missing:
+            side = "left"
+            break
+        l_rows.append(row)
+        size += l_size(row)
+
+    return side, chain(l_rows, lefts), chain(r_rows, rights)
+
+
+def hybrid_hash_join(
+    probes,
+    builds,
+    comparison,
+    default,
+    max_size,
+    ctx,
+    level=0,
+    swap=False,
+    row_size=record_size,
+):
+    """
+    Returns each probe row joined with the build rows sharing its key,
+    or with default when there are none. comparison is a pair of
+    functions returning the key of probe and build rows respectively.
+    Joined rows are probe + build rows, or build + probe rows when
+    swap is true.
+
+    The build rows are hashed into memory. Once they exceed max_size
+    bytes they're split into hash partitions and the largest partitions
+    are spilled to disk until the rest fit again. Probe rows whose key
+    falls in an in memory partition are joined right away, the others
+    are spilled alongside their partition, which is then joined once
+    the probe rows run out, partitioning it again if it's still too big.
+    """
+    probe_key, build_key = comparison
+
+    table = defaultdict(list)
+    size = 0
+    # once split, each partition is either an in memory table
+    # or a pair of (build, probe) spill files
+    partitions = None
+    sizes = None
+
+    for row in builds:
+        key = build_key(row, ctx)
+        if partitions is None:
+            table[key].append(row)
+            size += row_size(row)
+            if size >= max_size and level < MAX_LEVEL:
+                partitions, sizes = split(table, level, row_size)
+                table = None
+                evict(partitions, sizes, max_size, ctx)
+            continue
+
+        pos = spill.partition_of(key, level)
+        partition = partitions[pos]
+        if isinstance(partition, tuple):
+            partition[0].append(row)
+        else:
+            partition[key].append(row)
+            sizes[pos] += row_size(row)
+            if sum(sizes) >= max_size:
+                evict(partitions, sizes, max_size, ctx)
+
+    for row in probes:
+        key = probe_key(row, ctx)
+        if partitions is None:
+            matches = table.get(key, default)
+        else:
+            partition = partitions[spill.partition_of(key, level)]
+            if isinstance(partition, tuple):
+                partition[1].append(row)
+                continue
+            matches = partition.get(key, default)
+
+        if swap:
+            for match in matches:
+                yield match + row
+        else:
+            for match in matches:
+                yield row + match
+
+    table = None
+
+    for pos, partition in enumerate(partitions or ()):
+        if not isinstance(partition, tuple):
+            continue
+
+        partitions[pos] = None
+        b_file, p_file = partition
+        with b_file, p_file:
+            if not (b_file or default):
+                # nothing to join with
+                continue
+
+            for row in hybrid_hash_join(
+                p_file,
+                b_file,
+                comparison,
+                default,
+                max_size,
+                ctx,
+                level + 1,
+                swap,
+                row_size,
+            ):
+                yield row
+
+
+def split(table, level, row_size=record_size):
+    """
+    Splits the hash table into spill.PARTITIONS tables, returning
+    them and their size in bytes.
+    """
+    partitions = [defaultdict(list) for _ in range(spill.PARTITIONS)]
+    sizes = [0] * spill.PARTITIONS
 
+    for key, rows in table.items():
+        pos = spill.partition_of(key, level)
+        partitions[pos][key] = rows
+        sizes[pos] += sum(map(row_size, rows))
+
+    return partitions, sizes
+
+
+def evict(partitions, sizes, max_size, ctx):
+    """
+    Spills the largest in memory partitions until the rest
+    take less than half of max_size.
+    """
+    while max(sizes) and sum(sizes) >= max_size / 2:
+        pos = sizes.index(max(sizes))
+        r_file = spill.SpillFile(spill.spill_dir(ctx))
+        for rows in partitions[pos].values():
+            r_file.extend(rows)
+
+        partitions[pos] = (r_file, spill.SpillFile(spill.spill_dir(ctx)))
+        sizes[pos] = 0
+
+
+def merge_join(left_join, l_op, r_op, comparison, ctx):
+    """
+    Joins two relations that are both sorted on their join keys, in
+    ascending order with NULLs first as ORDER BY sorts them, see
+    merge_key. Only the right rows sharing the current key are held
+    in memory.
+
+    Rows are returned in the order of the left relation, each followed
+    by its matches in the order of the right relation.
+    """
     left_key, right_key = comparison
 
     if left_join:
@@ -64,15 +421,33 @@ def hash_join(left_join, l_op, r_op, comparison, ctx):
     else:
         default = ()
 
-    for r_block in buffered(r, buffer_size):
-        probe = defaultdict(list)
-        for row in r_block:
-            probe[right_key(row, ctx)].append(row)
+    rights = ((merge_key(right_key(row, ctx)), row) for row in r_op(ctx))
+    right = next(rights, None)
+
+    key = None
+    matches = []
+
+    for l_row in l_op(ctx):
+        l_key = merge_key(left_key(l_row, ctx))
+
+        if l_key != key:
+            key = l_key
+            matches = []
+
+            while right is not None and right[0] < key:
+                right = next(rights, None)
+
+            while right is not None and right[0] == key:
+                matches.append(right[1])
+                right = next(rights, None)
 
-        for l_block in buffered(l_op(ctx), buffer_size):
-            for l_row in l_block:
-                for r_row in probe.get(left_key(l_row, ctx), default):
-                    yield l_row + r_row
+        for r_row in matches or default:
+            yield l_row + r_row
+
+
+def merge_key(key):
+    """Returns the key in a form that orders NULLs first"""
+    return tuple((value is not None, value) for value in key)
 
 
 def join_keys(left_schema, right_schema, op):
@@ -84,12 +459,22 @@ def join_keys(left_schema, right_schema, op):
 
     """
 
-    def key_func(funcs, row, ctx):
-        return tuple(f(row, ctx) for f in funcs)
+    return key_functions(
+        join_key_vars(left_schema, right_schema, op), left_schema, right_schema
+    )
+
 
-    l_key, r_key = zip(*join_keys_expr(left_schema, right_schema, op))
+def key_functions(pairs, left_schema, right_schema):
+    """
+    Returns the functions extracting the keys of the (left Var,
+    right Var) pairs from rows of the left and right relations.
+    """
+    l_vars, r_vars = zip(*pairs)
 
-    return partial(key_func, l_key), partial(key_func, r_key)
+    return (
+        codegen.compile_tuple(l_vars, left_schema, None, "left_key"),
+        codegen.compile_tuple(r_vars, right_schema, None, "right_key"),
+    )
 
 
 def join_keys_expr(left_schema, right_schema, op):
@@ -113,8 +498,22 @@ def join_keys_expr(left_schema, right_schema, op):
     and extract y from a row in the right relation.
     """
 
+    return tuple(
+        (var_expr(l_var, left_schema, None), var_expr(r_var, right_schema, None))
+        for l_var, r_var in join_key_vars(left_schema, right_schema, op)
+    )
+
+
+def join_key_vars(left_schema, right_schema, op):
+    """
+    Returns a tuple of (left Var, right Var) pairs, one for each
+    equality in op. The Vars are relative to the left and right
+    schemas respectively. See join_keys_expr for the forms of
+    op that are understood.
+    """
+
     if isinstance(op, And):
-        return join_keys_expr(left_schema, right_schema, op.lhs) + join_keys_expr(
+        return join_key_vars(left_schema, right_schema, op.lhs) + join_key_vars(
             left_schema, right_schema, op.rhs
         )
 
@@ -131,18 +530,18 @@ def join_keys_expr(left_schema, right_schema, op):
         parts = var.path.split(".")
         if len(parts) == 1:
             if left_schema.field_map.get(parts[0]):
-                cols[0] = var_expr(var, left_schema, None)
+                cols[0] = var
             elif right_schema.field_map.get(parts[0]):
-                cols[1] = var_expr(var, right_schema, None)
+                cols[1] = var
             else:
                 raise ValueError('column "{}" does not exist'.format(var.path))
         else:
             relation_name = parts[0]
             if left_schema.name == relation_name:
-                cols[0] = var_expr(Var(parts[1]), left_schema, None)
+                cols[0] = Var(parts[1])
             elif right_schema.name == relation_name:
-                cols[1] = var_expr(Var(parts[1]), right_schema, None)
+                cols[1] = Var(parts[1])
             else:
                 raise ValueError('relation "{}" does not exist'.format(parts[0]))
 
-    return (cols,)
+    return (tuple(cols),)
@@ -2,9 +2,8 @@
 import numbers
 import operator
 from functools import partial
-from itertools import islice
+from itertools import chain, count, islice
 
-from .. import compat
 from ..ast import *
 from ..operations import isa, visit_with, walk
 from ..schema_interpreter import JoinSchema, field_from_expr, relational_function
@@ -24,17 +23,21 @@ def old_div(a, b):
 def compile(query):
     # resolve views and schemas
 
-    return walk(
+    func = walk(
         query.operations,
         visit_with(
             query.dataset,
             (isa(LoadOp), load_relation),
             (isa(ProjectionOp), ensure_group_op_when_ags),
+            (isa(GroupByOp), ordered_group_by),
+            (isa(OrderByOp), top_n),
             (isa_op, relational_op),
             (is_callable, validate_function),
         ),
     )
 
+    return gathered(func)
+
 
 def isa_op(loc):
     return type(loc.node()) in RELATION_OPS
@@ -43,9 +46,86 @@ def isa_op(loc):
 def relational_op(dataset, loc, operation):
     func = RELATION_OPS[type(operation)](dataset, operation)
     func.schema = operation.schema
+    func.ordering = ordering_of(operation)
+    func.estimate = estimate_of(operation)
     return loc.replace(func)
 
 
+def estimate_of(operation):
+    """
+    Returns the function estimating the number of rows of the
+    compiled operation, for operations that return as many rows
+    as their relation, otherwise None.
+    """
+    if isinstance(operation, (AliasOp, OrderByOp, ProjectionOp)):
+        return estimate_for(operation.relation)
+    else:
+        return None
+
+
+def estimate_for(relation):
+    """
+    Returns the function estimating the number of rows of the
+    compiled relation, or None if it has none or it's only an upper
+    bound because the adapter filters or limits the rows it scans.
+    """
+    scan = getattr(relation, "scan", None)
+    if scan is not None and (scan.predicates or scan.limited):
+        return None
+    return getattr(relation, "estimate", None)
+
+
+def ordering_of(operation):
+    """
+    Returns the exprs the rows of the compiled operation are known
+    to be sorted by, or an empty tuple if they're in no known order.
+    """
+    if isinstance(operation, OrderByOp):
+        return operation.exprs
+    elif isinstance(operation, (AliasOp, DistinctOp, SelectionOp, SliceOp)):
+        return getattr(operation.relation, "ordering", ())
+    elif isinstance(operation, ProjectionOp):
+        return projected_ordering(
+            getattr(operation.relation, "ordering", ()),
+            expand_select_all(operation.exprs, operation.relation.schema),
+        )
+    else:
+        return ()
+
+
+def projected_ordering(ordering, exprs):
+    """
+    Returns the longest prefix of the ordering made of columns
+    that are projected as is by exprs.
+    """
+    projected = set(expr.path for expr in exprs if isinstance(expr, Var))
+
+    prefix = []
+    for expr in ordering:
+        var = expr.expr if isinstance(expr, (Asc, Desc)) else expr
+        if not isinstance(var, Var) or var.path not in projected:
+            break
+        prefix.append(expr)
+    return tuple(prefix)
+
+
+def is_sorted_on_all(relation):
+    """
+    Returns true if the relation is sorted on every one of its
+    columns, in which case equal rows are next to each other.
+    """
+    positions = set()
+    for expr in getattr(relation, "ordering", ()):
+        var = expr.expr if isinstance(expr, (Asc, Desc)) else expr
+        if isinstance(var, Var):
+            try:
+                positions.add(relation.schema.field_position(var.path))
+            except Exception:
+                pass
+
+    return len(positions) == len(relation.schema.fields)
+
+
 def load_relation(dataset, loc, operation):
     adapter = dataset.adapter_for(operation.name)
     return adapter.evaluate(loc)
@@ -71,7 +151,114 @@ def alias_op(dataset, operation):
         relation = operation.relation(ctx)
         return relation
 
-    return alias
+    return partitioned(alias, operation.relation, lambda partition: partition)
+
+
+def partitions_of(func, ctx):
+    """
+    Returns the functions that each produce part of the rows of func,
+    which is func itself if it's not partitioned.
+
+    Relations from adapters that can split their scans are partitioned
+    (see Adapter.partitions), as are the functions compiled from
+    operators that can work on each part of their input independently
+    (projections, selections...). Their ``partitions`` attribute is a
+    function that given a ctx returns the list of partitions.
+    """
+    partitions = getattr(func, "partitions", None)
+    return partitions(ctx) if partitions else [func]
+
+
+def partitioned(func, relation, apply):
+    """
+    Partitions func like relation, each partition of func being
+    apply(partition) for a partition of relation.
+    """
+    if getattr(relation, "partitions", None):
+
+        def partitions(ctx):
+            return [apply(partition) for partition in relation.partitions(ctx)]
+
+        func.partitions = partitions
+    return func
+
+
+def executor_for(ctx):
+    dataset = ctx.get("dataset")
+    return getattr(dataset, "executor", None) or SerialExecutor()
+
+
+def is_parallel(executor):
+    return getattr(executor, "max_workers", 1) > 1
+
+
+def gather(relation, ctx):
+    """
+    Returns the rows of relation. The partitions of a partitioned
+    relation are run by the dataset's executor, which for parallel
+    executors means scans, selections and projections run in parallel.
+    """
+    executor = executor_for(ctx)
+    if not is_parallel(executor):
+        return relation(ctx)
+
+    partitions = partitions_of(relation, ctx)
+    if len(partitions) == 1:
+        return partitions[0](ctx)
+
+    key = next(gathers)
+    run = partition_runner(relation, ctx)
+    run.partitions = (key, partitions)
+
+    # the dataset is inherited by the workers along with the runner
+    shared = {name: value for name, value in ctx.items() if name != "dataset"}
+    return chain.from_iterable(
+        executor.map(run, [(shared, key, index) for index in range(len(partitions))])
+    )
+
+
+# identifies the partitions listed by each gather
+gathers = count()
+
+
+def partition_runner(relation, ctx):
+    """
+    Returns the function executors call with (ctx, key, index) to run
+    the partition at index of relation, listed by the gather key.
+
+    The runner is created once per compiled relation and its arguments
+    can be pickled, so executors with worker processes keep using the
+    same workers for every execution of the plan. Workers that didn't
+    inherit the partitions of a gather list them again.
+    """
+    run = getattr(relation, "run_partition", None)
+    if run is None:
+        dataset = ctx.get("dataset")
+
+        def run(args):
+            shared, key, index = args
+            listed, partitions = run.partitions
+            local_ctx = dict(shared, dataset=dataset)
+            if listed != key:
+                partitions = partitions_of(relation, local_ctx)
+                run.partitions = (key, partitions)
+            return partitions[index](local_ctx)
+
+        run.partitions = (None, None)
+        relation.run_partition = run
+    return run
+
+
+def gathered(func):
+    """Returns a function that gathers the rows of a partitioned func"""
+    if not getattr(func, "partitions", None):
+        return func
+
+    def execute(ctx):
+        return gather(func, ctx)
+
+    execute.schema = func.schema
+    return execute
 
 
 def ensure_group_op_when_ags(dataset, loc, operation):
@@ -92,35 +279,94 @@ def ensure_group_op_when_ags(dataset, loc, operation):
 
 
 def distinct_op(dataset, operation):
-    def distinct(ctx):
-        relation = operation.relation(ctx)
-        seen = set()
-        for row in relation:
-            if row not in seen:
-                seen.add(row)
-                yield row
+    """
+    Removes duplicate rows. Rows that are already sorted on every
+    column are compared with their predecessor, others are hashed,
+    see hash_distinct.
+    """
+    if is_sorted_on_all(operation.relation):
+
+        def distinct(ctx):
+            return sorted_distinct(gather(operation.relation, ctx))
+
+    else:
+        row_size = row_size_for(operation.relation.schema)
+
+        def distinct(ctx):
+            return hash_distinct(
+                gather(operation.relation, ctx), ctx, row_size=row_size
+            )
 
     return distinct
 
 
+def hash_distinct(rows, ctx, level=0, row_size=None):
+    """
+    Returns the first occurrence of each distinct row.
+
+    Rows are returned in input order while the rows seen so far fit
+    the ``sort_buffer_size`` budget. Once they don't, rows that haven't
+    been seen yet are spilled to disk in hash partitions, which are
+    deduplicated one at a time after the rest of the input is read.
+    """
+    max_size = ctx.get("sort_buffer_size", MAX_SIZE)
+    row_size = row_size or record_size
+    seen = set()
+    size = 0
+    partitions = None
+
+    for row in rows:
+        if row in seen:
+            continue
+        elif partitions is not None:
+            partitions[spill.partition_of(row, level)].append(row)
+        else:
+            seen.add(row)
+            yield row
+            size += row_size(row)
+            if size >= max_size:
+                partitions = [
+                    spill.SpillFile(spill.spill_dir(ctx))
+                    for _ in range(spill.PARTITIONS)
+                ]
+
+    del seen
+
+    for partition in partitions or ():
+        with partition:
+            for row in hash_distinct(partition, ctx, level + 1, row_size):
+                yield row
+
+
+def sorted_distinct(rows):
+    """
+    Returns the first of each run of equal rows, which for sorted
+    rows removes every duplicate while holding a single row.
+    """
+    previous = missing = object()
+    for row in rows:
+        if previous is missing or row != previous:
+            yield row
+            previous = row
+
+
 def projection_op(dataset, operation):
     schema = operation.relation.schema
-    columns = tuple(
-        [
-            column
-            for group in [
-                column_expr(expr, schema, dataset) for expr in operation.exprs
-            ]
-            for column in group
-        ]
+    project = codegen.compile_tuple(
+        expand_select_all(operation.exprs, schema), schema, dataset, "projection"
     )
 
-    def projection(ctx):
-        relation = operation.relation(ctx)
+    def projection_of(relation_op):
+        def projection(ctx):
+            relation = relation_op(ctx)
 
-        return (tuple(col(row, ctx) for col in columns) for row in relation)
+            return (project(row, ctx) for row in relation)
 
-    return projection
+        return projection
+
+    return partitioned(
+        projection_of(operation.relation), operation.relation, projection_of
+    )
 
 
 def selection_op(dataset, operation):
@@ -128,14 +374,21 @@ def selection_op(dataset, operation):
     if operation.bool_op is None:
         return lambda relation, ctx: relation
 
-    predicate = value_expr(operation.bool_op, operation.schema, dataset)
+    predicate = codegen.compile_expr(
+        operation.bool_op, operation.schema, dataset, "selection"
+    )
 
-    def selection(ctx):
-        relation = operation.relation(ctx)
+    def selection_of(relation_op):
+        def selection(ctx):
+            relation = relation_op(ctx)
+
+            return (row for row in relation if predicate(row, ctx))
 
-        return (row for row in relation if predicate(row, ctx))
+        return selection
 
-    return selection
+    return partitioned(
+        selection_of(operation.relation), operation.relation, selection_of
+    )
 
 
 def union_all_op(dataset, operation):
@@ -146,78 +399,397 @@ def union_all_op(dataset, operation):
         for row in operation.right(ctx):
             yield row
 
+    def partitions(ctx):
+        return partitions_of(operation.left, ctx) + partitions_of(operation.right, ctx)
+
+    union_all.partitions = partitions
     return union_all
 
 
 def join_op(left_join, dataset, operation):
+    """
+    Equi joins whose inputs are both sorted on the join keys are
+    merge joined, other equi joins are hash joined, building on the
+    smaller relation, see estimated_hash_join. Any other condition is
+    evaluated against every pair of rows.
+    """
     left = operation.left
     right = operation.right
 
     try:
-        comparison = join_keys(left.schema, right.schema, operation.bool_op)
-        # left inner join
-        method = partial(hash_join, left_join)
+        pairs = join_key_vars(left.schema, right.schema, operation.bool_op)
     except ValueError:
         # icky cross product
         comparison = value_expr(operation.bool_op, operation.schema, dataset)
         method = nested_block_join
+    else:
+        sorted_pairs = sorted_join_keys(left, right, pairs)
+        if sorted_pairs and is_mergeable(dataset, left, right, sorted_pairs):
+            comparison = key_functions(sorted_pairs, left.schema, right.schema)
+            method = partial(merge_join, left_join)
+        else:
+            comparison = key_functions(pairs, left.schema, right.schema)
+            method = partial(hash_join, left_join)
+            if not left_join:
+                method = partial(estimated_hash_join, method)
 
     def join(ctx):
-        operation.left(ctx)
-        operation.right(ctx)
-
         return method(operation.left, operation.right, comparison, ctx)
 
     return join
 
 
+def estimated_hash_join(method, l_op, r_op, comparison, ctx):
+    """
+    Hash joins building on the relation estimated to return fewer
+    rows, or on whichever runs out first when either can't be
+    estimated, see join.smaller_side.
+    """
+    return method(l_op, r_op, comparison, ctx, build=build_side(l_op, r_op))
+
+
+def build_side(left, right):
+    """
+    Returns "left" or "right", the relation estimated to return fewer
+    rows, or None unless both can be estimated.
+    """
+    l_estimate = estimate_for(left)
+    r_estimate = estimate_for(right)
+    if l_estimate is None or r_estimate is None:
+        return None
+
+    l_rows = l_estimate()
+    r_rows = r_estimate()
+    if l_rows is None or r_rows is None:
+        return None
+    return "left" if l_rows <= r_rows else "right"
+
+
+def sorted_join_keys(left, right, pairs):
+    """
+    Returns the (left Var, right Var) pairs reordered to match the
+    order both relations are sorted in, or None unless both are
+    sorted ascending on all of the join keys.
+    """
+    left_positions = [left.schema.field_position(l_var.path) for l_var, _ in pairs]
+    right_positions = [right.schema.field_position(r_var.path) for _, r_var in pairs]
+    if len(set(left_positions)) != len(pairs):
+        return None
+
+    by_position = dict(zip(left_positions, zip(right_positions, pairs)))
+
+    left_order = ascending_positions(left)[: len(pairs)]
+    right_order = ascending_positions(right)[: len(pairs)]
+
+    if sorted(left_order) != sorted(left_positions):
+        return None
+    if right_order != [by_position[pos][0] for pos in left_order]:
+        return None
+
+    return tuple(by_position[pos][1] for pos in left_order)
+
+
+def ascending_positions(relation):
+    """
+    Returns the positions of the columns the relation is known
+    to be sorted ascending by.
+    """
+    positions = []
+    for expr in getattr(relation, "ordering", ()):
+        var = expr.expr if isinstance(expr, Asc) else expr
+        if not isinstance(var, Var):
+            break
+        try:
+            positions.append(relation.schema.field_position(var.path))
+        except Exception:
+            break
+    return positions
+
+
+def is_mergeable(dataset, left, right, pairs):
+    """
+    Returns true if the join keys can be ordered, i.e. each pair
+    of keys are of the same orderable type.
+    """
+    for l_var, r_var in pairs:
+        l_type = sort.field_type(l_var, left.schema, dataset)
+        r_type = sort.field_type(r_var, right.schema, dataset)
+        if l_type is None or r_type is None:
+            return False
+        if l_type != r_type and not (l_type in sort.NUMBERS and r_type in sort.NUMBERS):
+            return False
+    return True
+
+
 def order_by_op(dataset, operation):
-    columns = tuple(
-        value_expr(expr, operation.relation.schema, dataset) for expr in operation.exprs
-    )
-    operation.schema
+    key_for, reverse, generic_for = sort_key_op(dataset, operation)
+    row_size = row_size_for(operation.relation.schema)
 
     def order_by(ctx):
-        relation = operation.relation(ctx)
+        relation = gather(operation.relation, ctx)
+        generic = generic_for(ctx) if generic_for else None
 
-        def key(row):
-            return tuple(compat.python2_sort_key(c(row, ctx)) for c in columns)
-
-        return sorted(relation, key=key)
+        return sort.external_sort(
+            relation, key_for(ctx), reverse, ctx, row_size, generic
+        )
 
     return order_by
 
 
-def group_by_op(dataset, group_op):
+def sort_key_op(dataset, operation):
+    """
+    Returns the SortKey for ordering the relation of operation
+    by operation.exprs
+    """
+    return sort.sort_key(operation.exprs, operation.relation.schema, dataset)
+
+
+def top_n(dataset, loc, operation):
+    """
+    Fuses an OrderByOp with the SliceOp that limits it, so only
+    the rows that will be returned are kept rather than sorting
+    the whole relation.
+    """
+    parent = loc.up()
+    if is_top_n(parent):
+        slice_op = parent.node()
+        func = top_n_op(dataset, slice_op)
+        func.schema = slice_op.schema
+        func.ordering = operation.exprs
+        return parent.replace(func)
+
+    return loc
+
+
+def is_top_n(loc):
+    """Returns true if loc is a bounded SliceOp of an OrderByOp"""
+    slice_op = loc and loc.node()
+    return (
+        isinstance(slice_op, SliceOp)
+        and slice_op.stop is not None
+        and isinstance(slice_op.relation, OrderByOp)
+    )
+
+
+def top_n_op(dataset, slice_op):
+    """
+    Returns the rows slice_op.start to slice_op.stop of the ordered
+    relation using a heap of at most slice_op.stop rows. Ties are
+    kept in their input order, as with sorted().
+    """
+    order_op = slice_op.relation
+    key_for, reverse, generic_for = sort_key_op(dataset, order_op)
+
+    def top_n(ctx):
+        relation = gather(order_op.relation, ctx)
+        generic = generic_for(ctx) if generic_for else None
+        rows = sort.top_n(relation, slice_op.stop, key_for(ctx), reverse, generic)
+        return islice(rows, slice_op.start, None)
+
+    return top_n
 
-    if group_op.exprs:
-        load = order_by_op(dataset, group_op)
-        load.schema = group_op.schema
-    else:
-        # we're aggregating the whole table
-        load = group_op.relation
 
-    group_op.exprs
+def ordered_group_by(dataset, loc, group_op):
+    """
+    Groups by sorting when the parent operation orders the results
+    by the group keys anyway. The sort leaves the groups in the
+    requested order, so the parent OrderByOp is dropped.
+    """
+    parent = loc.up()
+    order_op = parent and parent.node()
+
+    if (
+        isinstance(order_op, OrderByOp)
+        and group_op.exprs
+        and is_group_key_order(order_op.exprs, group_op.exprs)
+    ):
+        func = sorted_group_by_op(dataset, group_op)
+        func.schema = order_op.schema
+        func.ordering = order_op.exprs
+        return parent.replace(func)
+
+    return loc
+
+
+def is_group_key_order(order_exprs, group_exprs):
+    """
+    Returns true if sorting by the group exprs satisfies the order
+    exprs, i.e. they're an ascending prefix of the group exprs.
+    """
+    if len(order_exprs) > len(group_exprs):
+        return False
+
+    for order_expr, group_expr in zip(order_exprs, group_exprs):
+        if isinstance(order_expr, Asc):
+            order_expr = order_expr.expr
+        if order_expr != group_expr:
+            return False
+    return True
+
+
+def group_by_op(dataset, group_op):
+    """
+    Groups rows by hashing their keys. Groups are emitted in no
+    particular order, see ordered_group_by for when they need to be.
+
+    When the input is partitioned, the dataset has a parallel executor
+    and every aggregate can merge its state, each partition is
+    aggregated on its own by the executor and the partial results
+    are merged, see partial_aggregate.
+    """
     aggs = group_op.aggregates
 
     initialize = initialize_op(aggs)
-    accumalate = accumulate_op(aggs)
+    accumulate = accumulate_op(aggs)
+    merge = merge_op(aggs)
     finalize = finalize_op(aggs)
 
     if group_op.exprs:
-        key = key_op(group_op.exprs, load.schema)
+        key = key_op(group_op.exprs, group_op.relation.schema)
     else:
         # it's all aggregates with no group by elements
-        # so no need to order the table
         key = lambda row, ctx: None
 
+    row_size = row_size_for(group_op.relation.schema)
+
+    def start(row):
+        return accumulate(initialize(row), row)
+
+    def aggregated(partition):
+        def aggregate(ctx):
+            return partial_aggregate(
+                partition(ctx), key, start, accumulate, ctx, row_size
+            )
+
+        return aggregate
+
+    # partitioned like the input, each partition aggregating its part
+    partials = partitioned(aggregated(group_op.relation), group_op.relation, aggregated)
+
+    def group_by(ctx):
+        if (
+            merge is not None
+            and getattr(partials, "partitions", None)
+            and is_parallel(executor_for(ctx))
+        ):
+            records = hash_aggregate(gather(partials, ctx), key, list, merge, ctx)
+        else:
+            records = hash_aggregate(
+                gather(group_op.relation, ctx), key, start, accumulate, ctx, row_size
+            )
+
+        return (finalize(record) for record in records)
+
+    return group_by
+
+
+def hash_aggregate(rows, key, start, combine, ctx, row_size=None, level=0):
+    """
+    Returns a record per distinct key of rows, where start(row)
+    creates the record for the first row of a key and combine(record,
+    row) folds each further row into it.
+
+    Each distinct key keeps a single record in memory. Once those
+    records exceed the ``sort_buffer_size`` budget, rows for keys that
+    haven't been seen yet are spilled to disk in hash partitions, which
+    are aggregated one at a time after the in memory records have been
+    returned. Rows are measured with row_size, see join.row_size_for,
+    or record_size by default.
+    """
+    max_size = ctx.get("sort_buffer_size", MAX_SIZE)
+    row_size = row_size or record_size
+    groups = {}
+    size = 0
+    partitions = None
+
+    for row in rows:
+        group = key(row, ctx)
+        record = groups.get(group)
+        if record is not None:
+            combine(record, row)
+        elif partitions is not None:
+            partitions[spill.partition_of(group, level)].append(row)
+        else:
+            groups[group] = start(row)
+            size += row_size(row)
+            if size >= max_size:
+                partitions = [
+                    spill.SpillFile(spill.spill_dir(ctx))
+                    for _ in range(spill.PARTITIONS)
+                ]
+
+    for record in groups.values():
+        yield record
+
+    del groups
+
+    for partition in partitions or ():
+        with partition:
+            for record in hash_aggregate(
+                partition, key, start, combine, ctx, row_size, level + 1
+            ):
+                yield record
+
+
+def partial_aggregate(rows, key, start, accumulate, ctx, row_size=None):
+    """
+    First phase of a two phase aggregation, returns a record for
+    each distinct key of rows holding the partially aggregated state.
+
+    Rather than spilling, the records are returned whenever they
+    exceed the ``sort_buffer_size`` budget and aggregation starts
+    over, so a key can have more than one partial record. Partial
+    records are combined by merging their states with Aggregate.merge.
+    """
+    max_size = ctx.get("sort_buffer_size", MAX_SIZE)
+    row_size = row_size or record_size
+    groups = {}
+    size = 0
+
+    for row in rows:
+        group = key(row, ctx)
+        record = groups.get(group)
+        if record is not None:
+            accumulate(record, row)
+        else:
+            groups[group] = start(row)
+            size += row_size(row)
+            if size >= max_size:
+                for record in groups.values():
+                    yield record
+                groups = {}
+                size = 0
+
+    for record in groups.values():
+        yield record
+
+
+def sorted_group_by_op(dataset, group_op):
+    """
+    Groups rows by sorting them on their keys then aggregating
+    each run of equal keys. Groups are emitted in key order.
+    """
+    load = order_by_op(dataset, group_op)
+
+    aggs = group_op.aggregates
+
+    initialize = initialize_op(aggs)
+    accumalate = accumulate_op(aggs)
+    finalize = finalize_op(aggs)
+
+    key = key_op(group_op.exprs, group_op.relation.schema)
+
     def group_by(ctx):
         ordered_relation = load(ctx)
 
         def group():
             records = iter(ordered_relation)
 
-            row = next(records)
+            for row in records:
+                break
+            else:
+                return
+
             group = key(row, ctx)
 
             record = accumalate(initialize(row), row)
@@ -240,11 +812,26 @@ def group_by_op(dataset, group_op):
 def slice_op(dataset, expr):
     def limit(ctx):
         relation = expr.relation(ctx)
-        return islice(relation, expr.start, expr.stop)
+        return limit_rows(relation, expr.start, expr.stop)
 
     return limit
 
 
+def limit_rows(rows, start, stop):
+    """
+    Yields the rows from start up to stop. Once done rows is closed,
+    so scans release the files they hold open straight away rather
+    than when they're garbage collected.
+    """
+    rows = iter(rows)
+    try:
+        yield from islice(rows, start, stop)
+    finally:
+        close = getattr(rows, "close", None)
+        if close is not None:
+            close()
+
+
 def is_aggregate(expr, dataset):
     """Returns true if the expr is an aggregate function."""
     if isinstance(expr, RenameOp):
@@ -280,12 +867,9 @@ def group_by_error(exprs, aggs):
 
 
 def key_op(exprs, schema):
-    positions = tuple(schema.field_position(expr.path) for expr in exprs)
-
-    def key(row, ctx):
-        return tuple(row[pos] for pos in positions)
-
-    return key
+    return codegen.compile_tuple(
+        [Var(expr.path) for expr in exprs], schema, None, "group_key"
+    )
 
 
 def initialize_op(pos_and_aggs):
@@ -310,6 +894,22 @@ def accumulate_op(pos_and_aggs):
     return accumulate
 
 
+def merge_op(pos_and_aggs):
+    """
+    Returns a function that merges the states of one partial record
+    into another, or None if any of the aggregates can't be merged.
+    """
+    if not all(agg.merge for pos, agg in pos_and_aggs):
+        return None
+
+    def merge(record, other):
+        for pos, agg in pos_and_aggs:
+            record[pos] = agg.merge(record[pos], other[pos])
+        return record
+
+    return merge
+
+
 def finalize_op(pos_and_aggs):
     def finalize(record):
         # convert the tuple to a list so we can modify it
@@ -345,11 +945,29 @@ def column_expr(expr, schema, dataset):
         return (value_expr(expr, schema, dataset),)
 
 
-def select_all_expr(expr, schema, dataset):
+def expand_select_all(exprs, schema):
+    """
+    Returns the exprs with each SelectAllExpr replaced by a Var
+    for every field it selects.
+    """
+    expanded = []
+    for expr in exprs:
+        if isinstance(expr, SelectAllExpr):
+            expanded.extend(Var(f.path) for f in select_all_fields(expr, schema))
+        else:
+            expanded.append(expr)
+    return expanded
+
+
+def select_all_fields(expr, schema):
     if expr.table is None:
-        fields = schema.fields
+        return schema.fields
     else:
-        fields = [f for f in schema.fields if f.schema_name == expr.table]
+        return [f for f in schema.fields if f.schema_name == expr.table]
+
+
+def select_all_expr(expr, schema, dataset):
+    fields = select_all_fields(expr, schema)
 
     return [var_expr(Var(f.path), schema, dataset) for f in fields]
 
@@ -506,4 +1124,15 @@ RELATION_OPS = {
 }
 
 # sigh, oh python and your circular import
-from .join import hash_join, join_keys, nested_block_join
+from ..executor import SerialExecutor
+from . import codegen, sort, spill
+from .join import (
+    MAX_SIZE,
+    hash_join,
+    join_key_vars,
+    key_functions,
+    merge_join,
+    nested_block_join,
+    record_size,
+    row_size_for,
+)
@@ -0,0 +1,224 @@
+# type: ignore
+"""
+Sort keys and the external merge sort used by ORDER BY, top n and
+sort based grouping.
+
+Sort keys are compiled from the ORDER BY expressions. Columns whose
+type is known from the schema are compared as plain values, each
+preceded by a flag that orders NULLs before every other value:
+
+  order by x, name
+
+  becomes
+
+  def sort_key(row):
+      v0 = row[0]
+      v1 = row[3]
+      return (v0 is not None, v0, v1 is not None, v1,)
+
+Columns of unknown or mixed types are wrapped in
+compat.python2_sort_key instead. When every column is descending the
+ascending key is used with reverse=True, otherwise numbers are negated
+and other descending values are wrapped in Descending.
+
+Adapters don't guarantee their values match the schema, a STRING
+column may well hold an int. When the typed key can't compare the
+values, the rows are sorted again with the generic key, wrapping every
+column in python2_sort_key.
+"""
+
+import heapq
+from collections import namedtuple
+from itertools import islice
+
+from .. import compat
+from ..ast import Asc, Desc
+from ..schema_interpreter import field_from_expr
+from . import codegen, spill
+from .join import MAX_SIZE, buffered, record_size
+
+# key_for(ctx) returns the key function, reverse is passed
+# along with it to sorted(), heapq.merge() etc.. generic_for(ctx)
+# returns the key to fall back on when the values of key_for(ctx)
+# don't compare, or generic_for is None when they're the same key.
+SortKey = namedtuple("SortKey", "key_for reverse generic_for")
+
+NUMBERS = ("INTEGER", "FLOAT")
+ORDERED = NUMBERS + ("STRING", "BOOLEAN", "DATE", "DATETIME", "TIME")
+
+ASCENDING = "{v} is not None, {v}"
+DESCENDING_NUMBER = "{v} is None, 0 if {v} is None else -{v}"
+DESCENDING = "{v} is None, _descending({v})"
+GENERIC = "_python2_sort_key({v})"
+DESCENDING_GENERIC = "_descending(_python2_sort_key({v}))"
+
+# rows top_n selects from at a time when it may fall back on the
+# generic key, see top_n
+TOP_N_BLOCK_SIZE = 1024
+
+
+class Descending(object):
+    """Reverses the ordering of the wrapped value"""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __hash__(self):
+        return hash(self.value)
+
+
+def sort_key(exprs, schema, dataset):
+    """
+    Returns the SortKey for ordering rows of the schema by exprs.
+    """
+    descending = [isinstance(expr, Desc) for expr in exprs]
+    exprs = [expr.expr if isinstance(expr, (Asc, Desc)) else expr for expr in exprs]
+
+    # a single reversed pass is cheaper than reversing each value
+    reverse = all(descending)
+    if reverse:
+        descending = [False] * len(exprs)
+
+    templates = [
+        component_template(field_type(expr, schema, dataset), desc)
+        for expr, desc in zip(exprs, descending)
+    ]
+    generic = [component_template(None, desc) for desc in descending]
+
+    return SortKey(
+        compile_sort_key(exprs, templates, schema, dataset),
+        reverse,
+        (
+            None
+            if templates == generic
+            else compile_sort_key(exprs, generic, schema, dataset)
+        ),
+    )
+
+
+def field_type(expr, schema, dataset):
+    """
+    Returns the type of the expr if every value of it is comparable
+    with python's own operators, otherwise None.
+    """
+    try:
+        field = field_from_expr(expr, dataset, schema)
+    except Exception:
+        # types can't be determined for every expression
+        return None
+
+    if field is None or field.mode == "REPEATED":
+        return None
+
+    return field.type if field.type in ORDERED else None
+
+
+def component_template(type, descending):
+    if type is None:
+        return DESCENDING_GENERIC if descending else GENERIC
+    elif not descending:
+        return ASCENDING
+    elif type in NUMBERS:
+        return DESCENDING_NUMBER
+    else:
+        return DESCENDING
+
+
+def compile_sort_key(exprs, templates, schema, dataset):
+    namespace = dict(_descending=Descending, _python2_sort_key=compat.python2_sort_key)
+
+    lines = []
+    components = []
+    for pos, (expr, template) in enumerate(zip(exprs, templates)):
+        value = "v{}".format(pos)
+        source = codegen.expr_source(expr, schema, dataset, namespace).source
+        lines.append("        {} = {}\n".format(value, source))
+        components.append(template.format(v=value))
+
+    code = (
+        "def sort_key_for(ctx):\n"
+        "    def sort_key(row):\n"
+        "{lines}"
+        "        return {key}\n"
+        "    return sort_key\n"
+    ).format(lines="".join(lines), key=codegen.tuple_source(components))
+
+    return codegen.exec_source(code, "sort_key_for", namespace)
+
+
+def external_sort(rows, key, reverse, ctx, row_size=record_size, generic=None):
+    """
+    Sorts the rows holding at most ``sort_buffer_size`` bytes of them
+    in memory, as measured by row_size. Larger inputs are sorted in runs that fit the budget,
+    all but the last are spilled to disk, and the runs are then merged
+    lazily. The sort is stable.
+
+    When key raises a TypeError the rows are sorted with the generic
+    key instead. Runs are merged with the generic key, as runs that
+    each sort with key may still hold values that don't compare with
+    those of other runs.
+    """
+    max_size = ctx.get("sort_buffer_size", MAX_SIZE)
+    spilled = []
+    run = []
+
+    for block in buffered(rows, max_size, row_size):
+        if run:
+            spilled.append(spill.SpillFile(spill.spill_dir(ctx)).extend(run))
+        try:
+            run = sorted(block, key=key, reverse=reverse)
+        except TypeError:
+            if generic is None:
+                raise
+            # python2_sort_key orders comparable values as they are,
+            # so the runs spilled so far are sorted by it as well
+            key, generic = generic, None
+            run = sorted(block, key=key, reverse=reverse)
+
+    if not spilled:
+        return run
+
+    return merge_runs(spilled + [run], generic or key, reverse)
+
+
+def merge_runs(runs, key, reverse=False):
+    try:
+        for row in heapq.merge(*runs, key=key, reverse=reverse):
+            yield row
+    finally:
+        for run in runs:
+            if isinstance(run, spill.SpillFile):
+                run.close()
+
+
+def top_n(rows, n, key, reverse, generic=None):
+    """
+    Returns the first n rows of the sorted rows, falling back on the
+    generic key when key raises a TypeError, see external_sort.
+    """
+    select = heapq.nlargest if reverse else heapq.nsmallest
+    if generic is None:
+        return select(n, rows, key=key)
+
+    # select from blocks of rows, so the rows key failed on are
+    # still at hand to select from again with the generic key
+    rows = iter(rows)
+    size = max(n, TOP_N_BLOCK_SIZE)
+    top = []
+    for block in iter(lambda: list(islice(rows, size)), []):
+        try:
+            top = select(n, top + block, key=key)
+        except TypeError:
+            if key is generic:
+                raise
+            key = generic
+            top = select(n, top + block, key=key)
+    return top
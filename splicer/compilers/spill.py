@@ -0,0 +1,83 @@
+# type: ignore
+"""
+Temporary storage for operators whose input doesn't fit within
+their memory budget.
+
+Rows are pickled to anonymous temporary files in chunks, which are
+deleted as soon as they're closed. The directory they're created in
+can be set with the ``spill_dir`` ctx knob, it defaults to the
+platform's temporary directory.
+"""
+import pickle
+import tempfile
+
+CHUNK_SIZE = 1024
+PARTITIONS = 16
+
+
+class SpillFile(object):
+    """
+    Append only sequence of rows backed by a temporary file.
+
+    Rows are read back in the order they were written, the file
+    can be iterated over any number of times.
+    """
+
+    def __init__(self, dir=None):
+        self.file = tempfile.TemporaryFile(dir=dir)
+        self.buffer = []
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        self.flush()
+        self.file.seek(0)
+        while True:
+            try:
+                chunk = pickle.load(self.file)
+            except EOFError:
+                break
+            for row in chunk:
+                yield row
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, row):
+        self.buffer.append(row)
+        self.count += 1
+        if len(self.buffer) >= CHUNK_SIZE:
+            self.flush()
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+        return self
+
+    def flush(self):
+        if self.buffer:
+            self.file.seek(0, 2)
+            pickle.dump(self.buffer, self.file, pickle.HIGHEST_PROTOCOL)
+            self.buffer = []
+
+    def close(self):
+        self.buffer = []
+        self.file.close()
+
+
+def spill_dir(ctx):
+    return ctx.get("spill_dir")
+
+
+def partition_of(key, level, partitions=PARTITIONS):
+    """
+    Returns which of the partitions the key belongs to. The level
+    salts the hash so rows that landed in the same partition are
+    spread out again when that partition is itself partitioned.
+    """
+    return hash((level, key)) % partitions
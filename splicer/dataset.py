@@ -1,21 +1,25 @@
-from typing import Any, Callable, Optional
+from typing import Any, AsyncIterator, Callable, Hashable, Optional
 
 from zipper import Loc  # type: ignore
 
-from . import compat, functions
+from . import compat, functions, statistics
 from .adapters import Adapter
 from .adapters.null_adapter import NullAdapter
 from .aggregate import Aggregate  # type: ignore
 from .ast import AliasOp, Expr, LoadOp, RelationalOp
-from .compilers import local  # type: ignore
+from .compilers import aio, local  # type: ignore
 from .compilers.local import relational_function  # type: ignore
+from .executor import Executor, SerialExecutor  # type: ignore
 from .field import Field
 from .operations import walk  # type: ignore
-from .query import Query, view_replacer
+from .optimizer import optimize  # type: ignore
+from .plan_cache import PlanCache
+from .query import PreparedQuery, Query, view_replacer
 from .query_builder import QueryBuilder  # type: ignore
-from .query_parser import parse_statement  # type: ignore
+from .query_parser import parse_statement, tokenize  # type: ignore
 from .relation import Relation
 from .schema import Schema
+from .statistics import Statistics
 
 DumpFunc = Callable[[Schema, Relation], None]
 
@@ -26,11 +30,17 @@ class DataSet(object):
 
         self.relation_cache: dict[str, Relation] = {}
         self.schema_cache: dict[str, Schema] = {}
+        # Statistics computed by analyze by relation name
+        self.statistics_cache: dict[str, Statistics] = {}
 
         self.views: dict[str, AliasOp] = {}
 
-        self.executor = None
+        # compiled plans of executed statements, see splicer.plan_cache
+        self.plan_cache = PlanCache()
+
+        self.executor: Executor = SerialExecutor()
         self.compile: Callable[..., Any] = local.compile  # type: ignore
+        self.optimize: Callable[[Query], Query] = optimize
         self.dump_func: Optional[DumpFunc] = None
         self.udfs: dict[str, Callable[..., Any]] = {}
 
@@ -49,6 +59,7 @@ class DataSet(object):
 
         if adapter not in self.adapters:
             self.adapters.append(adapter)
+            self.plan_cache.clear()
         return adapter
 
     def create_view(self, name: str, query_or_operations: str | RelationalOp) -> None:
@@ -58,12 +69,13 @@ class DataSet(object):
             operations = query_or_operations
 
         self.views[name] = AliasOp(name, operations, operations.schema)
+        self.plan_cache.clear()
 
-    def aggregate(self, returns=None, initial=None, name=None, finalize=None):  # type: ignore
+    def aggregate(self, returns=None, initial=None, name=None, finalize=None, merge=None):  # type: ignore
         def _(func, name):  # type: ignore
             if name is None:
                 name = func.__name__
-            self.add_aggregate(name, func, returns, initial, finalize)
+            self.add_aggregate(name, func, returns, initial, finalize, merge)
             return func
 
         return _
@@ -86,10 +98,15 @@ class DataSet(object):
 
         return _
 
-    def add_aggregate(self, name, func, returns, initial, finalize=None):  # type: ignore
+    def add_aggregate(self, name, func, returns, initial, finalize=None, merge=None):  # type: ignore
         self.aggregates[name] = Aggregate(
-            function=func, returns=returns, initial=initial, finalize=finalize
+            function=func,
+            returns=returns,
+            initial=initial,
+            finalize=finalize,
+            merge=merge,
         )
+        self.plan_cache.clear()
 
     def add_function(self, name, function, returns=None):  # type: ignore
         if name in self.udfs:
@@ -104,6 +121,7 @@ class DataSet(object):
             function.returns = None
 
         self.udfs[name] = function
+        self.plan_cache.clear()
 
     def get_function(self, name: str) -> Callable[..., Any]:
         function = self.udfs.get(name) or self.aggregates.get(name)
@@ -182,8 +200,43 @@ class DataSet(object):
         #   func = relational_function(self, schema_or_expr)
         #   return func({})
 
+    def analyze(self, name: str) -> Statistics:
+        """
+        Scans the relation computing its Statistics, which are used
+        to plan queries on it from then on instead of any the adapter
+        reports. Run it again once the relation's rows change.
+        """
+        query = Query(self, LoadOp(name))
+        stats = statistics.collect(query.schema, self.execute(query))
+        self.statistics_cache[name] = stats
+        self.plan_cache.clear()
+        return stats
+
     def set_compiler(self, compile_fun: Callable[..., Any]) -> None:
         self.compile = compile_fun
+        self.plan_cache.clear()
+
+    def set_optimizer(self, optimize_fun: Callable[[Query], Query]) -> None:
+        """
+        Sets the function used to rewrite queries before they're
+        compiled, pass `lambda query: query` to run queries as written.
+        """
+        self.optimize = optimize_fun
+        self.plan_cache.clear()
+
+    def set_plan_cache_size(self, size: int) -> None:
+        """
+        Sets the number of compiled plans of statements kept for
+        executing them again, 0 disables caching.
+        """
+        self.plan_cache.resize(size)
+
+    def set_executor(self, executor: Executor) -> None:
+        """
+        Sets the executor used to run the partitions of queries,
+        see splicer.executor
+        """
+        self.executor = executor
 
     def set_dump_func(self, dump_func: DumpFunc) -> None:
         self.dump_func = dump_func
@@ -192,19 +245,73 @@ class DataSet(object):
         if self.dump_func is not None:
             self.dump_func(schema, relation)
 
-    def execute(self, query: Query | str, *params: Any) -> Any:
+    def execute(self, query: Query | PreparedQuery | str, *params: Any) -> Any:
         if isinstance(query, str):
-            query = self.query(query)
+            func = self.plan(query, self.compile)
+        elif isinstance(query, PreparedQuery):
+            func = query.plan(self.compile, params)
+        else:
+            func = self.compile(self.optimize(query))
+        ctx = {"dataset": self, "params": params}
+
+        return func(ctx)
 
-        func = self.compile(query)
+    def aexecute(
+        self, query: Query | PreparedQuery | str, *params: Any
+    ) -> AsyncIterator[Any]:
+        """
+        Returns an async iterator of the query's rows, for use with
+        ``async for``, see splicer.compilers.aio
+        """
+        if isinstance(query, str):
+            func = self.plan(query, aio.compile)
+        elif isinstance(query, PreparedQuery):
+            func = query.plan(aio.compile, params)
+        else:
+            func = aio.compile(self.optimize(query))
         ctx = {"dataset": self, "params": params}
 
         return func(ctx)
 
+    def plan(self, statement: str, compile_fun: Callable[..., Any]) -> Any:
+        """
+        Returns the statement optimized and compiled by compile_fun,
+        reusing the plan from the last time it was if neither the
+        catalog nor the adapters have changed since.
+        """
+        return self.cached_plan(
+            (compile_fun, tuple(tokenize(statement))),
+            lambda: compile_fun(self.optimize(self.query(statement))),
+        )
+
+    def cached_plan(self, key: tuple[Hashable, ...], build: Callable[[], Any]) -> Any:
+        """
+        Returns the plan cached under the key and the versions of
+        the adapters, or the plan returned by build() cached there.
+        """
+        key += (tuple(adapter.version() for adapter in self.adapters),)
+        func = self.plan_cache.get(key)
+        if func is None:
+            func = build()
+            self.plan_cache.put(key, func)
+        return func
+
     def query(self, statement: str) -> Query:
         """Parses the statement and returns a Query"""
         return Query(self, parse_statement(statement))
 
+    def prepare(self, statement: str) -> PreparedQuery:
+        """
+        Parses the statement and returns a PreparedQuery, whose
+        parameters are bound as constants each time it's executed.
+
+          employees = dataset.prepare(
+              "select * from employees where department = ?0"
+          )
+          employees.execute("sales")
+        """
+        return PreparedQuery(self, statement)
+
     def frm(self, relation_or_stmt):  # type: ignore
         return QueryBuilder(self).frm(relation_or_stmt)
 
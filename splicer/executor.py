@@ -0,0 +1,192 @@
+# type: ignore
+"""
+Executors run the partitions of a query.
+
+Compiled operators that can process each part of their input
+independently (scans of adapters that support splits, selections,
+projections, partial aggregates...) are run by the dataset's executor
+one partition at a time.
+
+  dataset.set_executor(ProcessExecutor())
+
+SerialExecutor, the default, runs the partitions one after another in
+the current process. ProcessExecutor runs them on a pool of worker
+processes, call its close method once it's no longer needed.
+"""
+
+import multiprocessing
+import os
+import pickle
+import threading
+import weakref
+from collections import deque
+from concurrent import futures
+from functools import partial
+from itertools import count
+
+# functions given to ProcessExecutor.map that can't be pickled are
+# registered here and inherited by the workers when they fork, so
+# closures don't have to be pickled, the workers look them up by
+# token instead
+_tasks = weakref.WeakValueDictionary()
+# the tokens of the registered functions by their id
+_registered = {}
+_tokens = count()
+_lock = threading.Lock()
+_in_worker = False
+
+
+def register(func):
+    """
+    Returns the token workers forked from now on look func up by.
+    It's the same token for as long as func is alive, so workers
+    are reused by every map of the same function.
+    """
+    with _lock:
+        token = _registered.get(id(func))
+        if token is None:
+            token = _registered[id(func)] = next(_tokens)
+            _tasks[token] = func
+            weakref.finalize(func, _registered.pop, id(func), None)
+    return token
+
+
+def _run_task(token, item):
+    return _run(_tasks[token], item)
+
+
+def _run(func, item):
+    global _in_worker
+    _in_worker = True
+
+    return list(func(item))
+
+
+def _apply_at(func, items, index):
+    return func(items[index])
+
+
+def picklable(*values):
+    try:
+        pickle.dumps(values)
+    except Exception:
+        return False
+    return True
+
+
+class Executor(object):
+    # executors with more than one worker are considered parallel
+    max_workers = 1
+
+    def map(self, func, items):
+        """
+        Returns an iterator of func(item) for each item, in order.
+        func is expected to return an iterable of rows.
+        """
+        raise NotImplementedError(
+            "{} has not implemented map".format(self.__class__.__name__)
+        )
+
+    def close(self):
+        """Releases the executor's workers, if it has any."""
+
+
+class SerialExecutor(Executor):
+    def map(self, func, items):
+        return (func(item) for item in items)
+
+
+class ProcessExecutor(Executor):
+    """
+    Runs each item on a pool of forked worker processes.
+
+    The pool is started by the first map and reused by the following
+    ones until close is called. Functions that can't be pickled are
+    inherited when the workers fork, so they can be closures, but a
+    closure the workers didn't inherit starts a new pool for it. Map
+    the same closure over picklable items to reuse the workers, as
+    the local compiler does for every execution of a compiled plan.
+    Only the rows the functions return need to be picklable. At most
+    max_workers * 2 items are in flight at once to bound the memory
+    used by results waiting to be consumed.
+
+    Platforms that can't fork, and workers themselves, run the items
+    serially.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._pool = None
+        # tasks registered up to this token are known to the pool's workers
+        self._inherited = -1
+        self._lock = threading.Lock()
+
+    def map(self, func, items):
+        items = list(items)
+
+        if (
+            len(items) < 2
+            or _in_worker
+            or "fork" not in multiprocessing.get_all_start_methods()
+        ):
+            return SerialExecutor().map(func, items)
+
+        return self._map(func, items)
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    def _submit(self, token, task, *args):
+        """
+        Submits task to a pool whose workers know the task registered
+        with token, starting one if needed.
+        """
+        with self._lock:
+            if self._pool is None or token > self._inherited:
+                if self._pool is not None:
+                    # the items already submitted to it still run
+                    self._pool.shutdown(wait=False)
+                # all the workers of a pool using fork start with its first task
+                self._pool = futures.ProcessPoolExecutor(
+                    self.max_workers, mp_context=multiprocessing.get_context("fork")
+                )
+                with _lock:
+                    self._inherited = max(_registered.values(), default=-1)
+            return self._pool.submit(task, *args)
+
+    def _map(self, func, items):
+        sent = picklable(items)
+        if sent and picklable(func):
+            # sent to the workers, so any pool can run them
+            token = -1
+            task = _run
+            args = [(func, item) for item in items]
+        else:
+            if not sent:
+                # the items are inherited along with the function
+                func = partial(_apply_at, func, items)
+                items = range(len(items))
+            token = register(func)
+            task = _run_task
+            args = [(token, item) for item in items]
+
+        pending = deque()
+        try:
+            indexes = iter(args)
+            pending.extend(
+                self._submit(token, task, *arg)
+                for _, arg in zip(range(self.max_workers * 2), indexes)
+            )
+
+            while pending:
+                rows = pending.popleft().result()
+                for arg in indexes:
+                    pending.append(self._submit(token, task, *arg))
+                    break
+                yield rows
+        finally:
+            for future in pending:
+                future.cancel()
@@ -1,3 +1,4 @@
+import operator
 from abc import abstractmethod
 from typing import Any, Protocol, TypeVar
 
@@ -30,13 +31,18 @@ class Comparable(Protocol):
 def init(dataset):
     dataset.add_aggregate(
         "count",
-        func=lambda state: state + 1,
+        func=count,
         returns=Field(name="count", type="INTEGER"),
         initial=0,
+        merge=operator.add,
     )
 
     dataset.add_aggregate(
-        "min", func=min, returns=Field(name="min", type="INTEGER"), initial=float("Inf")
+        "min",
+        func=min,
+        returns=Field(name="min", type="INTEGER"),
+        initial=float("Inf"),
+        merge=min,
     )
 
     dataset.add_aggregate(
@@ -44,6 +50,7 @@ def init(dataset):
         func=max,
         returns=Field(name="max", type="INTEGER"),
         initial=float("-Inf"),
+        merge=max,
     )
 
     # TODO: define max_by
@@ -55,6 +62,7 @@ def init(dataset):
         ),  # TODO someday add TypeVar's to Field
         initial=None,
         finalize=min_by_finalize,
+        merge=min_by_merge,
     )
 
     # @dataset.aggregate(returns="INTEGER",initial=0)
@@ -70,6 +78,10 @@ def init(dataset):
     #  return sum count
 
 
+def count(state: int) -> int:
+    return state + 1
+
+
 def min_by(previous: tuple[A, B], value: A, sel: B) -> tuple[A, B]:
     if previous is None or previous[1] > sel:
         return (value, sel)
@@ -77,5 +89,14 @@ def min_by(previous: tuple[A, B], value: A, sel: B) -> tuple[A, B]:
         return previous
 
 
+def min_by_merge(previous: tuple[A, B], other: tuple[A, B]) -> tuple[A, B]:
+    if previous is None:
+        return other
+    elif other is None:
+        return previous
+    else:
+        return min_by(previous, *other)
+
+
 def min_by_finalize(final: tuple[A, B]) -> A:
     return final[0]
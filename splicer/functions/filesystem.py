@@ -2,18 +2,23 @@
 from __future__ import annotations
 
 import os
-from itertools import chain
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+from itertools import islice
 from os.path import join
 from typing import TYPE_CHECKING, Any, Callable, Protocol
 
 from splicer.path import pattern_regex, regex_str
 
+from ..adapters import Adapter, Scan
 from ..codecs import relation_from_path, schema_from_path
+from ..compilers import codegen
+from ..compilers.local import limit_rows
+from ..relation import Relation
 from ..schema import Schema
 
 if TYPE_CHECKING:
-    from .. import Relation
-
     # TODO: replace decode with proper annotations
     class Resolveable(Protocol):
         resolve: Callable[[Any], Relation]
@@ -50,7 +55,16 @@ def contents_schema(relation, path_column, content_column="contents"):
 
 
 @resolveable
-def decode(ctx, relation, path_pos, mime_type, additional=None):
+def decode(
+    ctx,
+    relation,
+    path_pos,
+    mime_type,
+    additional=None,
+    read_ahead=0,
+    ordered=True,
+    pick=None,
+):
     """
     Takes a relation that has a column which contains a path to a file.
     Returns one row for each row found in each file.
@@ -71,38 +85,207 @@ def decode(ctx, relation, path_pos, mime_type, additional=None):
       ('file2', 'col 1', 'col2', 'colx'),
     ]
 
+    With read_ahead set, up to that many files are opened and decoded
+    ahead of the rows being consumed on a pool of threads. Rows from
+    each file are returned together, in the order of the files unless
+    ordered is False in which case files are returned as soon as
+    they've been decoded.
+
+    The ``decode_read_ahead`` and ``decode_ordered`` ctx knobs override
+    read_ahead and ordered for a query.
 
+    pick, see decode_picker, builds the rows from the row of the
+    relation and the decoded values instead of returning them all.
     """
     if additional is None:
         additional = []
 
-    return (
-        r + tuple(s)
+    read_ahead = ctx.get("decode_read_ahead", read_ahead)
+    ordered = ctx.get("decode_ordered", ordered)
+
+    decoders = (
+        partial(decode_file, r, path_pos, mime_type, additional, pick=pick)
         for r in relation(ctx)
-        for s in relation_from_path(r[path_pos], mime_type, additional=additional)
+    )
+
+    if read_ahead:
+        return decode_ahead(decoders, ctx, read_ahead, ordered)
+    else:
+        return decode_each(decoders, ctx)
+
+
+def decode_each(decoders, ctx):
+    # closing this generator closes the file being decoded
+    for decoder in decoders:
+        yield from decoder(ctx)
+
+
+def decode_ahead(decoders, ctx, read_ahead, ordered):
+    """
+    Runs the decoders on a pool of read_ahead threads, keeping at
+    most read_ahead decoded files buffered or in flight.
+    """
+    pool = ThreadPoolExecutor(read_ahead)
+
+    def submit(decoder):
+        return pool.submit(lambda: list(decoder(ctx)))
+
+    try:
+        pending = deque(submit(decoder) for decoder in islice(decoders, read_ahead))
+
+        while pending:
+            if ordered:
+                done = [pending.popleft()]
+            else:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                done = [future for future in pending if future in finished]
+                pending = deque(future for future in pending if future not in finished)
+
+            for decoder in islice(decoders, len(done)):
+                pending.append(submit(decoder))
+
+            for future in done:
+                for row in future.result():
+                    yield row
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+def decode_file(row, path_pos, mime_type, additional, ctx, pick=None):
+    """Returns the rows decoded from the file whose path is in row"""
+    decoded = relation_from_path(row[path_pos], mime_type, additional=additional)
+    try:
+        if pick is None:
+            for values in decoded:
+                yield row + tuple(values)
+        else:
+            for values in decoded:
+                yield pick(row, values)
+    finally:
+        decoded.close()
+
+
+def decode_picker(width, columns):
+    """
+    Returns a function that given a row of the relation being decoded,
+    which has width columns, and the values decoded from a file
+    returns a tuple of the columns at the given positions.
+    """
+    sources = [
+        "row[{}]".format(pos) if pos < width else "values[{}]".format(pos - width)
+        for pos in columns
+    ]
+    return codegen.compile_function(
+        "pick", ("row", "values"), codegen.tuple_source(sources), {}
     )
 
 
+class Decoded(Adapter):
+    """
+    Scans the rows decoded by decode, building only the columns
+    queries use, see Adapter.accepts.
+    """
+
+    def __init__(
+        self, relation, path_pos, mime_type, additional, read_ahead, ordered, schema
+    ):
+        self.relation = relation
+        self.path_pos = path_pos
+        self.mime_type = mime_type
+        self.additional = additional
+        self.read_ahead = read_ahead
+        self.ordered = ordered
+        # schema of the decoded rows, including the relation's columns
+        self._schema = schema
+
+    def has(self, name):
+        return False
+
+    def accepts(self, name, scan):
+        # stopping at the limit stops listing and decoding files
+        return Scan(start=scan.start, stop=scan.stop, columns=scan.columns)
+
+    def table_scan(self, name, ctx):
+        return self.scan(name, Scan(), ctx)
+
+    def scan(self, name, scan, ctx):
+        rows = decode(
+            ctx,
+            self.relation,
+            self.path_pos,
+            self.mime_type,
+            self.additional,
+            self.read_ahead,
+            self.ordered,
+            self.picker(scan),
+        )
+        if scan.limited:
+            return limit_rows(rows, scan.start, scan.stop)
+        return rows
+
+    def partitions(self, name, ctx):
+        return self.scan_partitions(name, Scan(), ctx)
+
+    def scan_partitions(self, name, scan, ctx):
+        if scan.limited:
+            return [partial(self.scan, name, scan)]
+
+        # a split per file, so files are decoded in parallel
+        # by parallel executors
+        pick = self.picker(scan)
+        return [
+            partial(
+                decode_file,
+                row,
+                self.path_pos,
+                self.mime_type,
+                self.additional,
+                pick=pick,
+            )
+            for row in self.relation(ctx)
+        ]
+
+    def picker(self, scan):
+        if scan.columns is None:
+            return None
+        return decode_picker(len(self.relation.schema.fields), scan.columns)
+
+
 def decode_resolve(
-    func, dataset, relation, mime_type, final_schema, path_column="path"
+    func,
+    dataset,
+    relation,
+    mime_type,
+    final_schema,
+    path_column="path",
+    read_ahead=0,
+    ordered=True,
 ) -> Relation:
 
     path_pos = relation.schema.field_position(path_column)
 
-    res = decode_schema(relation, path_pos, mime_type)
-    stream_schema, additional = res[0], res[1:]
-
-    if not final_schema:
+    if final_schema:
+        additional = ()
+    else:
         #  let's guess... note: this is typically a slow operation
-        final_schema = stream_schema
+        res = decode_schema(relation, path_pos, mime_type)
+        if isinstance(res, Schema):
+            # codecs that don't need additional decoding arguments
+            final_schema, additional = res, ()
+        else:
+            final_schema, additional = res[0], res[1:]
 
     schema = Schema(relation.schema.fields + final_schema.fields)
+    adapter = Decoded(
+        relation, path_pos, mime_type, additional, read_ahead, ordered, schema
+    )
 
     return Relation(
-        None,
+        adapter,
         "decode",
         schema,
-        lambda ctx: decode(ctx, relation, path_pos, mime_type, additional=additional),
+        partial(adapter.table_scan, "decode"),
+        partial(adapter.partitions, "decode"),
     )
 
 
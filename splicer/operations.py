@@ -5,7 +5,22 @@
 from zipper import zipper
 
 from . import Relation
-from .ast import BinRelationalOp, EqOp, Function, LoadOp, RelationalOp, Var
+from .ast import (
+    BinRelationalOp,
+    EqOp,
+    Expr,
+    FalseConst,
+    Function,
+    LoadOp,
+    NullConst,
+    NumberConst,
+    ParamGetterOp,
+    RelationalOp,
+    SelectAllExpr,
+    StringConst,
+    TrueConst,
+    Var,
+)
 
 
 def query_zipper(operation):
@@ -95,3 +110,88 @@ def visit_with(dataset, *visitors):
         return loc
 
     return visitor
+
+
+def columns_used(schema, exprs):
+    """
+    Returns the set of positions of the fields in schema the exprs
+    refer to, or None if that can't be determined, for instance
+    because they contain a subquery.
+    """
+    if schema is None:
+        return None
+
+    used = set()
+    stack = list(exprs)
+    while stack:
+        expr = stack.pop()
+        if isinstance(expr, Var):
+            try:
+                used.add(schema.field_position(expr.path))
+            except (RuntimeError, ValueError, KeyError):
+                return None
+        elif isinstance(expr, SelectAllExpr):
+            used.update(
+                pos
+                for pos, field in enumerate(schema.fields)
+                if expr.table is None or field.schema_name == expr.table
+            )
+        elif isinstance(expr, RelationalOp):
+            return None
+        elif isinstance(expr, Expr):
+            for attr in expr.__slots__:
+                value = getattr(expr, attr)
+                if isinstance(value, Expr):
+                    stack.append(value)
+                elif isinstance(value, tuple):
+                    stack.extend(v for v in value if isinstance(v, Expr))
+    return used
+
+
+def bind_params(operation, params):
+    """
+    Returns the operation with each parameter that can be written as
+    a constant replaced by it, so the parameters of prepared queries
+    can be folded and pushed down like any other constant. Other
+    parameters are still read from the ctx.
+    """
+    if isinstance(operation, ParamGetterOp):
+        if operation.expr < len(params):
+            const = const_for(params[operation.expr])
+            if const is not None:
+                return const
+        return operation
+    elif not isinstance(operation, Expr):
+        return operation
+
+    parts = {}
+    for attr in operation.__slots__:
+        value = getattr(operation, attr)
+        if isinstance(value, Expr):
+            bound = bind_params(value, params)
+        elif isinstance(value, (tuple, list)):
+            bound = type(value)(bind_params(v, params) for v in value)
+            if all(b is v for b, v in zip(bound, value)):
+                continue
+        else:
+            continue
+
+        if bound is not value:
+            parts[attr] = bound
+
+    return operation.new(**parts) if parts else operation
+
+
+def const_for(value):
+    """Returns the Const for the value or None if there isn't one"""
+    if value is None:
+        return NullConst()
+    elif value is True:
+        return TrueConst()
+    elif value is False:
+        return FalseConst()
+    elif isinstance(value, (int, float)):
+        return NumberConst(value)
+    elif isinstance(value, str):
+        return StringConst(value)
+    return None
@@ -0,0 +1,1019 @@
+# type: ignore
+"""
+Rule based rewrites of resolved query plans.
+
+DataSet.execute passes each query through optimize() before compiling
+it. Each rule takes the dataset and the resolved operations and returns
+equivalent operations, the schemas are resolved again afterwards.
+
+push_down_predicates moves filters as close to the relations they
+filter as possible, so fewer rows flow through projections, sorts and
+joins:
+
+  select * from a join b on a.id = b.a_id where a.x = 1 and b.y = 2
+
+  becomes
+
+  select * from (select * from a where a.x = 1)
+  join (select * from b where b.y = 2) on a.id = b.a_id
+
+reorder_joins then changes the order of inner joins so the smallest
+intermediate results are joined first, estimated from the statistics
+of the relations, see splicer.statistics.
+
+push_down_limits copies LIMITs into the branches of UNION ALLs,
+push_down_scans then offers the filters, ordering and limit applied
+to each relation to its adapter, see Adapter.accepts, and prune_columns
+the columns of each relation the query uses.
+"""
+
+from dataclasses import replace as replace_parts
+from functools import partial
+from itertools import combinations
+
+from .adapters import Adapter, Scan
+from .ast import (
+    AliasOp,
+    And,
+    DistinctOp,
+    EqOp,
+    Expr,
+    Function,
+    IsOp,
+    JoinOp,
+    LeftJoinOp,
+    NeOp,
+    NotOp,
+    NullConst,
+    Or,
+    OrderByOp,
+    ProjectionOp,
+    RelationalOp,
+    RenameOp,
+    SelectAllExpr,
+    SelectionOp,
+    SliceOp,
+    TrueConst,
+    UnionAllOp,
+    Var,
+)
+from .operations import children, columns_used, is_branch, make_node
+from .query import Query
+from .relation import Relation
+from .schema_interpreter import resolve_schema, schema_from_join_op
+
+# the order of joins of up to this many relations is chosen by
+# comparing every order, larger joins are ordered greedily
+EXHAUSTIVE_JOINS = 6
+
+# fractions of rows assumed to satisfy equality comparisons without
+# statistics to estimate them from, and any other predicate
+EQ_SELECTIVITY = 0.1
+SELECTIVITY = 1 / 3
+
+
+def optimize(query):
+    """Returns the query with its operations rewritten by each rule"""
+    dataset = query.dataset
+    operations = query.operations
+    for rule in RULES:
+        rewritten = rule(dataset, operations)
+        if rewritten is not operations:
+            # later rules rely on the schemas of the rewritten operations
+            operations = resolve_schema(dataset, rewritten)
+
+    if operations is query.operations:
+        return query
+
+    return Query(query.dataset, operations)
+
+
+def push_down_predicates(dataset, operation, predicates=()):
+    """
+    Returns the operation with the predicates, which are relative to
+    its schema, applied to it. Each conjunct of a SelectionOp is pushed
+    through projections, aliases, sorts, DISTINCT, UNION ALL and to the
+    side of a join whose columns it uses, until it reaches a relation
+    or an operation it can't be moved past.
+    """
+    if isinstance(operation, SelectionOp):
+        return push_down_predicates(
+            dataset,
+            operation.relation,
+            tuple(predicates) + conjuncts(operation.bool_op),
+        )
+
+    elif isinstance(operation, ProjectionOp) and not has_aggregates(
+        dataset, operation.exprs
+    ):
+        exprs = projected_exprs(operation)
+        return push_into(
+            dataset,
+            operation,
+            predicates,
+            lambda var: exprs.get(position(operation.schema, var)),
+        )
+
+    elif isinstance(operation, (AliasOp, DistinctOp, OrderByOp)):
+        child = operation.relation
+        return push_into(
+            dataset,
+            operation,
+            predicates,
+            lambda var: var_at(child.schema, position(operation.schema, var)),
+        )
+
+    elif isinstance(operation, UnionAllOp):
+        return push_into_union(dataset, operation, predicates)
+
+    elif isinstance(operation, JoinOp):
+        return push_into_join(dataset, operation, predicates)
+
+    return with_predicates(
+        optimize_children(dataset, operation, push_down_predicates), predicates
+    )
+
+
+def push_into(dataset, operation, predicates, replace):
+    """
+    Pushes the predicates that can be rewritten in terms of the
+    operation's relation, by replacing each of their Vars, into it.
+    The rest are applied to the operation.
+    """
+    pushed, kept = partition(predicates, replace)
+    relation = push_down_predicates(dataset, operation.relation, pushed)
+    return with_predicates(operation.new(relation=relation), kept)
+
+
+def push_into_union(dataset, operation, predicates):
+    left = operation.left
+    right = operation.right
+
+    l_pushed, l_kept = partition(
+        predicates, lambda var: var_at(left.schema, position(operation.schema, var))
+    )
+    r_pushed, r_kept = partition(
+        predicates, lambda var: var_at(right.schema, position(operation.schema, var))
+    )
+
+    if l_kept or r_kept:
+        # predicates have to be applied to both sides or neither
+        l_pushed = r_pushed = ()
+        kept = predicates
+    else:
+        kept = ()
+
+    return with_predicates(
+        operation.new(
+            left=push_down_predicates(dataset, left, l_pushed),
+            right=push_down_predicates(dataset, right, r_pushed),
+        ),
+        kept,
+    )
+
+
+def push_into_join(dataset, operation, predicates):
+    """
+    Pushes predicates that only use columns of one side of the join
+    into that side. Predicates of inner joins that compare a column
+    of each side are added to the join condition, so they can be
+    used as join keys.
+
+    Left joins return rows of the left relation that have no match,
+    so WHERE predicates are only pushed into the left relation and
+    ON predicates only into the right.
+    """
+    left = operation.left
+    right = operation.right
+    split = len(left.schema.fields)
+    left_join = isinstance(operation, LeftJoinOp)
+
+    def left_var(var):
+        pos = position(operation.schema, var)
+        if pos is not None and pos < split:
+            return var_at(left.schema, pos)
+
+    def right_var(var):
+        pos = position(operation.schema, var)
+        if pos is not None and pos >= split:
+            return var_at(right.schema, pos - split)
+
+    on = conjuncts(operation.bool_op)
+
+    l_pushed, predicates = partition(predicates, left_var)
+    if left_join:
+        r_pushed, on = partition(on, right_var)
+    else:
+        on_left, on = partition(on, left_var)
+        l_pushed += on_left
+        r_pushed, predicates = partition(predicates, right_var)
+        on_right, on = partition(on, right_var)
+        r_pushed += on_right
+
+        if is_equi_join(on):
+            keys = tuple(p for p in predicates if is_equi_join((p,)))
+            on += keys
+            predicates = tuple(p for p in predicates if p not in keys)
+
+    return with_predicates(
+        operation.new(
+            left=push_down_predicates(dataset, left, l_pushed),
+            right=push_down_predicates(dataset, right, r_pushed),
+            bool_op=conjunction(on) if on else TrueConst(),
+        ),
+        predicates,
+    )
+
+
+def is_equi_join(exprs):
+    """Returns true if each of the exprs compare two columns"""
+    return all(
+        isinstance(expr, EqOp)
+        and isinstance(expr.lhs, Var)
+        and isinstance(expr.rhs, Var)
+        for expr in exprs
+    )
+
+
+def reorder_joins(dataset, operation):
+    """
+    Reorders each tree of inner joins into the order estimated to
+    produce the fewest intermediate rows, see join_order. The join
+    conditions are moved to the first join that has the columns they
+    compare, and the columns are projected back into their original
+    order.
+
+    Joins are left alone unless the number of rows of each relation
+    can be estimated, and any join condition can be moved.
+    """
+    if getattr(operation, "schema", None) is None or not is_inner_join(operation):
+        return optimize_children(dataset, operation, reorder_joins)
+
+    leaves = []
+    conditions = []
+    collect_joins(operation, 0, leaves, conditions)
+    leaves = [reorder_joins(dataset, leaf) for leaf in leaves]
+
+    rows = [estimate_rows(dataset, leaf) for leaf in leaves]
+    graph = join_graph(operation.schema, leaves, conditions)
+    if None in rows or graph is None:
+        return rebuild_joins(operation, iter(leaves))
+
+    predicates = [
+        (predicate, used, selectivity(operation, predicate))
+        for predicate, used in graph
+    ]
+
+    original = tuple(range(len(leaves)))
+    order = join_order(rows, predicates)
+    if join_cost(order, rows, predicates) >= join_cost(original, rows, predicates):
+        return rebuild_joins(operation, iter(leaves))
+
+    return joined_in_order(dataset, operation, leaves, graph, order)
+
+
+def is_inner_join(operation):
+    return isinstance(operation, JoinOp) and not isinstance(operation, LeftJoinOp)
+
+
+def collect_joins(operation, offset, leaves, conditions):
+    """
+    Appends the relations joined by the tree of inner joins to leaves,
+    and each join's conditions with the join's schema and the position
+    of its first column in the tree to conditions.
+    """
+    if not is_inner_join(operation):
+        leaves.append(operation)
+        return
+
+    conditions.extend(
+        (predicate, operation.schema, offset)
+        for predicate in conjuncts(operation.bool_op)
+    )
+    collect_joins(operation.left, offset, leaves, conditions)
+    collect_joins(
+        operation.right,
+        offset + len(operation.left.schema.fields),
+        leaves,
+        conditions,
+    )
+
+
+def rebuild_joins(operation, leaves):
+    """Returns the tree of inner joins with its leaves replaced"""
+    if not is_inner_join(operation):
+        return next(leaves)
+
+    return operation.new(
+        left=rebuild_joins(operation.left, leaves),
+        right=rebuild_joins(operation.right, leaves),
+    )
+
+
+def join_graph(schema, leaves, conditions):
+    """
+    Returns each join condition rewritten in terms of the schema of
+    the whole join, with the set of indexes of the leaves whose
+    columns it uses. Returns None if any can't be rewritten.
+    """
+    owner = [index for index, leaf in enumerate(leaves) for _ in leaf.schema.fields]
+
+    graph = []
+    for predicate, join_schema, offset in conditions:
+        used = set()
+
+        def replace(var):
+            pos = position(join_schema, var)
+            var = None if pos is None else var_at(schema, offset + pos)
+            if var is not None:
+                used.add(owner[offset + pos])
+            return var
+
+        expr = replace_vars(predicate, replace)
+        if expr is None:
+            return None
+        graph.append((expr, frozenset(used)))
+
+    return graph
+
+
+def join_order(rows, predicates):
+    """
+    Returns the order to join the relations, estimated to have the
+    given numbers of rows, in as a tuple of their indexes. Each
+    relation is joined to all of those before it, and the cost of an
+    order is the number of rows produced by the joins, see join_cost.
+
+    Every order of up to EXHAUSTIVE_JOINS relations is considered by
+    building the cheapest order of each set of relations from the
+    cheapest orders of its subsets. Otherwise the relation producing
+    the fewest rows is joined next. Relations that share a condition
+    with those already joined are joined before any that would
+    produce a cross product.
+    """
+    leaves = range(len(rows))
+
+    def candidates(joined):
+        connected = [
+            leaf
+            for leaf in leaves
+            if leaf not in joined
+            and any(
+                leaf in used and used - {leaf} <= joined for _, used, _ in predicates
+            )
+        ]
+        return connected or [leaf for leaf in leaves if leaf not in joined]
+
+    if len(rows) > EXHAUSTIVE_JOINS:
+        order = (min(leaves, key=lambda leaf: rows[leaf]),)
+        while len(order) < len(rows):
+            joined = frozenset(order)
+            order += (
+                min(
+                    candidates(joined),
+                    key=lambda leaf: join_rows(joined | {leaf}, rows, predicates),
+                ),
+            )
+        return order
+
+    # the cheapest order and its cost by the set of relations joined
+    best = {frozenset((leaf,)): ((leaf,), 0) for leaf in leaves}
+    for size in range(2, len(rows) + 1):
+        for subset in combinations(leaves, size - 1):
+            joined = frozenset(subset)
+            order, cost = best.get(joined, (None, None))
+            if order is None:
+                continue
+
+            for leaf in candidates(joined):
+                extended = joined | {leaf}
+                total = cost + join_rows(extended, rows, predicates)
+                if extended not in best or total < best[extended][1]:
+                    best[extended] = (order + (leaf,), total)
+
+    return best[frozenset(leaves)][0]
+
+
+def join_cost(order, rows, predicates):
+    """Returns the number of rows produced by joining in order"""
+    return sum(
+        join_rows(frozenset(order[:end]), rows, predicates)
+        for end in range(2, len(order) + 1)
+    )
+
+
+def join_rows(joined, rows, predicates):
+    """
+    Returns the estimated number of rows of joining the relations,
+    assuming the columns the conditions compare are independent.
+    """
+    estimate = 1.0
+    for leaf in joined:
+        estimate *= rows[leaf]
+    for _, used, fraction in predicates:
+        if used <= joined:
+            estimate *= fraction
+    return estimate
+
+
+def joined_in_order(dataset, operation, leaves, graph, order):
+    """
+    Returns the leaves joined in order, with each condition applied
+    by the first join with all of the columns it uses, projected
+    into the columns of the operation.
+    """
+    widths = [len(leaf.schema.fields) for leaf in leaves]
+    starts = [sum(widths[:leaf]) for leaf in range(len(leaves))]
+
+    pending = list(graph)
+    offsets = {}
+    joined = None
+    for leaf in order:
+        offsets[leaf] = 0 if joined is None else len(joined.schema.fields)
+        if joined is None:
+            joined = leaves[leaf]
+            continue
+
+        joined = JoinOp(joined, leaves[leaf])
+        joined = joined.new(schema=schema_from_join_op(joined, dataset))
+
+        placed = []
+        moved = partial(moved_var, operation.schema, joined.schema, starts, offsets)
+        for predicate, used in pending:
+            if used <= offsets.keys():
+                expr = replace_vars(predicate, moved)
+                if expr is None:
+                    return rebuild_joins(operation, iter(leaves))
+                placed.append(expr)
+
+        if placed:
+            pending = [p for p in pending if not p[1] <= offsets.keys()]
+            joined = joined.new(bool_op=conjunction(placed))
+
+    moved = partial(moved_var, operation.schema, joined.schema, starts, offsets)
+    exprs = [
+        moved(var_at(operation.schema, pos))
+        for pos in range(len(operation.schema.fields))
+    ]
+    if None in exprs:
+        return rebuild_joins(operation, iter(leaves))
+
+    return ProjectionOp(joined, *exprs, schema=operation.schema)
+
+
+def moved_var(schema, joined_schema, starts, offsets, var):
+    """
+    Returns a Var for the column var refers to in the original join's
+    schema in the schema of the reordered join, or None.
+    """
+    pos = None if var is None else position(schema, var)
+    if pos is None:
+        return None
+
+    leaf = max(leaf for leaf, start in enumerate(starts) if start <= pos)
+    return var_at(joined_schema, offsets[leaf] + pos - starts[leaf])
+
+
+def estimate_rows(dataset, operation):
+    """
+    Returns the estimated number of rows the operation returns,
+    or None if it can't be estimated.
+    """
+    if isinstance(operation, Relation):
+        return operation.estimate() if operation.estimate else None
+
+    elif isinstance(operation, SelectionOp):
+        rows = estimate_rows(dataset, operation.relation)
+        if rows is None:
+            return None
+        return rows * selectivity(operation, operation.bool_op)
+
+    elif isinstance(operation, SliceOp):
+        rows = estimate_rows(dataset, operation.relation)
+        if rows is None or operation.stop is None:
+            return rows
+        return min(rows, operation.stop - (operation.start or 0))
+
+    elif isinstance(operation, JoinOp):
+        left = estimate_rows(dataset, operation.left)
+        right = estimate_rows(dataset, operation.right)
+        if left is None or right is None:
+            return None
+        rows = left * right * selectivity(operation, operation.bool_op)
+        return max(rows, left) if isinstance(operation, LeftJoinOp) else rows
+
+    elif isinstance(operation, ProjectionOp) and has_aggregates(
+        dataset, operation.exprs
+    ):
+        return None
+
+    elif isinstance(operation, (AliasOp, DistinctOp, OrderByOp, ProjectionOp)):
+        return estimate_rows(dataset, operation.relation)
+
+    return None
+
+
+def selectivity(operation, bool_op):
+    """
+    Returns the estimated fraction of the operation's rows satisfying
+    bool_op. Equality comparisons select one of the distinct values
+    of the columns compared, see column_statistics.
+    """
+    if isinstance(bool_op, And):
+        return selectivity(operation, bool_op.lhs) * selectivity(operation, bool_op.rhs)
+    elif isinstance(bool_op, Or):
+        lhs = selectivity(operation, bool_op.lhs)
+        rhs = selectivity(operation, bool_op.rhs)
+        return lhs + rhs - lhs * rhs
+    elif isinstance(bool_op, NotOp):
+        return 1 - selectivity(operation, bool_op.expr)
+    elif isinstance(bool_op, TrueConst):
+        return 1.0
+    elif isinstance(bool_op, (EqOp, NeOp)):
+        stats = [
+            column_statistics(operation, side)
+            for side in (bool_op.lhs, bool_op.rhs)
+            if isinstance(side, Var)
+        ]
+        distinct = [s.distinct for s in stats if s is not None and s.distinct]
+        fraction = 1 / max(distinct) if distinct else EQ_SELECTIVITY
+        return 1 - fraction if isinstance(bool_op, NeOp) else fraction
+    elif isinstance(bool_op, IsOp) and isinstance(bool_op.rhs, NullConst):
+        stats = isinstance(bool_op.lhs, Var) and column_statistics(
+            operation, bool_op.lhs
+        )
+        return stats.null_fraction if stats else EQ_SELECTIVITY
+    return SELECTIVITY
+
+
+def column_statistics(operation, var):
+    """
+    Returns the ColumnStatistics of the column var refers to in the
+    operation's schema, by following it through aliases, projections
+    and joins to the relation it comes from. Returns None if it
+    doesn't come from a relation with statistics.
+    """
+    pos = position(operation.schema, var)
+    while pos is not None:
+        if isinstance(operation, Relation):
+            stats = operation.statistics() if operation.statistics else None
+            return stats and stats.column(operation.schema.fields[pos].name)
+        elif isinstance(operation, JoinOp):
+            split = len(operation.left.schema.fields)
+            if pos < split:
+                operation = operation.left
+            else:
+                operation = operation.right
+                pos -= split
+        elif isinstance(operation, ProjectionOp):
+            expr = projected_exprs(operation).get(pos)
+            operation = operation.relation
+            pos = position(operation.schema, expr) if isinstance(expr, Var) else None
+        elif isinstance(
+            operation, (AliasOp, DistinctOp, OrderByOp, SelectionOp, SliceOp)
+        ):
+            operation = operation.relation
+        else:
+            return None
+    return None
+
+
+def push_down_limits(dataset, operation, stop=None):
+    """
+    Limits each branch of a UNION ALL under a LIMIT, through
+    projections and aliases, to the number of rows the LIMIT could
+    return including its offset, so scans of the branches can stop
+    early. stop is the most rows the parent reads from the operation.
+    """
+    if isinstance(operation, SliceOp):
+        # the parent's rows start at the offset into the relation
+        if stop is not None:
+            stop += operation.start or 0
+        if operation.stop is not None and (stop is None or operation.stop < stop):
+            stop = operation.stop
+        return operation.new(
+            relation=push_down_limits(dataset, operation.relation, stop)
+        )
+
+    elif stop is None:
+        return optimize_children(dataset, operation, push_down_limits)
+
+    elif isinstance(operation, AliasOp) or (
+        isinstance(operation, ProjectionOp)
+        and not has_aggregates(dataset, operation.exprs)
+    ):
+        return operation.new(
+            relation=push_down_limits(dataset, operation.relation, stop)
+        )
+
+    elif isinstance(operation, UnionAllOp):
+        return operation.new(
+            left=push_down_limits(dataset, limited(operation.left, stop), stop),
+            right=push_down_limits(dataset, limited(operation.right, stop), stop),
+        )
+
+    return optimize_children(dataset, operation, push_down_limits)
+
+
+def limited(operation, stop):
+    if isinstance(operation, SliceOp) and not operation.start:
+        if operation.stop is not None and operation.stop <= stop:
+            return operation
+    return SliceOp(operation, stop)
+
+
+def push_down_scans(dataset, operation):
+    """
+    Offers the predicates, ordering and limit applied to a relation
+    to its adapter, see Adapter.accepts. The parts the adapter accepts
+    are removed from the plan and done by the scan instead.
+
+    Only operations directly over the relation, or over aliases and
+    projections of it, are offered.
+    """
+    ops = []
+    relation = operation
+    while is_scan_op(dataset, relation):
+        ops.append(relation)
+        relation = relation.relation
+
+    if not ops or not is_scannable(relation):
+        return optimize_children(dataset, operation, push_down_scans)
+
+    proposed, mapped = propose_scan(ops, relation)
+    if not proposed:
+        return operation
+
+    accepted = accepted_scan(relation, proposed)
+    if not accepted:
+        return operation
+
+    adapter = relation.adapter
+    scanned = replace_parts(
+        relation,
+        records=partial(adapter.scan, relation.name, accepted),
+        partitions=partial(adapter.scan_partitions, relation.name, accepted),
+        scan=accepted,
+    )
+
+    for op in reversed(ops):
+        if id(op) not in mapped:
+            scanned = op.new(relation=scanned)
+        elif isinstance(op, SelectionOp):
+            scanned = with_predicates(
+                scanned,
+                tuple(
+                    predicate
+                    for predicate, expr in zip(conjuncts(op.bool_op), mapped[id(op)])
+                    if expr is None or expr not in accepted.predicates
+                ),
+            )
+        elif isinstance(op, OrderByOp) and accepted.order_by:
+            continue
+        elif isinstance(op, SliceOp) and accepted.limited:
+            continue
+        else:
+            scanned = op.new(relation=scanned)
+
+    return scanned
+
+
+def is_scan_op(dataset, operation):
+    if isinstance(operation, ProjectionOp):
+        return not has_aggregates(dataset, operation.exprs)
+    return isinstance(operation, (AliasOp, OrderByOp, SelectionOp, SliceOp))
+
+
+def is_scannable(relation, scanned=False):
+    """
+    Returns true if the relation comes from an adapter, and hasn't
+    had its scan pushed down yet unless scanned is true.
+    """
+    return (
+        isinstance(relation, Relation)
+        and isinstance(relation.adapter, Adapter)
+        and (scanned or relation.scan is None)
+        and (relation.scan is None or relation.scan.columns is None)
+    )
+
+
+def propose_scan(ops, relation):
+    """
+    Returns the Scan doing the work of ops, which are listed from the
+    top down to the relation, as far as it can be expressed in terms
+    of the relation's columns. Along with it, a dict of the id of each
+    op proposed, mapping SelectionOps to their conjuncts rewritten in
+    terms of the relation or None if they couldn't be.
+    """
+    schema = relation.schema
+
+    def replace(var):
+        return var_at(schema, position(schema, var))
+
+    predicates = []
+    order_by = ()
+    start = stop = None
+    complete = True
+    mapped = {}
+
+    for op in reversed(ops):
+        if isinstance(op, SelectionOp):
+            if order_by or stop is not None or start:
+                break
+            exprs = [replace_vars(c, replace) for c in conjuncts(op.bool_op)]
+            complete = complete and None not in exprs
+            predicates.extend(e for e in exprs if e is not None)
+            mapped[id(op)] = exprs
+
+        elif isinstance(op, OrderByOp):
+            exprs = [replace_vars(e, replace) for e in op.exprs]
+            if order_by or stop is not None or start or None in exprs:
+                break
+            order_by = tuple(exprs)
+            mapped[id(op)] = exprs
+
+        elif isinstance(op, SliceOp):
+            if stop is not None or start or not complete:
+                break
+            start, stop = op.start or None, op.stop
+            mapped[id(op)] = ()
+
+        elif isinstance(op, ProjectionOp):
+            exprs = projected_exprs(op)
+            replace = partial(replace_projected, op.schema, exprs, replace)
+
+        else:
+            child = op.relation
+            replace = partial(replace_aliased, op.schema, child.schema, replace)
+
+    return Scan(tuple(predicates), order_by, start, stop), mapped
+
+
+def replace_projected(schema, exprs, replace, var):
+    expr = exprs.get(position(schema, var))
+    return expr and replace_vars(expr, replace)
+
+
+def replace_aliased(schema, child_schema, replace, var):
+    var = var_at(child_schema, position(schema, var))
+    return var and replace(var)
+
+
+def accepted_scan(relation, proposed):
+    """
+    Returns the parts of the proposed scan the relation's adapter
+    accepts, dropping the limit unless everything under it was.
+    """
+    adapter = relation.adapter
+    accepted = adapter.accepts(relation.name, proposed)
+
+    predicates = tuple(p for p in accepted.predicates if p in proposed.predicates)
+    order_by = accepted.order_by if accepted.order_by == proposed.order_by else ()
+    limited = accepted.limited and (
+        len(predicates) == len(proposed.predicates) and order_by == proposed.order_by
+    )
+
+    if accepted.limited and not limited:
+        return accepted_scan(relation, replace_parts(proposed, start=None, stop=None))
+
+    return Scan(
+        predicates,
+        order_by,
+        proposed.start if limited else None,
+        proposed.stop if limited else None,
+    )
+
+
+def prune_columns(dataset, operation, needed=None):
+    """
+    Offers each relation's adapter the positions of the columns used
+    by the query, so scans can skip reading or building the rest.
+    needed is the set of positions of the operation's columns its
+    parent uses, or None for all of them.
+
+    Operations refer to columns by name, so the positions of columns
+    of pruned relations are remapped when the schemas are resolved
+    again.
+    """
+    if getattr(operation, "schema", None) is None:
+        return optimize_children(dataset, operation, prune_columns)
+    elif needed is None:
+        needed = set(range(len(operation.schema.fields)))
+
+    if isinstance(operation, Relation):
+        return scan_columns(operation, needed)
+
+    elif isinstance(operation, ProjectionOp):
+        relation = operation.relation
+        used = columns_used(relation.schema, operation.exprs)
+        return operation.new(relation=prune_columns(dataset, relation, used))
+
+    elif isinstance(operation, (AliasOp, OrderByOp, SelectionOp, SliceOp)):
+        if isinstance(operation, SelectionOp):
+            used = columns_used(operation.schema, (operation.bool_op,))
+        elif isinstance(operation, OrderByOp):
+            used = columns_used(operation.schema, operation.exprs)
+        else:
+            used = set()
+
+        return operation.new(
+            relation=prune_columns(
+                dataset, operation.relation, None if used is None else needed | used
+            )
+        )
+
+    elif isinstance(operation, JoinOp):
+        used = columns_used(operation.schema, (operation.bool_op,))
+        if used is None:
+            return optimize_children(dataset, operation, prune_columns)
+
+        split = len(operation.left.schema.fields)
+        used |= needed
+        return operation.new(
+            left=prune_columns(
+                dataset, operation.left, {pos for pos in used if pos < split}
+            ),
+            right=prune_columns(
+                dataset,
+                operation.right,
+                {pos - split for pos in used if pos >= split},
+            ),
+        )
+
+    # DISTINCT and UNION ALL use every column, the ProjectionOp of a
+    # GroupByOp knows which columns the group uses
+    return optimize_children(dataset, operation, prune_columns)
+
+
+def scan_columns(relation, needed):
+    if not is_scannable(relation, scanned=True):
+        return relation
+
+    columns = tuple(sorted(needed))
+    if len(columns) == len(relation.schema.fields):
+        return relation
+
+    adapter = relation.adapter
+    accepted = adapter.accepts(relation.name, Scan(columns=columns))
+    if accepted.columns is None:
+        return relation
+
+    scan = replace_parts(relation.scan or Scan(), columns=accepted.columns)
+    fields = relation.schema.fields
+    return replace_parts(
+        relation,
+        schema=relation.schema.new(fields=[fields[pos] for pos in accepted.columns]),
+        records=partial(adapter.scan, relation.name, scan),
+        partitions=partial(adapter.scan_partitions, relation.name, scan),
+        scan=scan,
+    )
+
+
+def optimize_children(dataset, operation, rule):
+    if not is_branch(operation):
+        return operation
+
+    return make_node(operation, [rule(dataset, child) for child in children(operation)])
+
+
+def partition(predicates, replace):
+    """
+    Returns the predicates rewritten by replacing their Vars with
+    replace(var), and the predicates that couldn't be rewritten
+    because replace returned None for one of their Vars.
+    """
+    rewritten = []
+    kept = []
+    for predicate in predicates:
+        expr = replace_vars(predicate, replace)
+        if expr is None:
+            kept.append(predicate)
+        else:
+            rewritten.append(expr)
+    return tuple(rewritten), tuple(kept)
+
+
+def replace_vars(expr, replace):
+    """
+    Returns the expr with each Var replaced by replace(var), or None
+    if replace returns None for any of them. Expressions containing
+    relational operations are never rewritten.
+    """
+    if isinstance(expr, Var):
+        return replace(expr)
+    elif isinstance(expr, RelationalOp):
+        return None
+
+    parts = {}
+    for attr in expr.__slots__:
+        value = getattr(expr, attr)
+        if isinstance(value, Expr):
+            value = replace_vars(value, replace)
+            if value is None:
+                return None
+            parts[attr] = value
+        elif isinstance(value, tuple) and any(isinstance(v, Expr) for v in value):
+            values = tuple(
+                replace_vars(v, replace) if isinstance(v, Expr) else v for v in value
+            )
+            if None in values:
+                return None
+            parts[attr] = values
+
+    return expr.new(**parts) if parts else expr
+
+
+def conjuncts(bool_op):
+    if bool_op is None or isinstance(bool_op, TrueConst):
+        return ()
+    elif isinstance(bool_op, And):
+        return conjuncts(bool_op.lhs) + conjuncts(bool_op.rhs)
+    else:
+        return (bool_op,)
+
+
+def conjunction(predicates):
+    bool_op = predicates[0]
+    for predicate in predicates[1:]:
+        bool_op = And(bool_op, predicate)
+    return bool_op
+
+
+def with_predicates(operation, predicates):
+    if predicates:
+        return SelectionOp(operation, conjunction(predicates))
+    return operation
+
+
+def position(schema, var):
+    """Returns the position of the var's field in the schema or None"""
+    try:
+        return schema.field_position(var.path)
+    except Exception:
+        return None
+
+
+def var_at(schema, pos):
+    """
+    Returns a Var for the field at pos in the schema, or None
+    if there's no way to refer to it unambiguously.
+    """
+    if pos is None:
+        return None
+
+    field = schema.fields[pos]
+    for path in (field.name, field.path):
+        var = Var(path)
+        if position(schema, var) == pos:
+            return var
+    return None
+
+
+def projected_exprs(operation):
+    """
+    Returns a dict of the position of each column of the projection
+    to the expression computing it.
+    """
+    schema = operation.relation.schema
+
+    exprs = []
+    for expr in operation.exprs:
+        if isinstance(expr, SelectAllExpr):
+            fields = (
+                schema.fields
+                if expr.table is None
+                else [f for f in schema.fields if f.schema_name == expr.table]
+            )
+            exprs.extend(var_at(schema, schema.fields.index(f)) for f in fields)
+        elif isinstance(expr, RenameOp):
+            exprs.append(expr.expr)
+        else:
+            exprs.append(expr)
+
+    return dict(enumerate(exprs))
+
+
+def has_aggregates(dataset, exprs):
+    """Returns true if any of the exprs calls an aggregate function"""
+    for expr in exprs:
+        if isinstance(expr, Function) and expr.name in dataset.aggregates:
+            return True
+        elif isinstance(expr, Expr) and not isinstance(expr, RelationalOp):
+            parts = [getattr(expr, attr) for attr in expr.__slots__]
+            parts = [
+                p
+                for part in parts
+                for p in (part if isinstance(part, tuple) else (part,))
+            ]
+            if has_aggregates(dataset, parts):
+                return True
+    return False
+
+
+RULES = [
+    push_down_predicates,
+    reorder_joins,
+    push_down_limits,
+    push_down_scans,
+    prune_columns,
+]
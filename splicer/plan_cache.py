@@ -0,0 +1,63 @@
+"""
+Caches the compiled plans of statements executed by a DataSet, so
+executing the same statement again skips parsing, resolving schemas,
+optimizing and compiling it.
+
+Plans are keyed by the statement's tokens, see query_parser.tokenize,
+so statements differing only in whitespace or the case of keywords
+share a plan, along with the version of each of the dataset's
+adapters, see Adapter.version. The dataset clears its cache whenever
+its adapters, views or functions change.
+"""
+
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+# plans kept by each dataset, see DataSet.set_plan_cache_size
+PLAN_CACHE_SIZE = 128
+
+# plans specialized to the parameters kept by each PreparedQuery
+SPECIALIZED_PLANS = 32
+
+
+class PlanCache:
+    """Keeps the most recently used size plans"""
+
+    def __init__(self, size: int = PLAN_CACHE_SIZE):
+        self.size = size
+        self.plans: OrderedDict[Hashable, Callable[..., Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # incremented each time the cache is cleared, so plans
+        # cached elsewhere can tell they're out of date
+        self.generation = 0
+
+    def __len__(self) -> int:
+        return len(self.plans)
+
+    def get(self, key: Hashable) -> Optional[Callable[..., Any]]:
+        plan = self.plans.get(key)
+        if plan is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.plans.move_to_end(key)
+        return plan
+
+    def put(self, key: Hashable, plan: Callable[..., Any]) -> None:
+        if self.size <= 0:
+            return
+
+        self.plans[key] = plan
+        self.plans.move_to_end(key)
+        while len(self.plans) > self.size:
+            self.plans.popitem(last=False)
+
+    def resize(self, size: int) -> None:
+        self.size = size
+        while len(self.plans) > max(size, 0):
+            self.plans.popitem(last=False)
+
+    def clear(self) -> None:
+        self.plans.clear()
+        self.generation += 1
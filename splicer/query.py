@@ -1,10 +1,12 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import TYPE_CHECKING, Any, Generic, Iterator, TypeVar
+from dataclasses import dataclass, replace
+from typing import TYPE_CHECKING, Any, AsyncIterator, Generic, Iterator, TypeVar
 
-from .ast import AliasOp, LoadOp, RelationalOp
-from .operations import isa  # type: ignore
+from .ast import AliasOp, And, LoadOp, RelationalOp, SelectionOp
+from .operations import bind_params, children, is_branch, isa  # type: ignore
+from .plan_cache import SPECIALIZED_PLANS, PlanCache
+from .query_parser import parse_statement, tokenize  # type: ignore
 from .relation import Relation
 from .schema import Schema
 from .schema_interpreter import resolve_schema  # type: ignore
@@ -13,6 +15,7 @@ if TYPE_CHECKING:
     from zipper import Loc  # type: ignore
 
     from .dataset import DataSet
+    from .statistics import Statistics
 
 
 T = TypeVar("T")
@@ -30,7 +33,10 @@ class Query(Generic[T]):
         self.dataset = dataset
 
         self.operations = resolve_schema(
-            dataset, operations, (isa(LoadOp), view_replacer)
+            dataset,
+            operations,
+            (isa(LoadOp), view_replacer),
+            (isa(AnalyzedOp), with_statistics),
         )
         assert self.operations.schema is not None
         self.schema = self.operations.schema
@@ -38,6 +44,9 @@ class Query(Generic[T]):
     def __iter__(self) -> Iterator[T]:
         return iter(self.execute())
 
+    def __aiter__(self) -> AsyncIterator[T]:
+        return self.aexecute()
+
     def dump(self) -> None:
         self.dataset.dump(self.schema, self.execute())
 
@@ -47,6 +56,122 @@ class Query(Generic[T]):
     def execute(self, *params: Any) -> Any:
         return self.dataset.execute(self, *params)
 
+    def aexecute(self, *params: Any) -> AsyncIterator[T]:
+        return self.dataset.aexecute(self, *params)
+
+
+class PreparedQuery(Generic[T]):
+    """
+    A statement parsed once and executed with different parameters,
+    see DataSet.prepare.
+
+    When binding the parameters into the statement as constants lets
+    more predicates be pushed down, for instance to prune the
+    partitions of a DirAdapter, the statement is planned with the
+    parameters bound. Otherwise the execution shares the plan of the
+    statement, which reads the parameters as it runs. Which plan to
+    use is decided for each set of parameters, keeping the plans of
+    the most recent ones.
+    """
+
+    def __init__(self, dataset: DataSet, statement: str):
+        self.dataset = dataset
+        self.statement = statement
+        self.tokens = tuple(tokenize(statement))
+        self.operations = parse_statement(statement)
+
+        # plans by compile_fun, parameters and adapter versions
+        self.plans = PlanCache(SPECIALIZED_PLANS)
+        # (adapter versions, filters of the unbound statement's plan)
+        self.generic: tuple[tuple[Any, ...], int] | None = None
+        self.generation = dataset.plan_cache.generation
+
+    def bind(self, *params: Any) -> Query[T]:
+        """Returns the query with the parameters bound"""
+        return Query(self.dataset, bind_params(self.operations, params))
+
+    def plan(self, compile_fun: Any, params: tuple[Any, ...]) -> Any:
+        """
+        Returns the statement optimized and compiled by compile_fun,
+        specialized to the parameters if that lets more predicates be
+        pushed down.
+        """
+        dataset = self.dataset
+        if self.generation != dataset.plan_cache.generation:
+            # the catalog changed since the plans were made
+            self.plans.clear()
+            self.generic = None
+            self.generation = dataset.plan_cache.generation
+
+        versions = tuple(adapter.version() for adapter in dataset.adapters)
+        key = (
+            compile_fun,
+            # True == 1 but they're bound to different constants
+            tuple((type(p), p) for p in params),
+            versions,
+        )
+        try:
+            func = self.plans.get(key)
+        except TypeError:
+            # unhashable parameters
+            return self.specialized(compile_fun, params, versions)
+
+        if func is None:
+            func = self.specialized(compile_fun, params, versions)
+            self.plans.put(key, func)
+        return func
+
+    def specialized(
+        self, compile_fun: Any, params: tuple[Any, ...], versions: tuple[Any, ...]
+    ) -> Any:
+        """
+        Returns the plan of the statement with the parameters bound if
+        fewer predicates are left in it than in the plan of the
+        unbound statement, otherwise the unbound statement's plan.
+        """
+        dataset = self.dataset
+        if self.generic is None or self.generic[0] != versions:
+            generic = dataset.optimize(Query(dataset, self.operations))
+            self.generic = (versions, filters(generic.operations))
+
+        bound = dataset.optimize(self.bind(*params))
+        if filters(bound.operations) < self.generic[1]:
+            return compile_fun(bound)
+
+        # the same plan DataSet.execute uses for the statement
+        return dataset.cached_plan(
+            (compile_fun, self.tokens),
+            lambda: compile_fun(dataset.optimize(Query(dataset, self.operations))),
+        )
+
+    def execute(self, *params: Any) -> Any:
+        return self.dataset.execute(self, *params)
+
+    def aexecute(self, *params: Any) -> AsyncIterator[T]:
+        return self.dataset.aexecute(self, *params)
+
+
+def filters(operation: Any) -> int:
+    """
+    Returns the number of predicates applied by the SelectionOps
+    of the operation, i.e. those that weren't pushed down.
+    """
+    count = 0
+    stack = [operation]
+    while stack:
+        operation = stack.pop()
+        if isinstance(operation, SelectionOp):
+            bool_ops = [operation.bool_op]
+            while bool_ops:
+                bool_op = bool_ops.pop()
+                if isinstance(bool_op, And):
+                    bool_ops.extend((bool_op.lhs, bool_op.rhs))
+                else:
+                    count += 1
+        if is_branch(operation):
+            stack.extend(children(operation))
+    return count
+
 
 def view_replacer(dataset: DataSet, loc: Loc, op: AliasOp | LoadOp) -> Loc:
     view = dataset.get_view(op.name)
@@ -64,4 +189,41 @@ def load_relation(dataset: DataSet, loc: Loc, op: AliasOp | LoadOp) -> Loc:
     if adapter is None:
         raise LookupError(f"No adapter for relation {op.name}")
 
+    stats = dataset.statistics_cache.get(op.name)
+    if stats is not None:
+        # adapters may evaluate the relation to functions, such as
+        # the decode of a DirAdapter, which are resolved to a Relation
+        # later on, see with_statistics
+        loc = loc.replace(AnalyzedOp(op, stats)).down()
+
     return adapter.evaluate(loc)
+
+
+class AnalyzedOp(RelationalOp):
+    """
+    Wraps what an adapter evaluated an analyzed relation to, until
+    it's resolved, see load_relation.
+    """
+
+    __slots__ = ("relation", "statistics", "schema")
+
+    def __init__(
+        self, relation: RelationalOp, statistics: Statistics, schema: Schema = None
+    ):
+        self.relation = relation
+        self.statistics = statistics
+        self.schema = schema
+
+
+def with_statistics(dataset: DataSet, loc: Loc, op: AnalyzedOp) -> Loc:
+    """
+    Replaces the AnalyzedOp with the Relation it wraps, planned with
+    the analyzed statistics rather than any the adapter reports.
+    """
+    relation = op.relation
+    stats = op.statistics
+    if isinstance(relation, Relation):
+        relation = replace(
+            relation, estimate=lambda: stats.rows, statistics=lambda: stats
+        )
+    return loc.replace(relation)
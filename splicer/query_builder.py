@@ -63,6 +63,9 @@ class QueryBuilder(object):
     def __iter__(self):
         return iter(self.execute())
 
+    def __aiter__(self):
+        return self.query.aexecute()
+
     @property
     def schema(self):
         return self.query.schema
@@ -175,6 +178,9 @@ class QueryBuilder(object):
     def execute(self):
         return self.query.execute()
 
+    def aexecute(self):
+        return self.query.aexecute()
+
     def create_view(self, name):
         self.query.create_view(name)
         return self
@@ -8,14 +8,10 @@ from .ast import *
 
 
 def parse(statement, root_exp=None):
-    term = set(terminators)
-
     if root_exp is None:
         root_exp = and_exp
 
-    tokens = [
-        token.lower() if token.lower() in term else token for token in Tokens(statement)
-    ]
+    tokens = tokenize(statement)
 
     exp = root_exp(tokens)
     if tokens:
@@ -23,6 +19,17 @@ def parse(statement, root_exp=None):
     return exp
 
 
+def tokenize(statement):
+    """
+    Returns the statement's tokens with keywords in lower case,
+    statements with the same tokens parse the same.
+    """
+    term = set(terminators)
+    return [
+        token.lower() if token.lower() in term else token for token in Tokens(statement)
+    ]
+
+
 def parse_statement(statement):
     return parse(statement, root_exp=union_stmt)
 
@@ -8,7 +8,8 @@ from splicer.ast import LoadOp
 from .schema import Schema
 
 if TYPE_CHECKING:
-    from .adapters import Adapter
+    from .adapters import Adapter, Scan
+    from .statistics import Statistics
 
 
 @dataclass
@@ -21,6 +22,18 @@ class Relation:
     name: str
     schema: Optional[Schema]
     records: Callable[..., Any]
+    # optional function that given a ctx returns a list of functions
+    # each returning part of the records, see Adapter.partitions
+    partitions: Optional[Callable[..., Any]] = None
+    # optional function returning an estimate of the number of
+    # records or None, see Adapter.estimate_rows
+    estimate: Optional[Callable[[], Optional[int]]] = None
+    # the work the adapter does while scanning the records if any,
+    # see Adapter.accepts
+    scan: Optional[Scan] = None
+    # optional function returning the Statistics of the records
+    # or None, see Adapter.statistics
+    statistics: Optional[Callable[[], Optional[Statistics]]] = None
     # namedtuple('Relation', 'adapter, name, schema, records')
 
     # __slots__ = ()
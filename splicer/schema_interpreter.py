@@ -4,6 +4,8 @@
 Module used to interpret the AST into a schema based on a given relation.
 """
 
+from functools import partial
+
 from . import Relation
 from .ast import (
     AliasOp,
@@ -66,7 +68,10 @@ def schema_from_function_op(operation, dataset):
     func = dataset.get_function(operation.name)
 
     # each arg should eithe ber a relation or a constant
-    args = [a if hasattr(a, "schema") else a.const for a in operation.args]
+    args = [
+        relation_arg(dataset, a) if hasattr(a, "schema") else a.const
+        for a in operation.args
+    ]
 
     if hasattr(func, "resolve"):
         return func.resolve(func, dataset, *args)
@@ -81,7 +86,33 @@ def schema_from_function_op(operation, dataset):
     def records(ctx):
         return func(ctx, *args)
 
-    return Relation(None, operation.name, schema, records)
+    if hasattr(func, "estimate"):
+        estimate = partial(func.estimate, *args)
+    else:
+        estimate = None
+
+    return Relation(None, operation.name, schema, records, estimate=estimate)
+
+
+def relation_arg(dataset, operation):
+    """
+    Returns the relational argument of a function as a Relation,
+    compiling operations such as the SelectionOp adapters filter the
+    relations they pass to functions with, see DirAdapter.evaluate.
+    """
+    if isinstance(operation, Relation):
+        return operation
+
+    from .query import Query
+
+    records = dataset.compile(Query(dataset, operation))
+    return Relation(
+        None,
+        operation.schema.name,
+        operation.schema,
+        records,
+        estimate=getattr(records, "estimate", None),
+    )
 
 
 def relational_function(dataset, op):
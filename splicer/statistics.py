@@ -0,0 +1,165 @@
+# type: ignore
+"""
+Statistics describing the rows of relations, used by the optimizer to
+estimate how many rows operations return.
+
+Adapters report the statistics of their relations with
+Adapter.statistics, and DataSet.analyze computes them by scanning a
+relation. Distinct counts are estimated with a HyperLogLog sketch so
+analyzing a relation takes memory independent of its size.
+"""
+
+from dataclasses import dataclass, field
+from hashlib import blake2b
+from math import log
+from sys import getsizeof
+from typing import Any, Optional
+
+# registers of HyperLogLog sketches are addressed by this many bits
+PRECISION = 12
+
+MASK = (1 << 64) - 1
+
+
+@dataclass(frozen=True)
+class ColumnStatistics:
+    distinct: int
+    null_fraction: float
+    min: Any = None
+    max: Any = None
+    # average size in bytes of the column's values
+    width: float = 0.0
+
+
+@dataclass(frozen=True)
+class Statistics:
+    rows: int
+    # ColumnStatistics by field name
+    columns: dict = field(default_factory=dict)
+
+    def column(self, name: str) -> Optional[ColumnStatistics]:
+        return self.columns.get(name)
+
+
+class HyperLogLog:
+    """
+    Estimates the number of distinct values added to it within a
+    couple of percent using 2 ** precision bytes.
+    """
+
+    def __init__(self, precision=PRECISION):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, value):
+        h = mix(hash_of(value))
+        bits = 64 - self.precision
+        index = h >> bits
+        rank = bits - (h & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0**-r for r in self.registers)
+
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # few values, linear counting is more accurate
+            estimate = m * log(m / zeros)
+
+        return int(round(estimate))
+
+
+def hash_of(value):
+    """
+    Hashes values the same way in every process, str and bytes hashes
+    are randomized per process which would change the estimates.
+    """
+    if isinstance(value, (int, float)):
+        return hash(value)
+    if isinstance(value, str):
+        value = value.encode("utf-8", "surrogatepass")
+    elif not isinstance(value, bytes):
+        # repeated fields are lists
+        value = repr(value).encode("utf-8", "surrogatepass")
+    return int.from_bytes(blake2b(value, digest_size=8).digest(), "little")
+
+
+def mix(h):
+    """
+    Spreads the bits of a hash, small ints hash to themselves
+    which would otherwise all land in the first register.
+    """
+    h &= MASK
+    h = ((h ^ (h >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    h = ((h ^ (h >> 27)) * 0x94D049BB133111EB) & MASK
+    return h ^ (h >> 31)
+
+
+class ColumnCollector:
+    def __init__(self):
+        self.sketch = HyperLogLog()
+        self.nulls = 0
+        self.size = 0
+        self.min = self.max = None
+        self.ordered = True
+
+    def add(self, value):
+        if value is None:
+            self.nulls += 1
+            return
+
+        self.sketch.add(value)
+        self.size += getsizeof(value)
+
+        if not self.ordered:
+            return
+
+        try:
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+        except TypeError:
+            # values that can't be compared have no range
+            self.ordered = False
+            self.min = self.max = None
+
+    def statistics(self, rows):
+        values = rows - self.nulls
+        distinct = min(self.sketch.count(), values)
+
+        return ColumnStatistics(
+            distinct,
+            self.nulls / rows if rows else 0.0,
+            self.min,
+            self.max,
+            self.size / values if values else 0.0,
+        )
+
+
+def collect(schema, rows):
+    """
+    Returns the Statistics of the rows of a relation with the given
+    schema.
+    """
+    collectors = [ColumnCollector() for _ in schema.fields]
+
+    count = 0
+    for row in rows:
+        count += 1
+        for collector, value in zip(collectors, row):
+            collector.add(value)
+
+    return Statistics(
+        count,
+        {
+            f.name: collector.statistics(count)
+            for f, collector in zip(schema.fields, collectors)
+        },
+    )
@@ -1,3 +1,4 @@
+from itertools import islice
 from typing import Any, Iterator, TypeVar
 
 from . import protocols
@@ -55,3 +56,26 @@ class Table(Relation):
 
     def records(self, ctx: Any) -> Any:
         return iter(self)
+
+    def batches(self, size: int) -> Iterator[list[T]]:
+        """
+        Returns an iterator of lists containing at most size rows.
+
+        Used by the batch compiler. Tables that can produce
+        rows in bulk more cheaply than one at a time should
+        override this method.
+        """
+        rows = iter(self)
+        return iter(lambda: list(islice(rows, size)), [])
+
+    def columns(self) -> list[list[Any]]:
+        """
+        Returns a list of values for each field in the schema.
+
+        Used by the columnar compiler. Tables that store their
+        data by column should override this method.
+        """
+        rows = list(self)
+        if not rows:
+            return [[] for f in self.fields]
+        return [list(values) for values in zip(*rows)]
@@ -0,0 +1,221 @@
+import asyncio
+
+from splicer import DataSet
+from splicer.adapters import Adapter
+from splicer.adapters.dict_adapter import DictAdapter
+from splicer.compilers import local
+from splicer.schema import Schema
+
+from .fixtures.employee_adapter import EmployeeAdapter
+
+QUERIES = [
+    "select * from employees",
+    "select full_name from employees where manager_id = 1234",
+    "select employee_id + 1, full_name from employees",
+    "select * from employees order by full_name",
+    "select manager_id, count() from employees group by manager_id "
+    "order by manager_id",
+    "select count() from employees",
+    "select * from employees limit 2",
+    "select * from employees union all select * from employees",
+    "select distinct manager_id from employees",
+    "select * from employees as employee "
+    "join employees as manager on manager.employee_id = employee.manager_id",
+    "select x, y from numbers where x > 30 and y < 50 order by y, x desc",
+    "select y, count() from numbers group by y order by y",
+    "select x from numbers union all select y from numbers",
+    "select 1",
+]
+
+
+def numbers_adapter():
+    return DictAdapter(
+        numbers=dict(
+            schema=dict(
+                fields=[
+                    dict(name="x", type="INTEGER"),
+                    dict(name="y", type="INTEGER"),
+                ]
+            ),
+            rows=[dict(x=i, y=(i * 7) % 101) for i in range(5000)],
+        )
+    )
+
+
+def dataset():
+    dataset = DataSet()
+    dataset.add_adapter(EmployeeAdapter())
+    dataset.add_adapter(numbers_adapter())
+    return dataset
+
+
+async def collect(rows):
+    return [row async for row in rows]
+
+
+def test_async_results_match_local():
+    ds = dataset()
+
+    for sql in QUERIES:
+        expected = list(ds.execute(sql))
+        assert asyncio.run(collect(ds.aexecute(sql))) == expected, sql
+
+
+def test_async_iteration():
+    ds = dataset()
+    query = ds.frm("numbers").where("x < 10")
+
+    assert asyncio.run(collect(query)) == list(query)
+    assert asyncio.run(
+        collect(ds.aexecute("select x from numbers where x = ?0", 5))
+    ) == [(5,)]
+
+
+def test_async_limit_stops_scan():
+    scanned = []
+
+    class CountingAdapter(Adapter):
+        def has(self, name):
+            return name == "counter"
+
+        def schema(self, name):
+            return Schema(fields=[dict(name="n", type="INTEGER")])
+
+        def table_scan(self, name, ctx):
+            for n in range(10000):
+                scanned.append(n)
+                yield (n,)
+
+    ds = DataSet()
+    ds.add_adapter(CountingAdapter())
+
+    rows = asyncio.run(collect(ds.aexecute("select * from counter limit 3")))
+
+    assert rows == [(0,), (1,), (2,)]
+    # scans in a thread read a chunk at a time
+    assert len(scanned) < 10000
+
+
+def test_concurrent_queries():
+    ds = dataset()
+
+    async def run():
+        return await asyncio.gather(
+            collect(ds.aexecute("select count() from numbers")),
+            collect(ds.aexecute("select * from employees order by full_name")),
+            collect(ds.aexecute("select max(x) from numbers")),
+        )
+
+    counts, employees, maximum = asyncio.run(run())
+
+    assert counts == [(5000,)]
+    assert employees == list(ds.execute("select * from employees order by full_name"))
+    assert maximum == [(4999,)]
+
+
+def test_union_all_scans_right_while_left_is_consumed():
+    events = []
+
+    class SlowAdapter(Adapter):
+        def has(self, name):
+            return name in ("lefts", "rights")
+
+        def schema(self, name):
+            return Schema(fields=[dict(name="n", type="INTEGER")])
+
+        async def rows(self, name):
+            events.append(("start", name))
+            for n in range(3):
+                await asyncio.sleep(0.01)
+                yield (n,)
+            events.append(("end", name))
+
+        def table_scan_async(self, name, ctx):
+            return self.rows(name)
+
+        def scan_async(self, name, scan, ctx):
+            return self.rows(name)
+
+    ds = DataSet()
+    ds.add_adapter(SlowAdapter())
+
+    rows = asyncio.run(
+        collect(ds.aexecute("select * from lefts union all select * from rights"))
+    )
+
+    assert rows == [(0,), (1,), (2,)] * 2
+    # the right side started before the left one ended
+    assert events.index(("start", "rights")) < events.index(("end", "lefts"))
+
+
+def test_async_join_streams():
+    scanned = []
+
+    class CountingAdapter(Adapter):
+        def has(self, name):
+            return name in ("counter", "few")
+
+        def schema(self, name):
+            return Schema(fields=[dict(name="n", type="INTEGER")])
+
+        def table_scan(self, name, ctx):
+            if name == "few":
+                yield from [(0,), (1,), (2,)]
+                return
+            for n in range(100000):
+                scanned.append(n)
+                yield (n % 10,)
+
+    ds = DataSet()
+    ds.add_adapter(CountingAdapter())
+
+    rows = asyncio.run(
+        collect(
+            ds.aexecute(
+                "select c.n from counter as c join few as f on c.n = f.n limit 5"
+            )
+        )
+    )
+
+    assert rows == [(0,), (1,), (2,), (0,), (1,)]
+    # the join returned rows before its input was scanned
+    assert len(scanned) < 100000
+
+
+def test_async_distinct_streams(monkeypatch):
+    scanned = []
+
+    class CountingAdapter(Adapter):
+        def has(self, name):
+            return name == "counter"
+
+        def schema(self, name):
+            return Schema(fields=[dict(name="n", type="INTEGER")])
+
+        def table_scan(self, name, ctx):
+            for n in range(100000):
+                scanned.append(n)
+                yield (n % 10,)
+
+    ds = DataSet()
+    ds.add_adapter(CountingAdapter())
+
+    rows = asyncio.run(collect(ds.aexecute("select distinct n from counter limit 3")))
+
+    assert rows == [(0,), (1,), (2,)]
+    assert len(scanned) < 100000
+
+    # sorted rows are compared with the previous one
+    compared = []
+    sorted_distinct = local.sorted_distinct
+
+    def tracking_distinct(rows):
+        compared.append(True)
+        return sorted_distinct(rows)
+
+    monkeypatch.setattr(local, "sorted_distinct", tracking_distinct)
+    sql = "select distinct y from (select y from numbers order by y)"
+    ds = dataset()
+
+    assert asyncio.run(collect(ds.aexecute(sql))) == [(y,) for y in range(101)]
+    assert compared == [True]
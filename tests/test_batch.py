@@ -0,0 +1,75 @@
+from splicer import DataSet
+from splicer.adapters.dict_adapter import DictAdapter
+from splicer.compilers import batch, local  # type: ignore
+
+from .fixtures.employee_adapter import EmployeeAdapter
+
+QUERIES = [
+    "select * from employees",
+    "select full_name from employees where manager_id = 1234",
+    "select employee_id + 1, full_name from employees",
+    "select * from employees order by full_name",
+    "select manager_id, count() from employees group by manager_id",
+    "select count() from employees",
+    "select * from employees limit 2",
+    "select * from employees order by full_name limit 2",
+    "select x, y from numbers order by y desc limit 1500",
+    "select * from employees union all select * from employees",
+    "select distinct manager_id from employees",
+    "select * from employees as employee "
+    "join employees as manager on manager.employee_id = employee.manager_id",
+    "select x, y from numbers where x > 30 and y < 500",
+    "select x from numbers limit 1500",
+    "select 1",
+]
+
+
+def numbers_adapter():
+    return DictAdapter(
+        numbers=dict(
+            schema=dict(
+                fields=[dict(name="x", type="INTEGER"), dict(name="y", type="INTEGER")]
+            ),
+            rows=[dict(x=i, y=i * 2) for i in range(5000)],
+        )
+    )
+
+
+def dataset_with(compile):
+    dataset = DataSet()
+    dataset.add_adapter(EmployeeAdapter())
+    dataset.add_adapter(numbers_adapter())
+    dataset.set_compiler(compile)
+    return dataset
+
+
+def test_batch_results_match_local():
+    local_ds = dataset_with(local.compile)
+    batch_ds = dataset_with(batch.compile)
+
+    for sql in QUERIES:
+        assert list(batch_ds.execute(sql)) == list(local_ds.execute(sql)), sql
+
+    assert list(batch_ds.frm("numbers").offset(1030).limit(2000)) == list(
+        local_ds.frm("numbers").offset(1030).limit(2000)
+    )
+
+
+def test_batch_size_from_ctx():
+    dataset = dataset_with(batch.compile)
+    query = dataset.query("select x from numbers where x < 10")
+    func = batch.compile(query)
+
+    rows = list(func(dict(dataset=dataset, batch_size=3)))
+
+    assert rows == [(x,) for x in range(10)]
+
+
+def test_table_batches():
+    adapter = numbers_adapter()
+    table = adapter.get_relation("numbers")
+
+    batches = list(table.batches(2000))
+
+    assert [len(b) for b in batches] == [2000, 2000, 1000]
+    assert [row for b in batches for row in b] == list(table)
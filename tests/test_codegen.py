@@ -0,0 +1,80 @@
+from datetime import date
+
+import pytest
+
+from splicer import DataSet, Schema
+from splicer.ast import *
+from splicer.compilers import codegen  # type: ignore
+from splicer.compilers.local import value_expr  # type: ignore
+from splicer.query_parser import parse  # type: ignore
+
+SCHEMA = Schema(
+    [
+        dict(name="a", type="INTEGER"),
+        dict(name="b", type="INTEGER"),
+        dict(name="c", type="INTEGER"),
+        dict(name="d", type="STRING"),
+    ]
+)
+
+ROWS = [(1, 2, 3, "x"), (5, 1, 3, "x"), (10, 10, 100, "y"), (4, 0, 4, "x")]
+
+
+@pytest.mark.parametrize(
+    "statement",
+    [
+        "a + b * 2 > c and d = 'x'",
+        "a - b",
+        "a / b + 1",
+        "not a = 1",
+        "-a",
+        "a = 1 or d = 'y'",
+        "d is null",
+        "1 + 2 * 3",
+        "length(d)",
+    ],
+)
+def test_matches_closures(statement):
+    dataset = DataSet()
+    expr = parse(statement)
+
+    generated = codegen.compile_expr(expr, SCHEMA, dataset)
+    closure = value_expr(expr, SCHEMA, dataset)
+
+    for row in ROWS:
+        if statement == "a / b + 1" and row[1] == 0:
+            with pytest.raises(ZeroDivisionError):
+                generated(row, {})
+            continue
+        assert generated(row, {}) == closure(row, {})
+
+
+def test_inlines_positions_and_folds_constants():
+    expr = AddOp(Var("c"), MulOp(NumberConst(2), NumberConst(3)))
+    func = codegen.compile_expr(expr, SCHEMA, DataSet())
+
+    assert "row[2]" in func.source
+    assert "6" in func.source
+    assert func((0, 0, 1, ""), {}) == 7
+
+
+def test_compile_tuple():
+    func = codegen.compile_tuple(
+        [Var("d"), NumberConst(1), ParamGetterOp(0)], SCHEMA, DataSet()
+    )
+
+    assert func(ROWS[0], dict(params=("p",))) == ("x", 1, "p")
+    assert codegen.compile_tuple([], SCHEMA, None)(ROWS[0], {}) == ()
+
+
+def test_non_literal_constants_are_bound():
+    expr = EqOp(Var("a"), Const(date(2009, 1, 17)))
+    func = codegen.compile_expr(expr, SCHEMA, None)
+
+    assert func((date(2009, 1, 17),), {}) is True
+
+
+def test_compile_key():
+    key_for = codegen.compile_key([Var("c"), Var("a")], SCHEMA, None)
+
+    assert sorted(ROWS, key=key_for({})) == [ROWS[0], ROWS[1], ROWS[3], ROWS[2]]
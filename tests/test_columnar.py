@@ -0,0 +1,120 @@
+import pytest
+
+from splicer import DataSet
+from splicer.adapters.dict_adapter import DictAdapter
+from splicer.compilers import local  # type: ignore
+
+from .fixtures.employee_adapter import EmployeeAdapter
+
+np = pytest.importorskip("numpy")
+
+from splicer.compilers import columnar  # type: ignore  # isort:skip
+
+QUERIES = [
+    "select * from employees",
+    "select full_name from employees where manager_id = 1234",
+    "select employee_id + 1, full_name from employees",
+    "select * from employees order by full_name",
+    "select * from employees order by manager_id, employee_id",
+    "select manager_id, count() from employees group by manager_id "
+    "order by manager_id",
+    "select count() from employees",
+    "select * from employees limit 2",
+    "select * from employees union all select * from employees",
+    "select distinct manager_id from employees",
+    "select * from employees as employee "
+    "join employees as manager on manager.employee_id = employee.manager_id",
+    "select x, y from numbers where x > 30 and y < 500",
+    "select x / 3, y * 1.5, x - y from numbers where x > 0",
+    "select x from numbers where x < 10 or y = 5",
+    "select flag, count(), min(x), max(y) from numbers group by flag order by flag",
+    "select label, min_by(x, y) from numbers group by label order by label",
+    "select flag, label, count() from numbers group by flag, label "
+    "order by flag, label",
+    "select x, y from numbers order by y, x desc",
+    "select length(label) from numbers where label is not null",
+    "select 1",
+]
+
+
+def numbers_adapter():
+    return DictAdapter(
+        numbers=dict(
+            schema=dict(
+                fields=[
+                    dict(name="x", type="INTEGER"),
+                    dict(name="y", type="INTEGER"),
+                    dict(name="flag", type="BOOLEAN"),
+                    dict(name="label", type="STRING"),
+                ]
+            ),
+            rows=[
+                dict(x=i, y=(i * 7) % 101, flag=i % 3 == 0, label=str(i % 5))
+                for i in range(1000)
+            ]
+            + [dict(x=1000, y=5)],
+        )
+    )
+
+
+def dataset_with(compile):
+    dataset = DataSet()
+    dataset.add_adapter(EmployeeAdapter())
+    dataset.add_adapter(numbers_adapter())
+    dataset.set_compiler(compile)
+    return dataset
+
+
+def test_columnar_results_match_local():
+    local_ds = dataset_with(local.compile)
+    columnar_ds = dataset_with(columnar.compile)
+
+    for sql in QUERIES:
+        expected = list(local_ds.execute(sql))
+        assert list(columnar_ds.execute(sql)) == expected, sql
+
+
+def test_typed_columns():
+    dataset = dataset_with(columnar.compile)
+    relation = dataset.get_relation("numbers")
+
+    columns = columnar.to_columns(iter(relation), relation.schema)
+
+    assert columns.length == 1001
+    assert [a.dtype.kind for a in columns.arrays] == ["i", "i", "O", "O"]
+
+    columns = columnar.to_columns(list(relation)[:10], relation.schema)
+    assert [a.dtype.kind for a in columns.arrays] == ["i", "i", "b", "O"]
+
+
+def test_division_by_zero():
+    dataset = dataset_with(columnar.compile)
+
+    with pytest.raises(ZeroDivisionError):
+        list(dataset.execute("select x / y from numbers"))
+
+
+def test_integer_overflow():
+    def big_dataset(compile):
+        dataset = DataSet()
+        dataset.add_adapter(
+            DictAdapter(
+                big=dict(
+                    schema=dict(fields=[dict(name="v", type="INTEGER")]),
+                    rows=[dict(v=2**62), dict(v=-(2**63)), dict(v=-1), dict(v=3)],
+                )
+            )
+        )
+        dataset.set_compiler(compile)
+        return dataset
+
+    sql = (
+        "select v * 4, v + v, v - 3, -v, v / -1, v * 100000000000000000000 " "from big"
+    )
+    expected = list(big_dataset(local.compile).execute(sql))
+    assert expected[0][:2] == (2**64, 2**63)
+    assert list(big_dataset(columnar.compile).execute(sql)) == expected
+
+    # results in range stay typed
+    add = columnar.COLUMN_EXPR[columnar.AddOp].args[0]
+    assert add(np.array([1, 2]), 3).dtype.kind == "i"
@@ -1,8 +1,12 @@
 from datetime import date
 
 from splicer import DataSet, Query
+from splicer.adapters.dict_adapter import DictAdapter
 from splicer.ast import *
+from splicer.compilers import join, local  # type: ignore
 from splicer.compilers.local import compile  # type: ignore
+from splicer.executor import ProcessExecutor  # type: ignore
+from splicer.field import Field
 
 from .fixtures.employee_adapter import EmployeeAdapter
 
@@ -201,6 +205,169 @@ def test_aggregation_on_column():
     assert list(evaluate(dict(dataset=dataset))) == [(None, 1), (1234, 2)]
 
 
+def test_aggregation_ordered_by_group_key():
+    dataset = DataSet()
+    dataset.add_adapter(EmployeeAdapter())
+
+    q = Query(
+        dataset,
+        OrderByOp(
+            GroupByOp(
+                ProjectionOp(LoadOp("employees"), Var("manager_id"), Function("count")),
+                Var("manager_id"),
+            ),
+            Var("manager_id"),
+        ),
+    )
+    evaluate = compile(q)
+
+    assert list(evaluate(dict(dataset=dataset))) == [(None, 1), (1234, 2)]
+
+
+def test_aggregation_spills_groups():
+    dataset = DataSet()
+    dataset.add_adapter(
+        DictAdapter(
+            numbers=dict(
+                schema=dict(fields=[dict(name="x", type="INTEGER")]),
+                rows=[dict(x=i % 500) for i in range(2000)],
+            )
+        )
+    )
+
+    q = Query(
+        dataset,
+        GroupByOp(
+            ProjectionOp(LoadOp("numbers"), Var("x"), Function("count")), Var("x")
+        ),
+    )
+    evaluate = compile(q)
+
+    rows = list(evaluate(dict(dataset=dataset, sort_buffer_size=1024)))
+
+    assert sorted(rows) == [(x, 4) for x in range(500)]
+
+
+def test_distinct_spills_rows():
+    dataset = DataSet()
+    dataset.add_adapter(
+        DictAdapter(
+            numbers=dict(
+                schema=dict(fields=[dict(name="x", type="INTEGER")]),
+                rows=[dict(x=(i * 7919) % 500) for i in range(2000)],
+            )
+        )
+    )
+
+    q = Query(dataset, DistinctOp(LoadOp("numbers")))
+    evaluate = compile(q)
+
+    rows = list(evaluate(dict(dataset=dataset, sort_buffer_size=1024)))
+
+    assert sorted(rows) == [(x,) for x in range(500)]
+
+
+def test_distinct_sorted_input(monkeypatch):
+    from splicer.compilers import local
+
+    dataset = DataSet()
+    dataset.add_adapter(
+        DictAdapter(
+            numbers=dict(
+                schema=dict(
+                    fields=[
+                        dict(name="x", type="INTEGER"),
+                        dict(name="y", type="INTEGER"),
+                    ]
+                ),
+                rows=[dict(x=i % 50, y=i) for i in range(2000)],
+            )
+        )
+    )
+
+    q = Query(
+        dataset,
+        DistinctOp(
+            ProjectionOp(
+                OrderByOp(LoadOp("numbers"), Desc(Var("x")), Var("y")), Var("x")
+            )
+        ),
+    )
+    evaluate = compile(q)
+
+    # adjacent duplicates are dropped without remembering every row
+    monkeypatch.setattr(local, "hash_distinct", None)
+    rows = list(evaluate(dict(dataset=dataset)))
+
+    assert rows == [(x,) for x in reversed(range(50))]
+
+
+def test_two_phase_aggregation():
+    dataset = DataSet()
+    dataset.add_adapter(
+        DictAdapter(
+            numbers=dict(
+                schema=dict(
+                    fields=[
+                        dict(name="x", type="INTEGER"),
+                        dict(name="y", type="INTEGER"),
+                    ]
+                ),
+                rows=[dict(x=i % 50, y=i) for i in range(1000)],
+            )
+        )
+    )
+
+    q = Query(
+        dataset,
+        GroupByOp(
+            ProjectionOp(
+                UnionAllOp(LoadOp("numbers"), LoadOp("numbers")),
+                Var("x"),
+                Function("count"),
+                Function("min", Var("y")),
+                Function("max", Var("y")),
+                Function("min_by", Var("y"), Var("y")),
+            ),
+            Var("x"),
+        ),
+    )
+    evaluate = compile(q)
+
+    expected = [(x, 40, x, 950 + x, x) for x in range(50)]
+    assert sorted(evaluate(dict(dataset=dataset))) == expected
+
+    # each branch of the union is split in 4, so 8 partial aggregates
+    dataset.set_executor(ProcessExecutor(max_workers=2))
+    for ctx in (dict(split_size=300), dict(split_size=300, sort_buffer_size=1024)):
+        assert sorted(evaluate(dict(dataset=dataset, **ctx))) == expected
+
+
+def test_aggregation_without_merge_is_sequential():
+    dataset = DataSet()
+    dataset.add_adapter(EmployeeAdapter())
+    dataset.add_aggregate(
+        "total",
+        func=lambda state, value: state + value,
+        returns=Field(name="total", type="INTEGER"),
+        initial=0,
+    )
+
+    q = Query(
+        dataset,
+        GroupByOp(
+            ProjectionOp(
+                UnionAllOp(LoadOp("employees"), LoadOp("employees")),
+                Function("total", Var("employee_id")),
+            ),
+        ),
+    )
+    evaluate = compile(q)
+
+    dataset.set_executor(ProcessExecutor(max_workers=2))
+    assert list(evaluate(dict(dataset=dataset))) == [(2 * (1234 + 4567 + 8901),)]
+
+
 def test_limit():
     dataset = DataSet()
     dataset.add_adapter(EmployeeAdapter())
@@ -238,6 +405,168 @@ def test_offset_and_limit():
     ]
 
 
+def test_order_by_desc_string():
+    dataset = DataSet()
+    dataset.add_adapter(EmployeeAdapter())
+
+    q = Query(dataset, OrderByOp(LoadOp("employees"), Desc(Var("full_name"))))
+    evaluate = compile(q)
+
+    assert [row[1] for row in evaluate(dict(dataset=dataset))] == [
+        "Tom Tompson",
+        "Sally Sanders",
+        "Mark Markty",
+    ]
+
+
+def test_order_by_mixed_directions_with_nulls():
+    dataset = DataSet()
+    dataset.add_adapter(EmployeeAdapter())
+
+    q = Query(
+        dataset,
+        OrderByOp(LoadOp("employees"), Desc(Var("manager_id")), Asc(Var("full_name"))),
+    )
+    evaluate = compile(q)
+
+    # nulls sort before every other value, so they're last descending
+    assert [row[1] for row in evaluate(dict(dataset=dataset))] == [
+        "Mark Markty",
+        "Sally Sanders",
+        "Tom Tompson",
+    ]
+
+    q = Query(
+        dataset,
+        OrderByOp(LoadOp("employees"), Asc(Var("manager_id")), Desc(Var("full_name"))),
+    )
+    evaluate = compile(q)
+
+    assert [row[1] for row in evaluate(dict(dataset=dataset))] == [
+        "Tom Tompson",
+        "Sally Sanders",
+        "Mark Markty",
+    ]
+
+
+def test_order_by_spills_runs():
+    dataset = DataSet()
+    dataset.add_adapter(
+        DictAdapter(
+            numbers=dict(
+                schema=dict(
+                    fields=[
+                        dict(name="x", type="INTEGER"),
+                        dict(name="y", type="INTEGER"),
+                    ]
+                ),
+                rows=[dict(x=(i * 7919) % 1000, y=i) for i in range(2000)],
+            )
+        )
+    )
+
+    q = Query(dataset, OrderByOp(LoadOp("numbers"), Var("x")))
+    evaluate = compile(q)
+
+    rows = list(evaluate(dict(dataset=dataset, sort_buffer_size=4096)))
+
+    # stable, rows with equal x keep their input order
+    assert rows == sorted(rows)
+
+    q = Query(dataset, OrderByOp(LoadOp("numbers"), Var("x"), Desc(Var("y"))))
+    evaluate = compile(q)
+
+    rows = list(evaluate(dict(dataset=dataset, sort_buffer_size=4096)))
+
+    assert rows == sorted(rows, key=lambda row: (row[0], -row[1]))
+
+
+def test_order_by_values_of_another_type():
+    # adapters don't check their values against the schema
+    values = ["b", 1, "a", None, 2, "a"] * 300
+    dataset = DataSet()
+    dataset.add_adapter(
+        DictAdapter(
+            mixed=dict(
+                schema=dict(fields=[dict(name="x", type="STRING")]),
+                rows=[dict(x=x) for x in values],
+            )
+        )
+    )
+    expected = [None] * 300 + [1] * 300 + [2] * 300 + ["a"] * 600 + ["b"] * 300
+
+    q = Query(dataset, OrderByOp(LoadOp("mixed"), Var("x")))
+    evaluate = compile(q)
+
+    assert [row[0] for row in evaluate(dict(dataset=dataset))] == expected
+    rows = evaluate(dict(dataset=dataset, sort_buffer_size=4096))
+    assert [row[0] for row in rows] == expected
+
+    q = Query(dataset, OrderByOp(LoadOp("mixed"), Desc(Var("x"))))
+    evaluate = compile(q)
+
+    assert [row[0] for row in evaluate(dict(dataset=dataset))] == expected[::-1]
+
+    q = Query(dataset, SliceOp(OrderByOp(LoadOp("mixed"), Var("x")), 600, 1200))
+    evaluate = compile(q)
+
+    assert evaluate.__name__ == "top_n"
+    assert [row[0] for row in evaluate(dict(dataset=dataset))] == expected[600:1200]
+
+    q = Query(
+        dataset,
+        OrderByOp(
+            GroupByOp(
+                ProjectionOp(LoadOp("mixed"), Var("x"), Function("count")),
+                Var("x"),
+            ),
+            Var("x"),
+        ),
+    )
+    evaluate = compile(q)
+
+    assert list(evaluate(dict(dataset=dataset))) == [
+        (None, 300),
+        (1, 300),
+        (2, 300),
+        ("a", 600),
+        ("b", 300),
+    ]
+
+
+def test_order_by_limit():
+    dataset = DataSet()
+    dataset.add_adapter(EmployeeAdapter())
+
+    q = Query(
+        dataset,
+        SliceOp(OrderByOp(LoadOp("employees"), Var("full_name")), 1, 3),
+    )
+    evaluate = compile(q)
+
+    assert evaluate.__name__ == "top_n"
+    assert list(evaluate(dict(dataset=dataset))) == [
+        (4567, "Sally Sanders", date(2010, 2, 24), 1234, ()),
+        (1234, "Tom Tompson", date(2009, 1, 17), None, ()),
+    ]
+
+
+def test_order_by_limit_keeps_ties_in_order():
+    dataset = DataSet()
+    dataset.add_adapter(EmployeeAdapter())
+
+    q = Query(
+        dataset,
+        SliceOp(OrderByOp(LoadOp("employees"), Var("manager_id")), 2),
+    )
+    evaluate = compile(q)
+
+    assert list(evaluate(dict(dataset=dataset))) == [
+        (1234, "Tom Tompson", date(2009, 1, 17), None, ()),
+        (4567, "Sally Sanders", date(2010, 2, 24), 1234, ()),
+    ]
+
+
 def test_cross_join():
     dataset = DataSet()
     dataset.add_adapter(EmployeeAdapter())
@@ -289,6 +618,154 @@ def test_self_join():
     ]
 
 
+def join_dataset():
+    dataset = DataSet()
+    dataset.add_adapter(
+        DictAdapter(
+            left=dict(
+                schema=dict(
+                    fields=[
+                        dict(name="x", type="INTEGER"),
+                        dict(name="a", type="INTEGER"),
+                    ]
+                ),
+                rows=[dict(x=(i * 37) % 100, a=i) for i in range(300)],
+            ),
+            right=dict(
+                schema=dict(
+                    fields=[
+                        dict(name="y", type="INTEGER"),
+                        dict(name="b", type="INTEGER"),
+                    ]
+                ),
+                rows=[dict(y=(i * 11) % 150, b=i) for i in range(200)],
+            ),
+        )
+    )
+    return dataset
+
+
+def expected_join(dataset, left_join):
+    left = list(dataset.get_relation("left"))
+    right = list(dataset.get_relation("right"))
+
+    expected = []
+    for l_row in left:
+        matches = [r_row for r_row in right if r_row[0] == l_row[0]]
+        if not matches and left_join:
+            matches = [(None, None)]
+        expected.extend(l_row + r_row for r_row in matches)
+    return expected
+
+
+def test_merge_join_sorted_inputs(monkeypatch):
+    from splicer.compilers import local
+
+    dataset = join_dataset()
+
+    q = Query(
+        dataset,
+        LeftJoinOp(
+            OrderByOp(LoadOp("left"), Var("x")),
+            OrderByOp(LoadOp("right"), Var("y"), Var("b")),
+            EqOp(Var("x"), Var("y")),
+        ),
+    )
+    evaluate = compile(q)
+
+    # sorted inputs are merged without a hash table
+    monkeypatch.setattr(local, "hash_join", None)
+    rows = list(evaluate(dict(dataset=dataset)))
+
+    expected = expected_join(dataset, True)
+    assert rows == sorted(expected, key=lambda row: row[0])
+
+
+def test_hash_join_spills_partitions():
+    dataset = join_dataset()
+
+    for op, left_join in ((JoinOp, False), (LeftJoinOp, True)):
+        q = Query(
+            dataset, op(LoadOp("left"), LoadOp("right"), EqOp(Var("x"), Var("y")))
+        )
+        evaluate = compile(q)
+
+        expected = expected_join(dataset, left_join)
+
+        rows = list(evaluate(dict(dataset=dataset)))
+        assert rows == expected
+
+        rows = list(evaluate(dict(dataset=dataset, sort_buffer_size=2048)))
+        assert sorted(rows, key=repr) == sorted(expected, key=repr)
+
+
+def test_hash_join_builds_on_smaller_relation(monkeypatch):
+    builds = []
+    original = join.smaller_side
+
+    def smaller_side(*args):
+        side, lefts, rights = original(*args)
+        builds.append(side)
+        return side, lefts, rights
+
+    monkeypatch.setattr(join, "smaller_side", smaller_side)
+
+    dataset = join_dataset()
+    expected = [
+        r_row + l_row
+        for r_row in dataset.get_relation("right")
+        for l_row in dataset.get_relation("left")
+        if r_row[0] == l_row[0] and r_row[1] < 100
+    ]
+
+    # the selection leaves the size of the right relation unknown
+    q = Query(
+        dataset,
+        JoinOp(
+            SelectionOp(LoadOp("right"), LtOp(Var("b"), NumberConst(100))),
+            LoadOp("left"),
+            EqOp(Var("x"), Var("y")),
+        ),
+    )
+    rows = list(compile(q)(dict(dataset=dataset)))
+
+    assert builds == ["left"]
+    assert sorted(rows) == sorted(expected)
+
+
+def test_hash_join_builds_on_smaller_estimate(monkeypatch):
+    builds = []
+
+    def smaller_side(*args):
+        raise AssertionError("both relations have estimates")
+
+    def hash_join(left_join, l_op, r_op, comparison, ctx, build=None):
+        builds.append(build)
+        return original(left_join, l_op, r_op, comparison, ctx, build)
+
+    original = join.hash_join
+    monkeypatch.setattr(join, "smaller_side", smaller_side)
+    monkeypatch.setattr(local, "hash_join", hash_join)
+
+    dataset = join_dataset()
+    expected = [
+        r_row + l_row
+        for r_row in dataset.get_relation("right")
+        for l_row in dataset.get_relation("left")
+        if r_row[0] == l_row[0]
+    ]
+
+    for left, right, build in (("right", "left", "left"), ("left", "right", "right")):
+        q = Query(
+            dataset, JoinOp(LoadOp(left), LoadOp(right), EqOp(Var("x"), Var("y")))
+        )
+        rows = list(compile(q)(dict(dataset=dataset)))
+
+        assert builds.pop() == build
+        if left == "right":
+            assert sorted(rows) == sorted(expected)
+
+
 def test_self_join_with_projection():
     dataset = DataSet()
     dataset.add_adapter(EmployeeAdapter())
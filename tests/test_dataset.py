@@ -1,10 +1,16 @@
+import asyncio
+from dataclasses import replace
+
 from splicer import DataSet, Query, Table
 from splicer.ast import *
+from splicer.compilers import local
+from splicer.optimizer import optimize
 from splicer.dataset import replace_views
 from splicer.query_builder import QueryBuilder  # type: ignore
 from splicer.schema import Schema
 
 from . import compare
+from .fixtures.employee_adapter import EmployeeAdapter
 from .fixtures.mock_adapter import MockAdapter
 
 
@@ -149,3 +155,183 @@ def test_replace_view_within_a_view():
             ),
         ),
     )
+
+
+def counting_compiler(dataset):
+    compiled = []
+
+    def compile(query):
+        compiled.append(query)
+        return local.compile(query)
+
+    dataset.set_compiler(compile)
+    return compiled
+
+
+def test_plan_cache():
+    class VersionedAdapter(EmployeeAdapter):
+        def __init__(self):
+            super(VersionedAdapter, self).__init__()
+            self.changes = 0
+
+        def version(self):
+            return self.changes
+
+    dataset = DataSet()
+    adapter = dataset.add_adapter(VersionedAdapter())
+    compiled = counting_compiler(dataset)
+
+    sql = "select full_name from employees where employee_id = ?0"
+    assert list(dataset.execute(sql, 1234)) == [("Tom Tompson",)]
+    assert list(dataset.execute(sql, 4567)) == [("Sally Sanders",)]
+    assert len(compiled) == 1
+
+    # whitespace and the case of keywords don't matter
+    dataset.execute("SELECT full_name\nFROM employees  where employee_id = ?0", 1)
+    assert len(compiled) == 1
+
+    dataset.execute("select full_name from employees where full_name = 'Tom  Tompson'")
+    assert len(compiled) == 2
+
+    adapter.changes += 1
+    dataset.execute(sql, 1234)
+    assert len(compiled) == 3
+
+    dataset.create_view("managers", "select * from employees where manager_id is null")
+    dataset.execute(sql, 1234)
+    assert len(compiled) == 4
+
+    dataset.add_function("double", lambda x: x * 2)
+    dataset.execute(sql, 1234)
+    assert len(compiled) == 5
+
+    # queries that aren't statements aren't cached
+    dataset.execute(dataset.query(sql), 1234)
+    dataset.execute(dataset.query(sql), 1234)
+    assert len(compiled) == 7
+
+
+def test_plan_cache_size():
+    dataset = DataSet()
+    dataset.add_adapter(EmployeeAdapter())
+    compiled = counting_compiler(dataset)
+
+    dataset.set_plan_cache_size(1)
+    for sql in ("select full_name from employees", "select 1", "select 1") * 2:
+        dataset.execute(sql)
+    assert len(compiled) == 4
+    assert len(dataset.plan_cache) == 1
+
+    dataset.set_plan_cache_size(0)
+    dataset.execute("select 1")
+    dataset.execute("select 1")
+    assert len(compiled) == 6
+    assert len(dataset.plan_cache) == 0
+
+
+def test_prepare():
+    dataset = DataSet()
+    dataset.add_adapter(EmployeeAdapter())
+    compiled = counting_compiler(dataset)
+
+    sql = "select full_name from employees where employee_id = ?0"
+    prepared = dataset.prepare(sql)
+    assert list(prepared.execute(1234)) == [("Tom Tompson",)]
+    assert list(dataset.execute(prepared, 4567)) == [("Sally Sanders",)]
+    assert list(dataset.execute(sql, 1234)) == [("Tom Tompson",)]
+
+    # the adapter filters on parameters as well as constants, so
+    # the plan isn't specialized and is shared with the statement
+    assert prepared.plan(dataset.compile, (1234,)) is dataset.plan(sql, dataset.compile)
+    assert len(compiled) == 1
+
+    # the bound predicate is pushed down to the adapter
+    relation = optimize(prepared.bind(1234)).operations.relation
+    assert relation.scan.predicates == (EqOp(Var("employee_id"), NumberConst(1234)),)
+
+
+def test_prepare_specialized():
+    class ConstantAdapter(EmployeeAdapter):
+        """Only filters on constants"""
+
+        def accepts(self, name, scan):
+            accepted = super(ConstantAdapter, self).accepts(name, scan)
+            return replace(
+                accepted,
+                predicates=tuple(
+                    p for p in accepted.predicates if isinstance(p.rhs, Const)
+                ),
+            )
+
+    dataset = DataSet()
+    dataset.add_adapter(ConstantAdapter())
+    compiled = counting_compiler(dataset)
+
+    prepared = dataset.prepare("select full_name from employees where employee_id = ?0")
+    assert list(prepared.execute(1234)) == [("Tom Tompson",)]
+    assert list(prepared.execute(4567)) == [("Sally Sanders",)]
+    assert list(prepared.execute(1234)) == [("Tom Tompson",)]
+
+    # a plan per set of parameters, kept by the prepared query
+    assert len(compiled) == 2
+    assert len(prepared.plans) == 2
+    assert len(dataset.plan_cache) == 0
+
+    dataset.create_view("managers", "select * from employees where manager_id is null")
+    assert list(prepared.execute(1234)) == [("Tom Tompson",)]
+    assert len(compiled) == 3
+    assert len(prepared.plans) == 1
+
+
+def test_prepare_specializes_per_call():
+    class NumberAdapter(EmployeeAdapter):
+        """Only filters on numbers"""
+
+        def accepts(self, name, scan):
+            accepted = super(NumberAdapter, self).accepts(name, scan)
+            return replace(
+                accepted,
+                predicates=tuple(
+                    p for p in accepted.predicates if isinstance(p.rhs, NumberConst)
+                ),
+            )
+
+    dataset = DataSet()
+    dataset.add_adapter(NumberAdapter())
+    compiled = counting_compiler(dataset)
+
+    sql = "select full_name from employees where employee_id = ?0"
+    prepared = dataset.prepare(sql)
+
+    # a string isn't pushed down, so the statement's plan is used
+    assert list(prepared.execute("1234")) == []
+    assert len(compiled) == 1
+    assert len(dataset.plan_cache) == 1
+
+    # a number is, so the plan is specialized to it
+    assert list(prepared.execute(1234)) == [("Tom Tompson",)]
+    assert len(compiled) == 2
+    assert prepared.plan(dataset.compile, (1234,)) is not dataset.plan(
+        sql, dataset.compile
+    )
+
+    assert list(prepared.execute("4567")) == []
+    assert list(prepared.execute(4567)) == [("Sally Sanders",)]
+    assert list(prepared.execute(1234)) == [("Tom Tompson",)]
+    assert len(compiled) == 3
+    assert len(prepared.plans) == 4
+
+
+def test_prepare_async():
+    dataset = DataSet()
+    dataset.add_adapter(EmployeeAdapter())
+
+    prepared = dataset.prepare("select full_name from employees where manager_id = ?0")
+
+    async def collect(rows):
+        return [row async for row in rows]
+
+    assert asyncio.run(collect(prepared.aexecute(1234))) == [
+        ("Sally Sanders",),
+        ("Mark Markty",),
+    ]
@@ -1,7 +1,8 @@
 from datetime import date
 
-from splicer import Field, Query, Schema
+from splicer import DataSet, Field, Query, Schema
 from splicer.adapters.dict_adapter import DictAdapter
+from splicer.compilers import codegen  # type: ignore
 
 employee_records = [
     dict(employee_id=1234, full_name="Tom Tompson", employment_date=date(2009, 1, 17)),
@@ -49,3 +50,41 @@ def test_dict_adapter_with_schemas():
         (4567, "Sally Sanders", date(2010, 2, 24), 1234),
         (8901, "Mark Markty", date(2010, 3, 1), 1234),
     ]
+
+    assert len(employees) == 3
+    assert adapter.estimate_rows("employees") == 3
+
+
+def test_scan_compiles_once(monkeypatch):
+    compiled = []
+    compile_expr = codegen.compile_expr
+
+    def counting(expr, schema, dataset, name="expr"):
+        compiled.append(name)
+        return compile_expr(expr, schema, dataset, name)
+
+    monkeypatch.setattr(codegen, "compile_expr", counting)
+
+    dataset = DataSet()
+    dataset.add_adapter(
+        DictAdapter(
+            numbers=dict(
+                schema=dict(
+                    fields=[
+                        dict(name="x", type="INTEGER"),
+                        dict(name="y", type="INTEGER"),
+                    ]
+                ),
+                rows=[dict(x=i, y=i % 10) for i in range(100)],
+            )
+        )
+    )
+
+    plan = dataset.plan("select x from numbers where y = 3", dataset.compile)
+    expected = [(i,) for i in range(3, 100, 10)]
+
+    # every split of every execution uses the predicate compiled once
+    assert list(plan(dict(dataset=dataset, split_size=10))) == expected
+    assert list(plan(dict(dataset=dataset, split_size=10))) == expected
+    assert list(plan(dict(dataset=dataset))) == expected
+    assert compiled.count("scan") == 1
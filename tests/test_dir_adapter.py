@@ -2,10 +2,11 @@ import os
 import shutil
 import tempfile
 
-from splicer import Schema
+from splicer import DataSet, Schema, codecs
 from splicer.adapters.dir_adapter import DirAdapter
 from splicer.ast import *
 from splicer.operations import query_zipper  # type: ignore
+from splicer.optimizer import estimate_rows, optimize
 
 from . import compare
 
@@ -22,13 +23,27 @@ TEST_SCHEMA = Schema(
 
 def setup_function(func):
     global path
-    if func in (test_evaluate, test_guess_schema):
+    if func in (
+        test_evaluate,
+        test_guess_schema,
+        test_query_used_columns,
+        test_query_limit,
+        test_query_prepared,
+        test_analyze,
+    ):
         path = tempfile.mkdtemp()
 
 
 def teardown_function(func):
     global path
-    if func in (test_evaluate, test_guess_schema):
+    if func in (
+        test_evaluate,
+        test_guess_schema,
+        test_query_used_columns,
+        test_query_limit,
+        test_query_prepared,
+        test_analyze,
+    ):
 
         try:
             shutil.rmtree(path)
@@ -106,6 +121,35 @@ def test_query_field_in_payload():
     )
 
 
+def test_evaluate_read_ahead():
+    adapter = DirAdapter(
+        employees=dict(
+            root_dir="/",
+            decode="auto",
+            schema=TEST_SCHEMA,
+            read_ahead=8,
+            ordered=False,
+        )
+    )
+
+    loc = query_zipper(LoadOp("employees")).leftmost_descendant()
+
+    res = adapter.evaluate(loc)
+
+    compare(
+        res.root(),
+        Function(
+            "decode",
+            Function("files", Const("/")),
+            Const("auto"),
+            Const(TEST_SCHEMA),
+            Const("path"),
+            Const(8),
+            Const(False),
+        ),
+    )
+
+
 def test_query_field_from_path():
     """
     Queries with SelectionOps that reference only fields
@@ -226,3 +270,186 @@ def test_guess_schema():
     )
 
     adapter.schema("employees")
+
+
+def test_query_used_columns():
+    for department in ("engineering", "sales"):
+        sub_path = os.path.join(path, department)
+        os.mkdir(sub_path)
+        with open(os.path.join(sub_path, "data.csv"), "w") as f:
+            f.write("id,full_name,salary\n")
+            for x in range(3):
+                f.write("{},{}{},{}\n".format(x, department, x, x * 100))
+
+    dataset = DataSet()
+    dataset.add_adapter(
+        DirAdapter(
+            employees=dict(
+                root_dir=path,
+                pattern="{department}/data.csv",
+                decode="auto",
+                schema=dict(
+                    fields=[
+                        dict(type="STRING", name="id"),
+                        dict(type="STRING", name="full_name"),
+                        dict(type="STRING", name="salary"),
+                    ]
+                ),
+            )
+        )
+    )
+
+    query = dataset.query("select full_name from employees where salary != '0'")
+    relation = optimize(query).operations.relation.relation
+
+    # only the columns used by the query are built
+    assert [f.name for f in relation.schema.fields] == ["full_name", "salary"]
+    assert sorted(query) == [
+        ("engineering1",),
+        ("engineering2",),
+        ("sales1",),
+        ("sales2",),
+    ]
+
+
+def test_query_limit(monkeypatch):
+    for department in range(10):
+        sub_path = os.path.join(path, str(department))
+        os.mkdir(sub_path)
+        with open(os.path.join(sub_path, "data.csv"), "w") as f:
+            f.write("id,full_name\n")
+            for x in range(3):
+                f.write("{},name{}\n".format(x, x))
+
+    opened = []
+
+    def tracking_open(path, *args):
+        stream = open(path, *args)
+        opened.append(stream)
+        return stream
+
+    monkeypatch.setattr(codecs, "open", tracking_open, raising=False)
+
+    dataset = DataSet()
+    dataset.add_adapter(
+        DirAdapter(
+            employees=dict(
+                root_dir=path,
+                pattern="{department}/data.csv",
+                decode="auto",
+                schema=dict(
+                    fields=[
+                        dict(type="STRING", name="id"),
+                        dict(type="STRING", name="full_name"),
+                    ]
+                ),
+            )
+        )
+    )
+
+    assert len(list(dataset.query("select full_name from employees limit 4"))) == 4
+
+    # decoding stopped at the second file, which was closed
+    assert len(opened) == 2
+    assert all(stream.closed for stream in opened)
+
+
+def test_query_prepared(monkeypatch):
+    for department in ("engineering", "sales", "marketing"):
+        sub_path = os.path.join(path, department)
+        os.mkdir(sub_path)
+        with open(os.path.join(sub_path, "data.csv"), "w") as f:
+            f.write("id,full_name\n")
+            for x in range(3):
+                f.write("{},{}{}\n".format(x, department, x))
+
+    opened = []
+
+    def tracking_open(path, *args):
+        opened.append(path)
+        return open(path, *args)
+
+    monkeypatch.setattr(codecs, "open", tracking_open, raising=False)
+
+    dataset = DataSet()
+    dataset.add_adapter(
+        DirAdapter(
+            employees=dict(
+                root_dir=path,
+                pattern="{department}/data.csv",
+                decode="auto",
+                schema=dict(
+                    fields=[
+                        dict(type="STRING", name="id"),
+                        dict(type="STRING", name="full_name"),
+                    ]
+                ),
+            )
+        )
+    )
+
+    sql = "select full_name from employees where department = ?0"
+    expected = [("sales0",), ("sales1",), ("sales2",)]
+
+    assert list(dataset.execute(sql, "sales")) == expected
+    assert len(opened) == 3
+
+    # bound parameters filter the files before they're opened
+    del opened[:]
+    assert list(dataset.prepare(sql).execute("sales")) == expected
+    assert opened == [os.path.join(path, "sales", "data.csv")]
+
+
+def test_analyze(monkeypatch):
+    for department in ("engineering", "sales", "marketing"):
+        sub_path = os.path.join(path, department)
+        os.mkdir(sub_path)
+        with open(os.path.join(sub_path, "data.csv"), "w") as f:
+            f.write("id,full_name\n")
+            for x in range(3):
+                f.write("{},{}{}\n".format(x, department, x))
+
+    opened = []
+
+    def tracking_open(path, *args):
+        opened.append(path)
+        return open(path, *args)
+
+    monkeypatch.setattr(codecs, "open", tracking_open, raising=False)
+
+    dataset = DataSet()
+    dataset.add_adapter(
+        DirAdapter(
+            employees=dict(
+                root_dir=path,
+                pattern="{department}/data.csv",
+                decode="auto",
+                schema=dict(
+                    fields=[
+                        dict(type="STRING", name="id"),
+                        dict(type="STRING", name="full_name"),
+                    ]
+                ),
+            )
+        )
+    )
+
+    # planning doesn't open the files
+    dataset.query("select full_name from employees where id = '1'").operations
+    assert opened == []
+
+    stats = dataset.analyze("employees")
+    assert len(opened) == 3
+    assert stats.rows == 9
+    assert stats.column("department").distinct == 3
+    assert stats.column("id").distinct == 3
+
+    # the decoded relation is planned with the analyzed statistics
+    relation = dataset.query("select * from employees").operations
+    assert estimate_rows(dataset, relation) == 9
+    assert relation.statistics() is stats
+
+    # and so are the rows selected from it
+    query = dataset.query("select full_name from employees where id = '1'")
+    assert estimate_rows(dataset, query.operations) == 3
+    assert sorted(query) == [("engineering1",), ("marketing1",), ("sales1",)]
@@ -0,0 +1,125 @@
+import os
+
+from splicer import DataSet
+from splicer.adapters.dict_adapter import DictAdapter
+from splicer.executor import ProcessExecutor, SerialExecutor  # type: ignore
+
+
+def numbers_dataset():
+    dataset = DataSet()
+    dataset.add_adapter(
+        DictAdapter(
+            numbers=dict(
+                schema=dict(
+                    fields=[
+                        dict(name="x", type="INTEGER"),
+                        dict(name="y", type="INTEGER"),
+                    ]
+                ),
+                rows=[dict(x=i, y=i % 7) for i in range(1000)],
+            )
+        )
+    )
+    return dataset
+
+
+def test_serial_executor():
+    executor = SerialExecutor()
+
+    assert [list(rows) for rows in executor.map(range, [1, 2, 3])] == [
+        [0],
+        [0, 1],
+        [0, 1, 2],
+    ]
+
+
+def test_process_executor_runs_closures_in_workers():
+    executor = ProcessExecutor(max_workers=2)
+    parent = os.getpid()
+
+    def pids(n):
+        return [(n, os.getpid() != parent)]
+
+    try:
+        assert list(executor.map(pids, range(5))) == [[(n, True)] for n in range(5)]
+    finally:
+        executor.close()
+
+
+def test_process_executor_reuses_pool():
+    executor = ProcessExecutor(max_workers=2)
+    try:
+        assert list(executor.map(range, [1, 2, 3])) == [[0], [0, 1], [0, 1, 2]]
+        pool = executor._pool
+
+        # picklable functions are sent to the running workers
+        assert list(executor.map(range, [2, 1])) == [[0, 1], [0]]
+        assert executor._pool is pool
+
+        # closures mapped after the workers forked need new ones
+        offset = 10
+
+        def shifted(n):
+            return [n + offset]
+
+        assert list(executor.map(shifted, [1, 2])) == [[11], [12]]
+        pool = executor._pool
+        assert list(executor.map(range, [1, 1])) == [[0], [0]]
+        assert executor._pool is pool
+
+        # the workers inherited the closure, which is mapped again
+        assert list(executor.map(shifted, [3, 4])) == [[13], [14]]
+        assert executor._pool is pool
+    finally:
+        executor.close()
+
+    assert executor._pool is None
+
+
+def test_parallel_scan():
+    dataset = numbers_dataset()
+    sql = "select x * 2, y from numbers where y = 3"
+    expected = list(dataset.execute(sql))
+
+    dataset.set_executor(ProcessExecutor(max_workers=2))
+    query = dataset.query(sql)
+    func = dataset.compile(query)
+
+    # splits are returned in order
+    assert list(func(dict(dataset=dataset, split_size=100))) == expected
+    dataset.executor.close()
+
+
+def test_parallel_aggregation():
+    dataset = numbers_dataset()
+    sql = "select y, count(), min(x), max(x) from numbers group by y order by y"
+    expected = list(dataset.execute(sql))
+
+    dataset.set_executor(ProcessExecutor(max_workers=2))
+    query = dataset.query("select y, count(), min(x), max(x) from numbers group by y")
+    func = dataset.compile(query)
+
+    assert sorted(func(dict(dataset=dataset, split_size=100))) == expected
+    dataset.executor.close()
+
+
+def test_parallel_plan_reuses_pool():
+    dataset = numbers_dataset()
+    executor = ProcessExecutor(max_workers=2)
+    dataset.set_executor(executor)
+
+    for sql in (
+        "select x * 2, y from numbers where y = 3",
+        "select y, count(), min(x), max(x) from numbers group by y",
+    ):
+        func = dataset.compile(dataset.query(sql))
+        expected = sorted(func(dict(dataset=dataset, split_size=100)))
+        pool = executor._pool
+        assert pool is not None
+
+        # executing the compiled plan again runs on the same workers
+        assert sorted(func(dict(dataset=dataset, split_size=100))) == expected
+        assert sorted(func(dict(dataset=dataset, split_size=50))) == expected
+        assert executor._pool is pool
+
+    executor.close()
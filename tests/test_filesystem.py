@@ -3,6 +3,7 @@ import shutil
 import tempfile
 
 from splicer import Relation, Schema
+from splicer.adapters import Scan
 from splicer.functions.filesystem import (  # type: ignore # isort:skip
     contents,
     decode,
@@ -100,3 +101,113 @@ def test_decode():
     )
 
     assert list(decode({}, r, 0, "auto")) == [(p, "1", "2")]
+
+
+def test_decode_partitions():
+    paths = [os.path.join(path, "test{}.csv".format(i)) for i in range(3)]
+    for i, p in enumerate(paths):
+        open(p, "w").write("field1,field2\n{},2\n".format(i))
+
+    r = Relation(
+        None,
+        None,
+        Schema([dict(type="STRING", name="path")]),
+        lambda ctx: iter([(p,) for p in paths]),
+    )
+
+    relation = decode.resolve(decode, None, r, "auto", None)
+    partitions = relation.partitions({})
+
+    assert len(partitions) == 3
+    assert [row for p in partitions for row in p({})] == list(relation({}))
+
+
+def test_decode_estimate():
+    paths = [os.path.join(path, "test{}.csv".format(i)) for i in range(3)]
+    for i, p in enumerate(paths):
+        open(p, "w").write("field1,field2\n" + "{},2\n".format(i) * 100)
+
+    r = Relation(
+        None,
+        None,
+        Schema([dict(type="STRING", name="path")]),
+        lambda ctx: iter([(p,) for p in paths]),
+    )
+
+    relation = decode.resolve(decode, None, r, "auto", None)
+
+    # estimating would stat every file each time the query compiles,
+    # decoded relations are only estimated once analyzed
+    assert relation.estimate is None
+    assert not hasattr(files, "estimate")
+
+
+def test_decode_read_ahead():
+    paths = [os.path.join(path, "test{}.csv".format(i)) for i in range(10)]
+    for i, p in enumerate(paths):
+        open(p, "w").write("field1,field2\n{},1\n{},2\n".format(i, i))
+
+    r = Relation(
+        None,
+        None,
+        Schema([dict(type="STRING", name="path")]),
+        lambda ctx: iter([(p,) for p in paths]),
+    )
+
+    expected = list(decode({}, r, 0, "auto"))
+
+    assert list(decode({}, r, 0, "auto", read_ahead=3)) == expected
+    assert list(decode(dict(decode_read_ahead=4), r, 0, "auto")) == expected
+    assert sorted(decode({}, r, 0, "auto", read_ahead=3, ordered=False)) == sorted(
+        expected
+    )
+    assert sorted(
+        decode(dict(decode_ordered=False), r, 0, "auto", read_ahead=2)
+    ) == sorted(expected)
+
+
+def test_decode_columns():
+    paths = [os.path.join(path, "test{}.csv".format(i)) for i in range(3)]
+    for i, p in enumerate(paths):
+        open(p, "w").write("field1,field2,field3\n{},2,3\n".format(i))
+
+    r = Relation(
+        None,
+        None,
+        Schema([dict(type="STRING", name="path")]),
+        lambda ctx: iter([(p,) for p in paths]),
+    )
+
+    relation = decode.resolve(decode, None, r, "auto", None)
+    scan = relation.adapter.accepts("decode", Scan(columns=(3, 1)))
+
+    assert scan == Scan(columns=(3, 1))
+    assert list(relation.adapter.scan("decode", scan, {})) == [
+        ("3", "0"),
+        ("3", "1"),
+        ("3", "2"),
+    ]
+    assert [
+        row
+        for p in relation.adapter.scan_partitions("decode", Scan(columns=(0,)), {})
+        for row in p({})
+    ] == [(p,) for p in paths]
+
+
+def test_decode_statistics():
+    paths = [os.path.join(path, "test{}.csv".format(i)) for i in range(3)]
+    for i, p in enumerate(paths):
+        open(p, "w").write("field1,field2\n" + "{},2\n".format(i) * 100)
+
+    r = Relation(
+        None,
+        None,
+        Schema([dict(type="STRING", name="path")]),
+        lambda ctx: iter([(p,) for p in paths]),
+    )
+
+    relation = decode.resolve(decode, None, r, "auto", None)
+
+    # planning doesn't decode the files, analyze them for statistics
+    assert relation.statistics is None
+    assert relation.adapter.statistics("decode") is None
@@ -6,12 +6,16 @@ from splicer import Schema
 from splicer.ast import And, EqOp, NumberConst, Var
 
 from splicer.compilers.join import (  # type: ignore  # isort:skip
+    MAX_SIZE,
     buffered,
     hash_join,
     join_keys,
     join_keys_expr,
+    merge_join,
     nested_block_join,
     record_size,
+    row_size_for,
+    smaller_side,
 )
 
 SCHEMA_1 = Schema(name="t1", fields=[dict(name="x", type="INTEGER")])
@@ -151,3 +155,138 @@ def test_hash_join():
     j = tuple(hash_join(False, t1, t2, comparison, ctx))
 
     assert j == ((1, 1, 1),)
+
+
+def test_merge_join():
+    def t1(ctx=None):
+        return iter(((1,), (1,), (2,), (4,)))
+
+    def t2(ctx=None):
+        return iter(((None, 2), (1, 0), (1, 1), (3, 1), (4, 2)))
+
+    t2.schema = SCHEMA_2
+
+    comparison = join_keys(SCHEMA_1, SCHEMA_2, EqOp(Var("t1.x"), Var("t2.y")))
+
+    j = tuple(merge_join(False, t1, t2, comparison, {}))
+    assert j == tuple(hash_join(False, t1, t2, comparison, {}, build="right"))
+    assert j == (
+        (1, 1, 0),
+        (1, 1, 1),
+        (1, 1, 0),
+        (1, 1, 1),
+        (4, 4, 2),
+    )
+
+    j = tuple(merge_join(True, t1, t2, comparison, {}))
+    assert j == (
+        (1, 1, 0),
+        (1, 1, 1),
+        (1, 1, 0),
+        (1, 1, 1),
+        (2, None, None),
+        (4, 4, 2),
+    )
+
+
+def test_hash_join_reads_inputs_once():
+    scans = []
+
+    def t1(ctx=None):
+        scans.append("t1")
+        return iter([(i % 60,) for i in range(200)])
+
+    def t2(ctx=None):
+        scans.append("t2")
+        return iter([(i % 80, i) for i in range(400)])
+
+    t2.schema = SCHEMA_2
+
+    comparison = join_keys(SCHEMA_1, SCHEMA_2, EqOp(Var("t1.x"), Var("t2.y")))
+
+    for left_join in (False, True):
+        expected = [
+            l_row + r_row
+            for l_row in t1()
+            for r_row in [r for r in t2() if r[0] == l_row[0]]
+            or ([(None, None)] if left_join else [])
+        ]
+        del scans[:]
+
+        # small enough to spill most partitions
+        ctx = dict(sort_buffer_size=record_size((1, 1)) * 100)
+        j = list(hash_join(left_join, t1, t2, comparison, ctx))
+
+        assert sorted(scans) == ["t1", "t2"]
+        assert sorted(j, key=repr) == sorted(expected, key=repr)
+
+
+def test_hash_join_build_side():
+    t2.schema = SCHEMA_2
+    comparison = join_keys(SCHEMA_1, SCHEMA_2, EqOp(Var("t1.x"), Var("t2.y")))
+    expected = [(1, 1, 0), (1, 1, 1)]
+
+    for build in ("left", "right", None):
+        j = list(hash_join(False, t1, t2, comparison, {}, build=build))
+        assert j == expected
+
+    # the left relation runs out first
+    side, lefts, rights = smaller_side(t1(), t2(), 1024)
+    assert side == "left"
+    assert (list(lefts), list(rights)) == (list(t1()), list(t2()))
+
+    side, lefts, rights = smaller_side(t2(), t1(), 1024)
+    assert side == "right"
+    assert (list(lefts), list(rights)) == (list(t2()), list(t1()))
+
+
+def test_nested_block_join_reads_inner_once():
+    scans = []
+
+    def r(ctx):
+        return iter([(i,) for i in range(100)])
+
+    def s(ctx):
+        scans.append(1)
+        return iter([(i, str(i)) for i in range(50)])
+
+    comparison = lambda row, ctx: row[0] > row[1]
+    expected = [
+        (r_row[0],) + s_row
+        for s_row in s(None)
+        for r_row in r(None)
+        if r_row[0] > s_row[0]
+    ]
+
+    for size in (MAX_SIZE, record_size((1, "1")) * 10):
+        del scans[:]
+        j = list(nested_block_join(r, s, comparison, dict(sort_buffer_size=size)))
+
+        assert scans == [1]
+        assert sorted(j) == sorted(expected)
+
+
+def test_row_size_for():
+    schema = Schema(
+        fields=[
+            dict(name="x", type="INTEGER"),
+            dict(name="name", type="STRING"),
+            dict(name="tags", type="STRING", mode="REPEATED"),
+            dict(name="other", type="OBJECT"),
+        ]
+    )
+    row_size = row_size_for(schema)
+
+    row = (2**40, "some name", ("a", "b"), {"k": "v"})
+    # the same as record_size for known types, while also
+    # measuring the values in repeated fields
+    assert row_size(row) == (
+        getsizeof(row) + getsizeof(row[0]) + getsizeof(row[1])
+    ) + record_size(row[2]) + getsizeof(row[3])
+
+    # strings are measured by their length
+    assert row_size((1, "a" * 100, (), None)) - row_size((1, "", (), None)) == 100
+    assert row_size((None, None, None, None)) <= row_size((1, "", (), None))
+
+    # values that don't match the schema are still measured
+    assert row_size((1, 2**40, (), None)) > row_size((1, "", (), None))
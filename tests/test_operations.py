@@ -1,7 +1,7 @@
 # test_operations.py
 from splicer import DataSet, Schema
 from splicer.ast import *
-from splicer.operations import walk  # type: ignore
+from splicer.operations import bind_params, walk  # type: ignore
 
 from .fixtures.employee_adapter import EmployeeAdapter
 
@@ -10,3 +10,32 @@ def test_walk():
     op = ProjectionOp(LoadOp("employees"), Var("full_name"))
 
     assert walk(op, lambda node: node) == op
+
+
+def test_bind_params():
+    op = ProjectionOp(
+        SelectionOp(
+            LoadOp("employees"),
+            And(
+                EqOp(Var("employee_id"), ParamGetterOp(0)),
+                EqOp(Var("manager_id"), ParamGetterOp(2)),
+            ),
+        ),
+        Var("full_name"),
+        RenameOp("flag", ParamGetterOp(1)),
+    )
+
+    assert bind_params(op, (1234, True, None)) == ProjectionOp(
+        SelectionOp(
+            LoadOp("employees"),
+            And(
+                EqOp(Var("employee_id"), NumberConst(1234)),
+                EqOp(Var("manager_id"), NullConst()),
+            ),
+        ),
+        Var("full_name"),
+        RenameOp("flag", TrueConst()),
+    )
+
+    # parameters without constants are left to be read when run
+    assert bind_params(op, ("x", [1])).exprs[1] == RenameOp("flag", ParamGetterOp(1))
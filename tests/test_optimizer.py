@@ -0,0 +1,389 @@
+import asyncio
+from itertools import islice
+
+from splicer import DataSet, Relation
+from splicer.adapters import Scan
+from splicer.adapters.dict_adapter import DictAdapter
+from splicer.ast import (
+    AliasOp,
+    Desc,
+    EqOp,
+    GtOp,
+    JoinOp,
+    LeftJoinOp,
+    LtOp,
+    NumberConst,
+    ProjectionOp,
+    SelectionOp,
+    SliceOp,
+    UnionAllOp,
+    Var,
+)
+from splicer.optimizer import join_order, optimize, push_down_predicates
+from splicer.query import Query
+
+from .fixtures.employee_adapter import EmployeeAdapter
+
+QUERIES = [
+    "select * from employees where manager_id = 1234",
+    "select full_name from (select * from employees) as e " "where employee_id > 1234",
+    "select x from (select a as x from numbers) where x > 10",
+    "select * from employees as employee "
+    "join employees as manager on manager.employee_id = employee.manager_id "
+    "where employee.employee_id > 4000 and manager.full_name = 'Tom Tompson'",
+    "select * from employees as employee, employees as manager "
+    "where manager.employee_id = employee.manager_id",
+    "select * from employees as employee "
+    "left join employees as manager on manager.employee_id = employee.manager_id "
+    "where manager.employee_id = 1234",
+    "select * from employees as employee "
+    "left join employees as manager on manager.employee_id = employee.manager_id "
+    "and manager.employee_id > 1000 where employee.employee_id > 1234",
+    "select a from numbers union all select b from numbers where a > 10",
+    "select * from both_numbers where a > 90",
+    "select b, count() from numbers group by b",
+    "select * from (select b, count() as c from numbers group by b) where c > 1",
+    "select * from (select * from numbers order by a desc limit 5) where a > 97",
+    "select a from numbers where a > 50 limit 5",
+    "select x from (select a as x from numbers) as n where x < 20 limit 2",
+    "select * from numbers where b = 3 order by a desc limit 4",
+    "select count() from numbers",
+    "select b, a from numbers where a > 10 order by b, a",
+    "select e.full_name, m.full_name from employees as e "
+    "join employees as m on e.manager_id = m.employee_id where m.employee_id > 0",
+    "select distinct b from numbers",
+    "select * from both_numbers limit 150",
+    "select a + 1 from numbers limit 3",
+    "select a from (select a, b from numbers order by a desc) where b = 2",
+    "select s.amount, p.category, d.month from sales as s "
+    "join products as p on p.product_id = s.product_id "
+    "join stores as st on st.store_id = s.store_id "
+    "join days as d on d.day_id = s.day_id where p.category = 1 and d.day_id = 1",
+    "select * from sales as s, days as d, products as p "
+    "where p.product_id = s.product_id and d.day_id = s.day_id and d.month = 2",
+]
+
+
+def dataset():
+    dataset = DataSet()
+    dataset.add_adapter(EmployeeAdapter())
+    dataset.add_adapter(
+        DictAdapter(
+            numbers=dict(
+                schema=dict(
+                    fields=[
+                        dict(name="a", type="INTEGER"),
+                        dict(name="b", type="INTEGER"),
+                    ]
+                ),
+                rows=[dict(a=i, b=i % 7) for i in range(100)],
+            ),
+            sales=table(
+                ["product_id", "store_id", "day_id", "amount"],
+                [(i % 50, i % 10, i % 30, i) for i in range(1000)],
+            ),
+            products=table(["product_id", "category"], [(i, i % 5) for i in range(50)]),
+            stores=table(["store_id", "region"], [(i, i % 3) for i in range(10)]),
+            days=table(["day_id", "month"], [(i, i // 10) for i in range(30)]),
+        )
+    )
+    dataset.create_view(
+        "both_numbers", "select a from numbers union all select b from numbers"
+    )
+    return dataset
+
+
+def table(fields, rows):
+    return dict(
+        schema=dict(fields=[dict(name=f, type="INTEGER") for f in fields]),
+        rows=[dict(zip(fields, row)) for row in rows],
+    )
+
+
+def pushed(ds, sql):
+    query = ds.query(sql)
+    return Query(ds, push_down_predicates(ds, query.operations))
+
+
+def test_results_match_unoptimized():
+    optimized = dataset()
+    unoptimized = dataset()
+    unoptimized.set_optimizer(lambda query: query)
+
+    for sql in QUERIES:
+        assert sorted(optimized.execute(sql), key=repr) == sorted(
+            unoptimized.execute(sql), key=repr
+        ), sql
+
+
+def test_push_below_projection():
+    ds = dataset()
+    query = pushed(ds, "select x from (select a as x from numbers) where x > 10")
+
+    op = query.operations
+    assert isinstance(op, ProjectionOp)
+    op = op.relation
+    assert isinstance(op, ProjectionOp)
+    op = op.relation
+    assert isinstance(op, SelectionOp)
+    assert op.bool_op == GtOp(Var("a"), NumberConst(10))
+    assert isinstance(op.relation, Relation)
+
+
+def test_push_into_join_sides():
+    ds = dataset()
+    query = pushed(
+        ds,
+        "select * from employees as employee, employees as manager "
+        "where manager.employee_id = employee.manager_id "
+        "and employee.employee_id > 4000 and manager.full_name = 'Tom Tompson'",
+    )
+
+    op = query.operations
+    assert isinstance(op, JoinOp)
+    # the equality becomes the join condition
+    assert op.bool_op == EqOp(Var("manager.employee_id"), Var("employee.manager_id"))
+
+    left = op.left
+    assert isinstance(left, AliasOp)
+    assert isinstance(left.relation, SelectionOp)
+    assert left.relation.bool_op == GtOp(Var("employee_id"), NumberConst(4000))
+
+    right = op.right
+    assert isinstance(right, AliasOp)
+    assert isinstance(right.relation, SelectionOp)
+    assert isinstance(right.relation.relation, Relation)
+
+
+def test_left_join_keeps_right_predicates_above():
+    ds = dataset()
+    query = pushed(
+        ds,
+        "select * from employees as employee "
+        "left join employees as manager "
+        "on manager.employee_id = employee.manager_id "
+        "where manager.employee_id = 1234 and employee.employee_id > 1234",
+    )
+
+    op = query.operations
+    assert isinstance(op, SelectionOp)
+    assert op.bool_op == EqOp(Var("manager.employee_id"), NumberConst(1234))
+
+    join = op.relation
+    assert isinstance(join, LeftJoinOp)
+    assert isinstance(join.left.relation, SelectionOp)
+    assert isinstance(join.right.relation, Relation)
+
+
+def test_push_into_union_all():
+    ds = dataset()
+    query = pushed(ds, "select * from both_numbers where a > 90")
+
+    union = query.operations.relation
+    assert isinstance(union, UnionAllOp)
+    assert union.left.relation.bool_op == GtOp(Var("a"), NumberConst(90))
+    assert union.right.relation.bool_op == GtOp(Var("b"), NumberConst(90))
+
+
+def test_aggregates_are_not_pushed_through():
+    ds = dataset()
+    query = pushed(
+        ds,
+        "select * from (select b, count() as c from numbers group by b) " "where c > 1",
+    )
+
+    selection = query.operations
+    assert isinstance(selection, SelectionOp)
+    assert selection.bool_op == GtOp(Var("c"), NumberConst(1))
+
+
+class SortingAdapter(DictAdapter):
+    """Sorts scans and filters on column a, but nothing else"""
+
+    def __init__(self):
+        super(SortingAdapter, self).__init__(
+            sorted_numbers=dict(
+                schema=dict(
+                    fields=[
+                        dict(name="a", type="INTEGER"),
+                        dict(name="b", type="INTEGER"),
+                    ]
+                ),
+                rows=[dict(a=i, b=i % 7) for i in range(100)],
+            )
+        )
+        self.scans = []
+
+    def accepts(self, name, scan):
+        return Scan(
+            tuple(p for p in scan.predicates if p.lhs == Var("a")),
+            scan.order_by,
+            scan.start,
+            scan.stop,
+        )
+
+    def scan(self, name, scan, ctx):
+        self.scans.append(scan)
+        rows = super(SortingAdapter, self).scan(name, Scan(scan.predicates), ctx)
+        if scan.order_by:
+            (order,) = scan.order_by
+            rows = sorted(rows, reverse=isinstance(order, Desc))
+        return islice(rows, scan.start or 0, scan.stop)
+
+
+def test_push_down_scan():
+    ds = dataset()
+    query = optimize(ds.query("select * from numbers where a > 90 limit 3"))
+
+    relation = query.operations
+    assert isinstance(relation, Relation)
+    assert relation.scan == Scan((GtOp(Var("a"), NumberConst(90)),), stop=3)
+    assert list(query) == [(91, 0), (92, 1), (93, 2)]
+
+
+def test_push_down_scan_residuals():
+    ds = dataset()
+    adapter = ds.add_adapter(SortingAdapter())
+
+    query = optimize(
+        ds.query(
+            "select x from (select a as x, b from sorted_numbers) as n "
+            "where x < 50 and b = 1 order by x desc limit 3"
+        )
+    )
+
+    # the limit isn't pushed down because the adapter can't filter on b
+    assert isinstance(query.operations, SliceOp)
+    assert list(query) == [(43,), (36,), (29,)]
+    assert adapter.scans == [
+        Scan((LtOp(Var("a"), NumberConst(50)),), (Desc(Var("a")),))
+    ]
+
+    query = optimize(
+        ds.query("select a from sorted_numbers where a < 50 order by a desc limit 3")
+    )
+    relation = query.operations.relation
+    assert isinstance(relation, Relation)
+    assert relation.scan.stop == 3
+    assert list(query) == [(49,), (48,), (47,)]
+
+
+def test_push_down_scan_async():
+    ds = dataset()
+    ds.add_adapter(SortingAdapter())
+
+    for sql in QUERIES + [
+        "select a from sorted_numbers where b = 3 and a > 20 order by a desc limit 4"
+    ]:
+        assert asyncio.run(collect(ds.aexecute(sql))) == list(ds.execute(sql)), sql
+
+
+async def collect(rows):
+    return [row async for row in rows]
+
+
+def test_prune_columns():
+    ds = dataset()
+    query = optimize(
+        ds.query("select full_name from employees where manager_id = 1234")
+    )
+
+    relation = query.operations.relation
+    assert relation.scan.columns == (1,)
+    assert [f.name for f in relation.schema.fields] == ["full_name"]
+    assert list(query) == [("Sally Sanders",), ("Mark Markty",)]
+
+    query = optimize(
+        ds.query(
+            "select employee.full_name, manager.full_name "
+            "from employees as employee join employees as manager "
+            "on manager.employee_id = employee.manager_id"
+        )
+    )
+
+    join = query.operations.relation
+    assert join.left.relation.scan.columns == (1, 3)
+    assert join.right.relation.scan.columns == (0, 1)
+    assert list(query) == [
+        ("Sally Sanders", "Tom Tompson"),
+        ("Mark Markty", "Tom Tompson"),
+    ]
+
+
+def test_push_down_limits():
+    ds = dataset()
+    query = optimize(ds.query("select * from both_numbers limit 5"))
+
+    union = query.operations.relation.relation
+    assert isinstance(union, UnionAllOp)
+    assert union.left.relation.scan.stop == 5
+    assert union.right.relation.scan.stop == 5
+    assert list(query) == [(0,), (1,), (2,), (3,), (4,)]
+
+
+def test_reorder_joins():
+    ds = dataset()
+    sql = (
+        "select * from sales as s "
+        "join products as p on p.product_id = s.product_id "
+        "join stores as st on st.store_id = s.store_id "
+        "join days as d on d.day_id = s.day_id "
+        "where d.day_id = 1 and p.category = 1"
+    )
+    query = optimize(ds.query(sql))
+
+    # the filtered days are joined first, the unfiltered stores last
+    projection = query.operations
+    assert isinstance(projection, ProjectionOp)
+    join = projection.relation
+    assert join.right.name == "st"
+    assert join.left.right.name == "p"
+    assert {join.left.left.left.name, join.left.left.right.name} == {"s", "d"}
+    assert join.left.left.bool_op == EqOp(Var("d.day_id"), Var("s.day_id"))
+
+    # with the columns in their original order
+    assert projection.schema == ds.query(sql).schema
+    assert list(query) == list(ds.query(sql))
+    assert len(list(query)) == 34
+
+
+def test_reorder_joins_keeps_cheapest_order():
+    ds = dataset()
+    query = optimize(
+        ds.query(
+            "select * from days as d "
+            "join sales as s on d.day_id = s.day_id "
+            "join products as p on p.product_id = s.product_id "
+            "where d.day_id = 1"
+        )
+    )
+
+    join = query.operations
+    assert isinstance(join, JoinOp)
+    assert join.right.name == "p"
+    assert join.left.left.name == "d"
+
+
+def test_join_order():
+    # a fact table joined to each of its filtered dimensions
+    rows = [1000, 10, 100, 1, 50, 20, 5, 2]
+    predicates = [(None, frozenset((0, leaf)), 0.01) for leaf in range(1, len(rows))]
+
+    # greedily from the smallest relation
+    assert join_order(rows, predicates) == (3, 0, 7, 6, 1, 5, 4, 2)
+
+    # every order, the first join can't be a cross product
+    assert join_order(rows[:4], predicates[:3]) == (0, 3, 1, 2)
+
+
+def test_push_down_limits_below_offsets():
+    ds = dataset()
+    ds.frm("both_numbers").offset(4).limit(10).create_view("offset_numbers")
+
+    query = optimize(ds.query("select a from offset_numbers limit 3"))
+
+    union = query.operations
+    while not isinstance(union, UnionAllOp):
+        union = union.relation
+    assert union.left.relation.scan.stop == 7
+    assert list(query) == [(4,), (5,), (6,)]
@@ -0,0 +1,98 @@
+from splicer import DataSet, Relation, Schema
+from splicer.adapters import Adapter
+from splicer.statistics import HyperLogLog, Statistics, collect
+
+from .fixtures.employee_adapter import EmployeeAdapter
+
+
+def test_hyper_log_log():
+    for size in (0, 10, 1000, 100000):
+        sketch = HyperLogLog()
+        for i in range(size):
+            sketch.add(i)
+            sketch.add(str(i))
+
+        assert abs(sketch.count() - size * 2) <= size * 2 * 0.05
+
+    left = HyperLogLog()
+    right = HyperLogLog()
+    for i in range(1000):
+        left.add(i)
+        right.add(i + 500)
+    left.merge(right)
+
+    assert abs(left.count() - 1500) <= 1500 * 0.05
+
+
+def test_collect():
+    schema = Schema(
+        fields=[
+            dict(name="x", type="INTEGER"),
+            dict(name="name", type="STRING"),
+        ]
+    )
+    rows = [(i % 10, None if i % 4 else "name{}".format(i)) for i in range(100)]
+
+    stats = collect(schema, rows)
+
+    assert stats.rows == 100
+
+    x = stats.column("x")
+    assert x.distinct == 10
+    assert x.null_fraction == 0
+    assert (x.min, x.max) == (0, 9)
+
+    name = stats.column("name")
+    assert name.distinct == 25
+    assert name.null_fraction == 0.75
+    assert (name.min, name.max) == ("name0", "name96")
+    assert name.width > 0
+
+
+def test_adapter_statistics():
+    dataset = DataSet()
+    dataset.add_adapter(EmployeeAdapter())
+
+    # planning only counts the rows
+    stats = dataset.query("select * from employees").operations.statistics()
+    assert stats == Statistics(3)
+    assert stats.column("employee_id") is None
+
+    stats = dataset.analyze("employees")
+    assert stats.rows == 3
+    assert stats.column("employee_id").distinct == 3
+    assert stats.column("manager_id").null_fraction == 1 / 3
+
+    relation = dataset.query("select * from employees").operations
+    assert relation.statistics() == stats
+
+
+def test_analyze():
+    class CountingAdapter(Adapter):
+        def has(self, name):
+            return name == "counter"
+
+        def schema(self, name):
+            return Schema(fields=[dict(name="n", type="INTEGER")])
+
+        def table_scan(self, name, ctx):
+            return ((n % 7,) for n in range(700))
+
+    dataset = DataSet()
+    dataset.add_adapter(CountingAdapter())
+
+    assert "counter" not in dataset.statistics_cache
+    relation = dataset.query("select * from counter").operations
+    assert relation.estimate() is None
+    assert relation.statistics() is None
+
+    stats = dataset.analyze("counter")
+
+    assert stats == Statistics(700, stats.columns)
+    assert stats.column("n").distinct == 7
+    assert dataset.statistics_cache["counter"] is stats
+
+    relation = dataset.query("select * from counter").operations
+    assert isinstance(relation, Relation)
+    assert relation.estimate() == 700
+    assert relation.statistics() is stats